@@ -9,7 +9,7 @@ from acine.scheduler.managed_runtime import ManagedRuntime
 
 
 async def main() -> int:
-    routines = get_routines(full=True)
+    routines = get_routines()
     questions = [
         inquirer.List(
             "routine",
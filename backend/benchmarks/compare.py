@@ -0,0 +1,104 @@
+"""
+Compares two benchmark runs (pytest-benchmark JSON), f.e. a stored baseline
+and the current tree, and flags benchmarks that got slower.
+
+    pytest benchmarks --benchmark-json=benchmarks/baseline.json  # on main
+    pytest benchmarks --benchmark-json=benchmarks/results.json   # on a change
+    python benchmarks/compare.py benchmarks/baseline.json benchmarks/results.json
+
+Exits with 1 if any benchmark's median is over `--threshold` slower. Timings
+only compare on the same machine (the baseline's machine_info is printed).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from typing import Any, List, Optional, Sequence
+
+THRESHOLD = 0.15
+"""relative slowdown that counts as a regression"""
+
+
+def load(path: str) -> dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)  # type: ignore
+
+
+def stats(run: dict[str, Any], stat: str) -> dict[str, float]:
+    """benchmark fullname -> stat (seconds)"""
+    return {b["fullname"]: float(b["stats"][stat]) for b in run["benchmarks"]}
+
+
+class Change:
+    def __init__(self, name: str, before: Optional[float], after: Optional[float]):
+        self.name = name
+        self.before = before
+        self.after = after
+
+    @property
+    def ratio(self) -> Optional[float]:
+        if not self.before or self.after is None:
+            return None
+        return self.after / self.before - 1
+
+    def regressed(self, threshold: float) -> bool:
+        return self.ratio is not None and self.ratio > threshold
+
+
+def compare(
+    baseline: dict[str, Any], results: dict[str, Any], stat: str = "median"
+) -> List[Change]:
+    before, after = stats(baseline, stat), stats(results, stat)
+    names = sorted(before.keys() | after.keys())
+    return [Change(k, before.get(k), after.get(k)) for k in names]
+
+
+def format_time(t: Optional[float]) -> str:
+    if t is None:
+        return "-"
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if t >= scale:
+            return f"{t / scale:.3f}{unit}"
+    return f"{t / 1e-9:.0f}ns"
+
+
+def report(changes: Sequence[Change], threshold: float) -> str:
+    width = max([len(x.name) for x in changes] + [9])
+    lines = [f"{'benchmark':<{width}} {'baseline':>12} {'current':>12} {'change':>8}"]
+    for x in changes:
+        ratio = "new" if x.before is None else "missing" if x.after is None else ""
+        if x.ratio is not None:
+            ratio = f"{x.ratio:+.1%}"
+        flag = "  REGRESSION" if x.regressed(threshold) else ""
+        lines.append(
+            f"{x.name:<{width}} {format_time(x.before):>12} "
+            f"{format_time(x.after):>12} {ratio:>8}{flag}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("baseline")
+    parser.add_argument("results")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    parser.add_argument("--stat", default="median", choices=("median", "mean", "min"))
+    args = parser.parse_args(argv)
+
+    baseline, results = load(args.baseline), load(args.results)
+    machine = baseline.get("machine_info", {})
+    cpu = machine.get("cpu", {}).get("brand_raw", "")
+    print(f"baseline: {machine.get('node', '?')} {cpu}")
+    changes = compare(baseline, results, args.stat)
+    print(report(changes, args.threshold))
+    regressions = [x.name for x in changes if x.regressed(args.threshold)]
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
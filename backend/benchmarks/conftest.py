@@ -0,0 +1,17 @@
+"""
+Benchmarks (pytest-benchmark). Not collected by a plain `pytest` run, see
+compare.py for running them and checking for regressions.
+"""
+
+import asyncio
+from typing import Iterator
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def loop() -> Iterator[asyncio.AbstractEventLoop]:
+    """for benchmarking coroutines with `loop.run_until_complete`"""
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
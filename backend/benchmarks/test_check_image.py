@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from acine.runtime.check_image import check_similarity
+from acine_proto_dist.position_pb2 import Rect
+from acine_proto_dist.routine_pb2 import Routine
+from pytest_benchmark.fixture import BenchmarkFixture
+
+Method = Routine.Condition.Image.Method
+
+rng = np.random.default_rng(0)
+IMG = rng.integers(0, 256, (360, 640, 3), np.uint8)
+
+
+@pytest.mark.parametrize(
+    "method",
+    (
+        Method.METHOD_TM_CCORR_NORMED,
+        Method.METHOD_TM_CCOEFF_NORMED,
+        Method.METHOD_TM_SQDIFF_NORMED,
+    ),
+    ids=["ccorr", "ccoeff", "sqdiff"],
+)
+@pytest.mark.parametrize("size", (8, 32, 128))
+@pytest.mark.parametrize("match_limit", (1, 10))
+def test_check_similarity(
+    benchmark: BenchmarkFixture,
+    method: Method.ValueType,
+    size: int,
+    match_limit: int,
+) -> None:
+    """template from the frame, searched for in a region twice its size"""
+    x, y, m = 300, 150, size // 2
+    c = Routine.Condition.Image(
+        threshold=0.9,
+        match_limit=match_limit,
+        method=method,
+        regions=[Rect(left=x, top=y, right=x + size - 1, bottom=y + size - 1)],
+        allow_regions=[
+            Rect(left=x - m, top=y - m, right=x + size + m - 1, bottom=y + size + m - 1)
+        ],
+    )
+    result = benchmark(check_similarity, c, IMG, IMG)
+    assert result and result[0].position == (y, x)
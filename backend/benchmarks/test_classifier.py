@@ -0,0 +1,25 @@
+import numpy as np
+import pytest
+from acine.classifier import StateClassifier
+from acine.runtime.synthetic import render
+
+STATES = [f"s{i}" for i in range(100)]
+
+
+@pytest.fixture(scope="module")
+def frames() -> list[np.ndarray]:
+    return [render(s) for s in STATES]
+
+
+@pytest.mark.parametrize("backend", ["centroid", "linear"])
+def test_classify(benchmark, frames: list[np.ndarray], backend: str) -> None:
+    c = StateClassifier({s: [img] for s, img in zip(STATES, frames)}, backend)
+    c.train()
+    assert benchmark(c.classify, frames[7]) == STATES[7]
+
+
+@pytest.mark.parametrize("backend", ["centroid", "linear"])
+def test_classify_batch(benchmark, frames: list[np.ndarray], backend: str) -> None:
+    c = StateClassifier({s: [img] for s, img in zip(STATES, frames)}, backend)
+    c.train()
+    assert benchmark(c.classify_batch, frames) == STATES
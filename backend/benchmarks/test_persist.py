@@ -0,0 +1,49 @@
+import random
+import shutil
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+from acine.persist import PrefixedFilesystem, mkdir, resolve
+from pytest_benchmark.fixture import BenchmarkFixture
+
+FILES = 20
+SIZE = 64 * 1024
+
+
+@pytest.fixture
+def pfs() -> Iterator[PrefixedFilesystem]:
+    shutil.rmtree(resolve("bench"), ignore_errors=True)
+    mkdir(["bench"])
+    yield PrefixedFilesystem(["bench"])
+    shutil.rmtree(resolve("bench"), ignore_errors=True)
+
+
+def fill(pfs: PrefixedFilesystem) -> None:
+    rng = random.Random(0)
+    for i in range(FILES):
+        pfs.write_archive_sync([f"f{i}.bmp"], rng.randbytes(SIZE))
+
+
+def test_archive_append(benchmark: BenchmarkFixture, pfs: PrefixedFilesystem) -> None:
+    """appending FILES frames to a fresh archive"""
+
+    def setup() -> None:
+        Path(pfs.resolve("archive.7z")).unlink(missing_ok=True)
+
+    benchmark.pedantic(fill, args=(pfs,), setup=setup, rounds=5)
+
+
+def test_archive_read(benchmark: BenchmarkFixture, pfs: PrefixedFilesystem) -> None:
+    """reading one frame out of FILES"""
+    fill(pfs)
+    benchmark(pfs.read_archive_sync, [f"f{FILES // 2}.bmp"])
+
+
+def test_archive_read_many(
+    benchmark: BenchmarkFixture, pfs: PrefixedFilesystem
+) -> None:
+    """reading every frame in one pass"""
+    fill(pfs)
+    names = [f"f{i}.bmp" for i in range(FILES)]
+    assert len(benchmark(pfs.read_archive_many_sync, names)) == FILES
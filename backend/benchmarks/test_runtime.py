@@ -0,0 +1,39 @@
+import asyncio
+from random import Random
+
+import pytest
+from acine.clock import VirtualClock, use_clock
+from acine.runtime.runtime import Routine, Runtime
+from acine.runtime.synthetic import from_routine
+from pytest_benchmark.fixture import BenchmarkFixture
+from tests.runtime.util import create_from_edge_list
+
+
+def graph(n: int, extra: int, seed: int = 0) -> Routine:
+    """a cycle through n nodes plus `extra` random edges"""
+    rng = Random(seed)
+    ids = ["start"] + [f"n{i}" for i in range(1, n)]
+    edges = list(zip(ids, ids[1:] + ids[:1]))
+    edges += [(rng.choice(ids), rng.choice(ids)) for _ in range(extra)]
+    return create_from_edge_list(*edges)
+
+
+@pytest.mark.parametrize("n", (100, 1000))
+def test_goto(
+    benchmark: BenchmarkFixture, loop: asyncio.AbstractEventLoop, n: int
+) -> None:
+    """navigation between 10 random nodes (routing, ranking, checks, replays)"""
+    routine = graph(n, extra=n)
+    targets = Random(1).sample(sorted(routine.nodes), 10)
+
+    async def run() -> None:
+        env = from_routine(routine, conditions=False)
+        with Runtime(routine, env) as rt:
+            for target in targets:
+                await rt.goto(target)
+
+    def tour() -> None:
+        with use_clock(VirtualClock()):
+            loop.run_until_complete(run())
+
+    benchmark(tour)
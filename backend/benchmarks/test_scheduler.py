@@ -0,0 +1,95 @@
+import asyncio
+from typing import List
+
+import pytest
+from acine.scheduler.cron import Schedule, next
+from acine.scheduler.scheduler import Scheduler
+from acine.scheduler.typing import ExecResult, ISchedulerRoutineInterface
+from acine_proto_dist.routine_pb2 import Routine
+from pytest_benchmark.fixture import BenchmarkFixture
+
+
+class AlwaysOk(ISchedulerRoutineInterface):
+    async def goto(self, e: Routine.Edge) -> ExecResult.ValueType:
+        return ExecResult.REQUIREMENT_TYPE_COMPLETION
+
+
+def dependency_chain(depth: int, width: int = 1) -> Routine:
+    """`width` chains of `depth` edges, each requiring the one before it"""
+    node = Routine.Node(id="start")
+    for j in range(width):
+        for i in range(depth):
+            e = node.edges.add(id=f"{j}-{i}", u="start", to="start")
+            if i:
+                e.dependencies.add(
+                    requires=f"{j}-{i - 1}",
+                    requirement=Routine.REQUIREMENT_TYPE_COMPLETION,
+                    type=Routine.DEPENDENCY_TYPE_EXPLICIT,
+                    count=1,
+                )
+    return Routine(nodes={"start": node})
+
+
+@pytest.mark.parametrize("depth,width", ((100, 1), (1000, 1), (100, 10)))
+def test_scheduler(
+    benchmark: BenchmarkFixture,
+    loop: asyncio.AbstractEventLoop,
+    depth: int,
+    width: int,
+) -> None:
+    """scheduling the ends of the chains, until everything has run"""
+    routine = dependency_chain(depth, width)
+    ends = [e for e in routine.nodes["start"].edges if e.id.endswith(f"-{depth - 1}")]
+
+    async def run() -> int:
+        scheduler = Scheduler(AlwaysOk(routine))
+        for i, e in enumerate(ends):
+            scheduler.schedule(e, i)
+        steps = 0
+        while await scheduler.next():
+            steps += 1
+        return steps
+
+    steps = benchmark(lambda: loop.run_until_complete(run()))
+    assert steps >= depth * width
+
+
+def group(period: Routine.SchedulingGroup.Period.ValueType) -> Routine.SchedulingGroup:
+    return Routine.SchedulingGroup(
+        period_preset=period,
+        period=3600,
+        dispatch_times=[0, 600, 1800, 3000],
+    )
+
+
+@pytest.mark.parametrize(
+    "period",
+    (
+        Routine.SchedulingGroup.Period.PERIOD_UNSPECIFIED,
+        Routine.SchedulingGroup.Period.PERIOD_DAILY,
+        Routine.SchedulingGroup.Period.PERIOD_MONTHLY,
+    ),
+    ids=["fixed", "daily", "monthly"],
+)
+def test_cron_schedule(
+    benchmark: BenchmarkFixture, period: Routine.SchedulingGroup.Period.ValueType
+) -> None:
+    """10k lookups with a compiled Schedule, spread over a year"""
+    schedule = Schedule(group(period))
+    ts = [1.7e9 + i * 3153.6 for i in range(10_000)]
+
+    def run() -> List[float]:
+        return [schedule.next(t) for t in ts]
+
+    benchmark(run)
+
+
+def test_cron_next(benchmark: BenchmarkFixture) -> None:
+    """1k lookups through `cron.next` (compiles the group each call)"""
+    s = group(Routine.SchedulingGroup.Period.PERIOD_DAILY)
+    ts = [1.7e9 + i * 31536.0 for i in range(1000)]
+
+    def run() -> List[float]:
+        return [next(t, s) for t in ts]
+
+    benchmark(run)
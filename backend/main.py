@@ -2,7 +2,9 @@ import asyncio
 import os
 from typing import Final
 
+from acine.diagnostics import configure
 from acine.instance_manager import EXAMPLE_ID, Routine, create_testenv, validate_routine
+from acine.sampling import get_sampling_pool
 from acine.server import AcineServerProtocol
 from autobahn.asyncio.websocket import WebSocketServerFactory  # type: ignore
 
@@ -11,6 +13,7 @@ PORT: Final[int] = int(os.environ.get("BACKEND_PORT", "9000"))
 
 
 async def main() -> None:
+    configure()
     # make sure Example Routine (testenv) exists
     if not validate_routine(Routine(id=EXAMPLE_ID)):
         create_testenv()
@@ -23,7 +26,10 @@ async def main() -> None:
     server = await loop.create_server(factory, HOST, PORT)
 
     print("starting")
-    await server.serve_forever()
+    try:
+        await server.serve_forever()
+    finally:
+        get_sampling_pool().close()  # frees shared memory
 
 
 if __name__ == "__main__":
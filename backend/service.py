@@ -4,37 +4,69 @@ Process to schedule all active routines.
 
 import asyncio
 import datetime
+import logging
+import os
+import sys
 import time
-import traceback
 
-from acine.instance_manager import get_routines
+from acine.diagnostics import configure
+from acine.instance_manager import get_last_runs, get_routines
+from acine.metrics import METRICS, serve
 from acine.power.win32 import sleep
-from acine.scheduler.multischeduler import Multischeduler
+from acine.scheduler.instance_pool import InstancePool
+from acine.scheduler.multischeduler import MAX_CONCURRENCY, Multischeduler
+from acine.scheduler.routine_instance import RoutineInstance
+
+METRICS_PORT = os.environ.get("ACINE_METRICS_PORT")
+
+log = logging.getLogger("acine.service")
 
 
 async def main() -> int:
-    routines = get_routines(full=True)
-    ms = Multischeduler(routines)
+    configure()
+    interactive = sys.stdout.isatty()  # redraw status in place, not in a file
+    if METRICS_PORT:
+        METRICS.enabled = True
+        await serve("127.0.0.1", int(METRICS_PORT))
+        print(f"Metrics on http://127.0.0.1:{METRICS_PORT}/metrics")
+
+    routines = get_routines()
+    pool = InstancePool(RoutineInstance)  # keeps windows open between runs
+    ms = Multischeduler(
+        routines,
+        max_concurrency=MAX_CONCURRENCY,
+        open_instance=pool.open,
+        last_runs=get_last_runs,
+    )
 
     k = len(str(ms).split("\n")) + 2
-    print("\n" * k)
+    if interactive:
+        print("\n" * k)
 
     while True:
         try:
+            if ms.dispatch():
+                if interactive:
+                    print("\n" * k)
+                else:
+                    log.info("dispatched\n%s", ms)
             next_unix = ms.next_time()
             idle_time = next_unix - time.time()
-            print("\33[F\33[2K" * k, "\n" + str(ms), flush=True)
-            print("clock", datetime.datetime.fromtimestamp(time.time()))
-            if idle_time > 60:
+            if interactive:
+                print("\33[F\33[2K" * k, "\n" + str(ms), flush=True)
+                print("clock", datetime.datetime.fromtimestamp(time.time()))
+            await pool.evict()
+            if ms.running:
+                await ms.wait(timeout=1)  # wakes early once a routine finishes
+            elif idle_time > 60:
+                await pool.close()  # don't keep windows open while asleep
                 await sleep(idle_time - 10)
             else:
                 await sleep(1)
-            if idle_time <= 0:
-                await ms.get_next().run()
-                print("\n" * k)
-        except BaseException as e:
-            print(e)
-            traceback.print_exc()
+        except BaseException:
+            log.exception("service stopped")
+            await ms.close()
+            await pool.close()
             return 1
 
 
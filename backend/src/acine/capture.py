@@ -5,11 +5,13 @@ NOTE: Capture does not capture (seems to fail) when the window is visible,
 but partially offscreen.
 """
 
+import logging
 from asyncio import Lock, Semaphore, sleep
 from typing import Optional
 
 import cv2
 from acine.input_handler import get_title_bar_height
+from acine.persist import run_io
 from acine.runtime.check_image import ImageBmpType
 from numpy import ndarray, uint8
 from windows_capture import (  # type: ignore
@@ -18,6 +20,8 @@ from windows_capture import (  # type: ignore
     WindowsCapture,
 )
 
+log = logging.getLogger(__name__)
+
 
 class GameCapture:  # thanks joshua
     """
@@ -52,7 +56,7 @@ class GameCapture:  # thanks joshua
             # if window_name=="", capture active window
             # if window_name==None, capture current screen
         )
-        print("Capture Session Opened", self.window_name)
+        log.info("capture session opened %s", self.window_name)
 
         @self.capture.event
         def on_frame_arrived(frame: Frame, control: InternalCaptureControl) -> None:
@@ -60,7 +64,7 @@ class GameCapture:  # thanks joshua
 
             if self.closed:
                 # This won't appear until the window is unminimized.
-                print("Capture Session Closed (via control)")
+                log.info("capture session closed (via control)")
                 control.stop()
 
             if self.get_png_frame_lock.locked():
@@ -93,7 +97,8 @@ class GameCapture:  # thanks joshua
         # called when the window closes
         @self.capture.event
         def on_closed() -> None:
-            print("Capture Session Closed")
+            log.info("capture session closed")
+            self.closed = True
 
         self.capture.start_free_threaded()
 
@@ -117,7 +122,7 @@ class GameCapture:  # thanks joshua
     async def get_png_frame(self) -> tuple[ndarray, int, int]:
         """gets a png encoded frame (data, width, height)"""
         await self.__next_frame()
-        _, framedata_png = cv2.imencode(".png", self.data)
+        _, framedata_png = await run_io(cv2.imencode, ".png", self.data)
         return (framedata_png, *self.dimensions)
 
 
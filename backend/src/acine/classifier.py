@@ -1,5 +1,3 @@
-# mypy: ignore-errors
-
 """
 Classifier code for the saved frames, used to determine which state you are in.
 
@@ -39,84 +37,195 @@ After a bit of testing, seems to work well?
 Decision tree could be used to decide which pixels to read, but this would
 be difficult to implement (?). If it is pixel-based, then downscaling doesn't
 make sense since it involves a full capture.
+
+Engine
+---
+
+`StateClassifier` works on raw frames (as captured, no PNG roundtrip), shrunk
+to DIMENSIONS, and classifies whole batches with one matrix product. It trains
+on first use (`for_routine` only reads the samples then), with one of:
+- "centroid" (default): nearest mean of each state's samples, can reject
+  frames too far from every state
+- "linear": ridge regression one-vs-rest
+- "ydf": the gradient boosted trees from before (optional dependency)
 """
 
-import os
+from __future__ import annotations
+
+from typing import Callable, Final, List, Mapping, Optional, Sequence, Tuple
 
 import cv2
 import numpy as np
-import ydf  # type: ignore
-from acine.persist import fs_read_sync as fs_read
-from acine_proto_dist.frame_pb2 import Frame
+from acine.runtime.check_image import ImageBmpType
+from acine.runtime.util import read_frame
 from acine_proto_dist.routine_pb2 import Routine
-from numpy import ndarray
 
-DIMENSIONS = (10, 10)
-rt = Routine.FromString(fs_read(["rt.pb"]))
+DIMENSIONS: Final[Tuple[int, int]] = (10, 10)
+"""(width, height) frames are shrunk to"""
+
+
+def features(imgs: Sequence[ImageBmpType], dimensions=DIMENSIONS) -> np.ndarray:
+    """frames -> (n, w * h * 3) float32, pixel values scaled to [0, 1]"""
+    w, h = dimensions
+    X = np.empty((len(imgs), w * h * 3), np.float32)
+    for i, img in enumerate(imgs):
+        small = cv2.resize(img, dimensions, interpolation=cv2.INTER_AREA)
+        X[i] = small.reshape(-1)
+    X *= 1 / 255
+    return X
+
+
+class Backend:
+    """learns scores (higher is more likely) of each class from features"""
+
+    def fit(self, X: np.ndarray, y: np.ndarray, k: int) -> None:
+        raise NotImplementedError()
+
+    def scores(self, X: np.ndarray) -> np.ndarray:
+        """(n, features) -> (n, k)"""
+        raise NotImplementedError()
+
 
-lookup = {}
-for i, s in enumerate(rt.states):
-    for x in s.samples:
-        lookup[rt.frames[x].id] = i
+class CentroidBackend(Backend):
+    """score is the negative squared distance to the class mean"""
 
+    def fit(self, X: np.ndarray, y: np.ndarray, k: int) -> None:
+        self.centroids = np.stack([X[y == i].mean(axis=0) for i in range(k)])
+        self.norms = (self.centroids**2).sum(axis=1)
 
-def fetch(f: Frame):
-    b = fs_read(["img", f"{f.id}.png"])
-    nparr = np.frombuffer(b, np.uint8)
-    X = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-    X = cv2.resize(X, DIMENSIONS)
-    Y = lookup.get(f.id, None)
-    # X.shape is (width, height, 3) ; 3 for RGB
-    X = X.flatten()
-    return (X, Y)
+    def scores(self, X: np.ndarray) -> np.ndarray:
+        # -|x - c|^2 = 2 x.c - |c|^2 - |x|^2
+        d = 2 * X @ self.centroids.T - self.norms
+        d -= (X**2).sum(axis=1, keepdims=True)
+        return d
 
 
-fetched = tuple(map(fetch, rt.frames))
-# print("samples", len(lookup))
-# print("size of first element", len(fetched[0][0]))
+class LinearBackend(Backend):
+    """ridge regression onto one-hot labels (closed form)"""
 
-pngs = [x for x, y in fetched if y is not None]
-labels = [y for _, y in fetched if y is not None]
-dataset: dict[str, ndarray] = {
-    "png": np.stack(pngs),
-    "state": np.array(labels),
+    def __init__(self, alpha: float = 1.0):
+        self.alpha = alpha
+
+    def fit(self, X: np.ndarray, y: np.ndarray, k: int) -> None:
+        X1 = np.hstack([X, np.ones((len(X), 1), X.dtype)])
+        Y = np.eye(k, dtype=np.float32)[y]
+        A = X1.T @ X1 + self.alpha * np.eye(X1.shape[1], dtype=np.float32)
+        self.W = np.linalg.solve(A, X1.T @ Y).astype(np.float32)
+
+    def scores(self, X: np.ndarray) -> np.ndarray:
+        return X @ self.W[:-1] + self.W[-1]
+
+
+class YdfBackend(Backend):
+    """gradient boosted trees (needs `ydf`, imported on first use)"""
+
+    def __init__(self, **kwargs: object):
+        self.kwargs = kwargs
+
+    def fit(self, X: np.ndarray, y: np.ndarray, k: int) -> None:
+        import ydf  # type: ignore
+
+        learner = ydf.GradientBoostedTreesLearner(label="state", **self.kwargs)
+        self.k = k
+        self.model = learner.train({"x": X, "state": y})
+
+    def scores(self, X: np.ndarray) -> np.ndarray:
+        p = np.asarray(self.model.predict({"x": X}))
+        if p.ndim == 1:  # binary: probability of the second class
+            p = np.stack([1 - p, p], axis=1)
+        return p
+
+
+BACKENDS: Final[dict[str, Callable[[], Backend]]] = {
+    "centroid": CentroidBackend,
+    "linear": LinearBackend,
+    "ydf": YdfBackend,
 }
 
-if not os.path.exists("model.ydf"):
-    model = ydf.GradientBoostedTreesLearner(
-        label="state",
-        # max_vocab_count=100,
-        num_threads=12,
-        # validation_ratio=0.0,
-    ).train(dataset)
-    model.save("model.ydf")
-else:
-    model = ydf.load_model("model.ydf")
+SamplesType = Mapping[str, Sequence[ImageBmpType]]
 
 
-def predict(data: np.ndarray) -> str:
+class StateClassifier:
     """
-    Make a prediction about what state you're in.
-    Used in server for testing the model.
+    Tells which state a frame shows. Trains on the first classify call, from
+    `samples` (state id -> sample frames) or a loader returning them.
+
+    With the centroid backend, `max_distance` (mean squared pixel difference,
+    pixels in [0, 1]) makes frames unlike every state classify as None.
     """
-    img = cv2.imdecode(data, cv2.IMREAD_COLOR)  # 25% time spent decode
-    X = cv2.resize(img, DIMENSIONS)
-    X = X.flatten()
-    X = {"png": np.stack([X])}
-    pred = model.predict(X)[0]  # 75% time spent predict (why so slow??)
-    y = np.argmax(pred)
-    return rt.states[y].name
-
-
-if __name__ == "__main__":
-    for f in rt.frames:
-        X, Y = fetch(f)
-        if Y is None:
-            continue
-        X = {"png": np.stack([X])}
-        y = np.argmax(model.predict(X)[0])
-        if y != Y:
-            print(y, Y, end=" ")
-            print([rt.states[i].name for i in (y, Y)])
-
-    print(model.benchmark(dataset))
+
+    def __init__(
+        self,
+        samples: SamplesType | Callable[[], SamplesType],
+        backend: str | Backend = "centroid",
+        dimensions: Tuple[int, int] = DIMENSIONS,
+        max_distance: Optional[float] = None,
+    ):
+        self.samples = samples
+        self.backend = BACKENDS[backend]() if isinstance(backend, str) else backend
+        self.dimensions = dimensions
+        self.max_distance = max_distance
+        self.states: List[str] = []
+        """class index -> state id"""
+
+        self.trained = False
+
+    @classmethod
+    def for_routine(
+        cls,
+        routine: Routine,
+        read: Callable[[str, str], ImageBmpType] = read_frame,
+        **kwargs,
+    ) -> StateClassifier:
+        """
+        Classifies into `routine.states`, trained on their samples
+        (read when first needed).
+        """
+
+        def load() -> SamplesType:
+            return {
+                id: [read(routine.id, frame_id) for frame_id in state.samples]
+                for id, state in routine.states.items()
+                if state.samples
+            }
+
+        return cls(load, **kwargs)
+
+    def train(self) -> None:
+        samples = self.samples() if callable(self.samples) else self.samples
+        self.states = sorted(samples)
+        assert self.states, "no samples to train on"
+        imgs = [img for id in self.states for img in samples[id]]
+        y = np.array([i for i, id in enumerate(self.states) for _ in samples[id]])
+        self.backend.fit(features(imgs, self.dimensions), y, len(self.states))
+        self.trained = True
+
+    def scores(self, imgs: Sequence[ImageBmpType]) -> np.ndarray:
+        """(frames, states) scores, see Backend"""
+        if not self.trained:
+            self.train()
+        return self.backend.scores(features(imgs, self.dimensions))
+
+    def classify_batch(self, imgs: Sequence[ImageBmpType]) -> List[Optional[str]]:
+        if not imgs:
+            return []
+        S = self.scores(imgs)
+        best = S.argmax(axis=1)
+        out: List[Optional[str]] = [self.states[i] for i in best]
+        if self.max_distance is not None and isinstance(self.backend, CentroidBackend):
+            limit = -self.max_distance * self.backend.centroids.shape[1]
+            for j, i in enumerate(best):
+                if S[j, i] < limit:
+                    out[j] = None
+        return out
+
+    def classify(self, img: ImageBmpType) -> Optional[str]:
+        """state id of a frame"""
+        return self.classify_batch([img])[0]
+
+
+def nodes_in_state(routine: Routine, state_id: Optional[str]) -> List[str]:
+    """ids of the nodes recognized by a state (Node.state_id)"""
+    if not state_id:
+        return []
+    return [id for id, node in routine.nodes.items() if node.state_id == state_id]
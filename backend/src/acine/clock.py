@@ -0,0 +1,120 @@
+"""
+Injectable time source.
+
+`acine.runtime.util.now/sleep` (so Runtime, check and replays) and the
+scheduler package (Scheduler, ManagedRuntime, Multischeduler, InstancePool)
+read the clock installed by `use_clock`, the wall clock by default.
+RateLimitFilter takes a `now` callable, pass `clock.monotonic` to put it on
+the same clock.
+
+VirtualClock makes waiting free: once every task is asleep on it, time jumps
+to the earliest wake-up, so a run full of timeouts and replay delays takes
+milliseconds and always interleaves the same way. It only knows about waits
+that go through it; anything else (threads, sockets) doesn't hold time back.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Final, Iterator, List, Optional, Tuple, TypeVar
+
+
+class Clock:
+    """wall clock (seconds, like time.time / asyncio.sleep)"""
+
+    def time(self) -> float:
+        return time.time()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    async def sleep(self, dt: float) -> None:
+        await asyncio.sleep(dt)
+
+
+class VirtualClock(Clock):
+    """
+    Time that only moves when everything waits on it.
+
+    Sleepers wake in order of wake-up time (ties in order of calling sleep).
+    Before each jump the clock yields to the event loop `settle` times so tasks
+    that are still runnable (f.e. handing off through a queue) get to run first.
+    """
+
+    SETTLE: Final[int] = 16
+
+    def __init__(self, t: float = 0.0, settle: int = SETTLE):
+        self.t = t
+        self.settle = settle
+        self.sleepers: List[Tuple[float, int, asyncio.Future[None]]] = []
+        """heap of (wake-up time, sequence number, waiter)"""
+
+        self.seq = 0
+        self.advancer: Optional[asyncio.Task[None]] = None
+
+    def time(self) -> float:
+        return self.t
+
+    def monotonic(self) -> float:
+        return self.t
+
+    async def sleep(self, dt: float) -> None:
+        if dt <= 0:
+            await asyncio.sleep(0)
+            return
+        loop = asyncio.get_running_loop()
+        waiter: asyncio.Future[None] = loop.create_future()
+        heapq.heappush(self.sleepers, (self.t + dt, self.seq, waiter))
+        self.seq += 1
+        if self.advancer is None or self.advancer.done():
+            self.advancer = loop.create_task(self.__advance())
+        await waiter
+
+    def advance(self, dt: float) -> None:
+        """moves time forward by hand, waking whoever is due"""
+        self.t += max(0.0, dt)
+        self.__wake()
+
+    async def __advance(self) -> None:
+        while self.sleepers:
+            for _ in range(self.settle):
+                await asyncio.sleep(0)
+            while self.sleepers and self.sleepers[0][2].done():
+                heapq.heappop(self.sleepers)  # cancelled
+            if self.sleepers:
+                self.t = max(self.t, self.sleepers[0][0])
+                self.__wake()
+
+    def __wake(self) -> None:
+        while self.sleepers and self.sleepers[0][0] <= self.t:
+            _, _, waiter = heapq.heappop(self.sleepers)
+            if not waiter.done():
+                waiter.set_result(None)
+
+
+WALL_CLOCK: Final[Clock] = Clock()
+
+C = TypeVar("C", bound=Clock)
+
+_clock: ContextVar[Clock] = ContextVar("clock", default=WALL_CLOCK)
+
+
+def get_clock() -> Clock:
+    return _clock.get()
+
+
+@contextmanager
+def use_clock(clock: C) -> Iterator[C]:
+    """
+    Installs `clock` for the current context. Tasks created inside the block
+    keep using it (they copy the context when created).
+    """
+    token = _clock.set(clock)
+    try:
+        yield clock
+    finally:
+        _clock.reset(token)
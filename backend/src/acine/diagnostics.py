@@ -0,0 +1,122 @@
+"""
+Diagnostics logging (stdlib `logging`).
+
+- modules log to `logging.getLogger(__name__)` with %-style arguments, so
+  messages are only formatted when they will actually be emitted
+- per-tick messages (check polls, navigation steps) pass `extra=TICK` and are
+  rate-limited by RateLimitFilter
+- `configure()` hands records to a background thread through a queue, so the
+  event loop never blocks on writing to stdout (or a file it's redirected to)
+
+Level is taken from ACINE_LOG_LEVEL (default INFO).
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from contextlib import contextmanager
+from typing import Callable, Final, Iterator, Optional, TextIO
+
+TICK: Final[dict[str, bool]] = {"tick": True}
+"""`extra=TICK` marks a message that repeats every tick (gets rate-limited)"""
+
+FORMAT: Final[str] = "%(asctime)s %(levelname).1s %(name)s: %(message)s"
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through at most `burst` of each per-tick message (same logger and
+    format string) per `interval` seconds. The next one let through says how
+    many were dropped. Other messages aren't limited.
+    """
+
+    def __init__(
+        self,
+        interval: float = 1.0,
+        burst: int = 1,
+        now: Callable[[], float] = time.monotonic,
+    ):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.now = now
+        self.windows: dict[tuple[str, object], tuple[float, int, int]] = {}
+        """(logger, msg) -> (window start, let through, dropped)"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "tick", False):
+            return True
+        key = (record.name, record.msg)
+        t = self.now()
+        start, sent, dropped = self.windows.get(key, (t, 0, 0))
+        if t - start >= self.interval:
+            start, sent = t, 0
+        if sent >= self.burst:
+            self.windows[key] = (start, sent, dropped + 1)
+            return False
+        if dropped:
+            record.msg = f"{record.msg} (+{dropped} suppressed)"
+        self.windows[key] = (start, sent + 1, 0)
+        return True
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+"""background writer set up by `configure`"""
+
+
+def configure(
+    level: Optional[int | str] = None,
+    stream: Optional[TextIO] = None,
+    rate_limit: Optional[RateLimitFilter] = None,
+) -> None:
+    """
+    Sets up the `acine` loggers to write to `stream` (stdout) from a
+    background thread. Calling it again replaces the previous setup.
+    """
+    global _listener
+    stop()
+    if level is None:
+        level = os.environ.get("ACINE_LOG_LEVEL", "INFO").upper()
+    logger = logging.getLogger("acine")
+    for handler in list(logger.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            logger.removeHandler(handler)
+
+    q: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+    handler = logging.handlers.QueueHandler(q)
+    handler.addFilter(rate_limit or RateLimitFilter())
+    out = logging.StreamHandler(stream or sys.stdout)
+    out.setFormatter(logging.Formatter(FORMAT, datefmt="%H:%M:%S"))
+    _listener = logging.handlers.QueueListener(q, out)
+    _listener.start()
+
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+
+
+@atexit.register
+def stop() -> None:
+    """writes out what's queued and stops the background writer"""
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
+
+
+@contextmanager
+def quiet(name: str = "acine", level: int = logging.ERROR) -> Iterator[None]:
+    """only lets through messages of at least `level` for the duration"""
+    logger = logging.getLogger(name)
+    previous = logger.level
+    logger.setLevel(level)
+    try:
+        yield
+    finally:
+        logger.setLevel(previous)
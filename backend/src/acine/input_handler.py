@@ -45,6 +45,7 @@ With further testing, turns out this is a result of changing to v2.
 """
 
 import ctypes
+import logging
 from os import system
 from typing import Optional
 
@@ -53,6 +54,8 @@ from ahk import AsyncAHK, AsyncWindow
 
 ahk = AsyncAHK(version="v2")
 
+log = logging.getLogger(__name__)
+
 win32user = ctypes.windll.user32
 win32user.SetProcessDPIAware()
 # GetClientRect will give values with Scaling applied (can be used to do offset)
@@ -86,7 +89,6 @@ class InputHandler:
         self.is_mouse_down = False
         self.x = 0
         self.y = 0
-        print(f"y-offset(titlebar)={self.y_offset}")
 
     async def init(self) -> None:
         if self._init_completed:
@@ -112,12 +114,17 @@ class InputHandler:
             await self.win.restore()
             await self.win.activate()  # min/res/act used to ensure mouse works
             await self.win.to_bottom()  # not necessary
-            print(await self.win.title, self.win)
-            print(await self.win.get_position())
+            log.info(
+                "attached to %s %s at %s",
+                await self.win.title,
+                self.win,
+                await self.win.get_position(),
+            )
             self.can_close = True
             # y_offset is implicitly handled via removing the title bar ??
             # somehow half is needed... i dont know why
             self.y_offset = get_title_bar_height(await self.win.get_title()) // 2
+            log.debug("y-offset(titlebar)=%d", self.y_offset)
         else:
             # target desktop
             raise NotImplementedError("Targeting desktop is not implemented.")
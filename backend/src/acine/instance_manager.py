@@ -8,12 +8,15 @@ import os
 from typing import Final, List
 from uuid import uuid4
 
+from acine.logging import last_run
 from acine.persist import (
     PrefixedFilesystem,
     fs_read_sync,
+    fs_write,
     fs_write_sync,
     mkdir,
     resolve,
+    run_io,
 )
 from acine_proto_dist.routine_pb2 import Routine
 from acine_proto_dist.runtime_pb2 import RuntimeData
@@ -55,15 +58,54 @@ def create_routine(routine: Routine, id: str = str(uuid4())) -> Routine:
         },
     )
     mkdir([id])
-    fs_write_sync([id, "rt.pb"], r.SerializeToString())
+    write_routine(r)
     fs_write_sync([id, "archive.7z"], RuntimeData(id=routine.id).SerializeToString())
     mkdir([id, "tmp"])
     mkdir([id, "img"])
     return r
 
 
+def get_routine_metadata(routine: Routine) -> Routine:
+    """
+    strips a routine down to its metadata (what is stored in `meta.pb`)
+
+    Scheduling groups are kept so scheduling can start without the full routine.
+    """
+    return Routine(
+        id=routine.id,
+        name=routine.name,
+        description=routine.description,
+        launch_config=routine.launch_config,
+        sgroups=routine.sgroups,
+    )
+
+
+def write_routine(routine: Routine) -> None:
+    """writes routine to filesystem and updates its metadata index (`meta.pb`)"""
+    fs_write_sync([routine.id, "rt.pb"], routine.SerializeToString())
+    metadata = get_routine_metadata(routine)
+    fs_write_sync([routine.id, "meta.pb"], metadata.SerializeToString())
+
+
+def read_routine_metadata(id: str) -> Routine:
+    """
+    reads routine metadata from the index,
+    rebuilds the index entry from `rt.pb` if it is missing
+    """
+    try:
+        return Routine.FromString(fs_read_sync([id, "meta.pb"]))
+    except FileNotFoundError:
+        metadata = get_routine_metadata(Routine.FromString(fs_read_sync([id, "rt.pb"])))
+        fs_write_sync([id, "meta.pb"], metadata.SerializeToString())
+        return metadata
+
+
 def get_routines(full: bool = False) -> List[Routine]:
-    """lists all routines available with minimal metadata (name,id,description)"""
+    """
+    lists all routines available with minimal metadata (see get_routine_metadata)
+
+    if full, parses the entire routine instead (slow when there are many frames)
+    """
 
     out = []
     for f in os.listdir(resolve()):
@@ -71,15 +113,10 @@ def get_routines(full: bool = False) -> List[Routine]:
             continue
         if os.path.isfile(resolve(f)):
             continue
-        r = Routine.FromString(fs_read_sync([f, "rt.pb"]))
-        if not full:
-            r = Routine(
-                id=r.id,
-                name=r.name,
-                description=r.description,
-                launch_config=r.launch_config,
-            )
-        out.append(r)
+        if full:
+            out.append(Routine.FromString(fs_read_sync([f, "rt.pb"])))
+        else:
+            out.append(read_routine_metadata(f))
     return sorted(out, key=lambda x: x.name)
 
 
@@ -108,9 +145,55 @@ def get_runtime_data(routine: Routine) -> RuntimeData:
         return RuntimeData(id=routine.id)
 
 
+async def get_runtime_data_async(routine: Routine) -> RuntimeData:
+    """get_runtime_data, but reads/parses on the i/o thread pool"""
+    return await run_io(get_runtime_data, routine)
+
+
+def get_schedule_state(routine: Routine, data: RuntimeData) -> RuntimeData:
+    """
+    strips runtime data down to what scheduling starts from (stored in
+    `schedule.pb`): when each scheduling group last ran
+    """
+    out = RuntimeData(id=routine.id)
+    for k, info in data.sgroups.items():
+        if info.HasField("last_run"):
+            out.sgroups[k].last_run.CopyFrom(info.last_run)
+    return out
+
+
+def get_last_runs(routine: Routine) -> dict[str, float]:
+    """
+    gets when each scheduling group last ran (see get_schedule_state),
+    rebuilds `schedule.pb` from the runtime data if it is missing
+    """
+    try:
+        state = RuntimeData.FromString(fs_read_sync([routine.id, "schedule.pb"]))
+    except FileNotFoundError:
+        state = get_schedule_state(routine, get_runtime_data(routine))
+        fs_write_sync([routine.id, "schedule.pb"], state.SerializeToString())
+    out: dict[str, float] = {}
+    for k, info in state.sgroups.items():
+        t = last_run(info)
+        if t is not None:
+            out[k] = t
+    return out
+
+
 def write_runtime_data(routine: Routine, data: RuntimeData) -> None:
+    """writes runtime data and its schedule state (`schedule.pb`)"""
     assert validate_routine(routine)
+    state = get_schedule_state(routine, data)
     fs_write_sync([routine.id, "runtimedata.pb"], data.SerializeToString())
+    fs_write_sync([routine.id, "schedule.pb"], state.SerializeToString())
+
+
+async def write_runtime_data_async(routine: Routine, data: RuntimeData) -> None:
+    """write_runtime_data, but writes on the i/o thread pool"""
+    assert validate_routine(routine)
+    state = get_schedule_state(routine, data)
+    await fs_write([routine.id, "runtimedata.pb"], data.SerializeToString())
+    await fs_write([routine.id, "schedule.pb"], state.SerializeToString())
 
 
 def get_pfs(routine: Routine) -> PrefixedFilesystem:
@@ -254,7 +337,7 @@ def create_testenv() -> None:
         # fail check early to do a repeat immediately
         node.default_condition.timeout = 1
 
-    fs_write_sync([id, "rt.pb"], r.SerializeToString())
+    write_routine(r)
 
 
 if __name__ == "__main__":
@@ -9,9 +9,10 @@ from __future__ import annotations
 import datetime
 from random import random
 from types import TracebackType
-from typing import Optional, Sequence, TypeAlias
+from typing import Callable, Iterator, Optional, Sequence, Tuple, TypeAlias
 
 from acine.runtime.util import now
+from acine_proto_dist.packet_pb2 import RuntimeEvents
 from acine_proto_dist.routine_pb2 import Routine
 from acine_proto_dist.runtime_pb2 import (
     Action,
@@ -54,6 +55,48 @@ def mark_success(info: ExecutionInfo) -> ExecutionInfo:
     return info
 
 
+def mark_deadline_missed(info: ExecutionInfo) -> ExecutionInfo:
+    """
+    Updates an ExecutionInfo with a deadline miss (scheduler dropped it).
+
+    :param info: What you're modifying (in-place)
+    :type info: ExecutionInfo
+    :return: info (after modified in-place)
+    :rtype: ExecutionInfo
+    """
+    info.stats.deadline_misses += 1
+    return info
+
+
+def mark_last_run(info: ExecutionInfo, t: float) -> ExecutionInfo:
+    """
+    Updates an ExecutionInfo with the time of its last completed run.
+
+    :param info: What you're modifying (in-place)
+    :type info: ExecutionInfo
+    :param t: seconds since UNIX epoch
+    :type t: float
+    :return: info (after modified in-place)
+    :rtype: ExecutionInfo
+    """
+    info.last_run.FromNanoseconds(int(t * 1e9))
+    return info
+
+
+def last_run(info: ExecutionInfo) -> Optional[float]:
+    """
+    Gets the time of the last completed run of an ExecutionInfo.
+
+    :param info: what to read from
+    :type info: ExecutionInfo
+    :return: seconds since UNIX epoch, None if it never ran
+    :rtype: Optional[float]
+    """
+    if not info.HasField("last_run"):
+        return None
+    return info.last_run.ToNanoseconds() / 1e9
+
+
 def is_edge_ready(data: RuntimeData, edge: Routine.Edge) -> bool:
     """
     Returns True if a edge is ready to run, might not be if failed too recently.
@@ -68,10 +111,105 @@ def is_edge_ready(data: RuntimeData, edge: Routine.Edge) -> bool:
     return now() >= data.edges[edge.id].stats.next_time.ToMilliseconds()
 
 
+def conditions(routine: Routine) -> Iterator[Tuple[str, Routine.Condition]]:
+    """
+    Every condition of a routine, with a key that stays the same across saves.
+
+    :param routine: routine to read from
+    :type routine: Routine
+    :return: (key, condition) pairs
+    :rtype: Iterator[Tuple[str, Routine.Condition]]
+    """
+    for node in routine.nodes.values():
+        yield f"node/{node.id}", node.default_condition
+        for edge in node.edges:
+            yield f"edge/{edge.id}/pre", edge.precondition
+            yield f"edge/{edge.id}/post", edge.postcondition
+
+
+def save_condition_records(routine: Routine, data: RuntimeData) -> RuntimeData:
+    """
+    Copies the condition records (pass times) of a routine into runtime data,
+    so they're persisted with it.
+
+    :param routine: routine to read from
+    :type routine: Routine
+    :param data: What you're modifying (in-place)
+    :type data: RuntimeData
+    :return: data (after modified in-place)
+    :rtype: RuntimeData
+    """
+    for key, condition in conditions(routine):
+        if condition.records:
+            data.conditions[key].ClearField("records")
+            data.conditions[key].records.extend(condition.records)
+    return data
+
+
+def load_condition_records(routine: Routine, data: RuntimeData) -> Routine:
+    """
+    Restores condition records saved by save_condition_records (these replace
+    whatever the routine had, f.e. from the editor).
+
+    :param routine: What you're modifying (in-place)
+    :type routine: Routine
+    :param data: runtime data to read from
+    :type data: RuntimeData
+    :return: routine (after modified in-place)
+    :rtype: Routine
+    """
+    for key, condition in conditions(routine):
+        if key in data.conditions:
+            condition.ClearField("records")
+            condition.records.extend(data.conditions[key].records)
+    return routine
+
+
+def summarize_runtime_data(data: RuntimeData) -> RuntimeData:
+    """
+    Copies runtime data without the event log (events are sent separately).
+
+    :param data: runtime data to summarize
+    :type data: RuntimeData
+    :return: a copy of data with events cleared
+    :rtype: RuntimeData
+    """
+    summary = RuntimeData()
+    summary.CopyFrom(data)
+    summary.ClearField("events")
+    return summary
+
+
+def get_runtime_events(data: RuntimeData, offset: int, count: int) -> RuntimeEvents:
+    """
+    Gets a page of events. Out of range offset/count are clamped.
+
+    :param data: runtime data to read from
+    :type data: RuntimeData
+    :param offset: index of the first event in the page
+    :type offset: int
+    :param count: maximum amount of events in the page
+    :type count: int
+    :return: events in [offset, offset + count)
+    :rtype: RuntimeEvents
+    """
+    total = len(data.events)
+    lo = min(max(0, offset), total)
+    hi = min(max(lo, offset + count), total)
+    return RuntimeEvents(
+        offset=lo, total=total, events=[data.events[i] for i in range(lo, hi)]
+    )
+
+
+def get_recent_runtime_events(data: RuntimeData, count: int) -> RuntimeEvents:
+    """Gets the page containing the last `count` events."""
+    return get_runtime_events(data, len(data.events) - count, count)
+
+
 class NavigationLogger:
     """
     Log navigation state.
-    Appends to given runtime_data on __exit__.
+    Appends to given runtime_data on __exit__, then calls on_exit (if set).
     """
 
     Exception: TypeAlias = Event.Exception
@@ -82,8 +220,10 @@ class NavigationLogger:
         context: RuntimeState,
         *,
         comment: Optional[str] = None,
+        on_exit: Optional[Callable[[Event], None]] = None,
     ):
         self.runtime_data = runtime_data
+        self.on_exit = on_exit
         self.event = Event()
         self.event.context.CopyFrom(context)
         if comment:
@@ -101,6 +241,8 @@ class NavigationLogger:
     ) -> Optional[bool]:
         self.event.time_end.FromDatetime(datetime.datetime.now(datetime.UTC))
         self.runtime_data.events.append(self.event)
+        if self.on_exit:
+            self.on_exit(self.runtime_data.events[-1])
         if exc_type and exc_val:
             raise exc_val
         return None
@@ -0,0 +1,245 @@
+"""
+Instrumentation for the hot paths (frame grabs, condition checks, routing,
+replays, log writes, scheduler runs): counters and latency histograms.
+
+Disabled unless ACINE_METRICS is set (or `METRICS.enabled = True`); while
+disabled, `span`/`start` return a shared no-op and `count`/`observe` return
+immediately, so leaving them in tight loops costs about one function call.
+
+Export with `METRICS.to_json()` / `METRICS.to_prometheus()`, or serve both over
+HTTP with `serve` (GET /metrics, /metrics.json).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import os
+import time
+from bisect import bisect_left
+from types import TracebackType
+from typing import Any, Final, List, Optional, Tuple
+
+BUCKETS: Final[Tuple[float, ...]] = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1,
+    2.5,
+    5,
+    10,
+    30,
+    math.inf,
+)
+"""histogram bucket upper bounds (seconds)"""
+
+LabelsType = Tuple[Tuple[str, str], ...]
+KeyType = Tuple[str, LabelsType]
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        """not cumulative (cumulated on export)"""
+
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> List[int]:
+        out: List[int] = []
+        total = 0
+        for x in self.counts:
+            total += x
+            out.append(total)
+        return out
+
+
+class Span:
+    """times a section into the `{name}_seconds` histogram"""
+
+    __slots__ = ("metrics", "name", "labels", "t0")
+
+    def __init__(self, metrics: Metrics, name: str, labels: dict[str, str]):
+        self.metrics = metrics
+        self.name = name
+        self.labels = labels
+        self.t0 = time.perf_counter()
+
+    def __enter__(self) -> Span:
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        self.stop()
+
+    def stop(self) -> None:
+        dt = time.perf_counter() - self.t0
+        self.metrics.observe(self.name + "_seconds", dt, **self.labels)
+
+
+class NoopSpan:
+    def __enter__(self) -> NoopSpan:
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+
+NOOP_SPAN: Final[NoopSpan] = NoopSpan()
+
+
+class Metrics:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.counters: dict[KeyType, float] = {}
+        self.histograms: dict[KeyType, Histogram] = {}
+
+    @staticmethod
+    def __key(name: str, labels: dict[str, str]) -> KeyType:
+        return (name, tuple(sorted(labels.items())))
+
+    def count(self, name: str, n: float = 1, **labels: str) -> None:
+        """adds `n` to the `{name}_total` counter"""
+        if not self.enabled:
+            return
+        key = self.__key(name + "_total", labels)
+        self.counters[key] = self.counters.get(key, 0) + n
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = self.__key(name, labels)
+        if key not in self.histograms:
+            self.histograms[key] = Histogram()
+        self.histograms[key].observe(value)
+
+    def span(self, name: str, **labels: str) -> Span | NoopSpan:
+        """`with span(...)`: times the block"""
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, labels)
+
+    def start(self, name: str, **labels: str) -> Span | NoopSpan:
+        """like span, for sections that don't fit in a block (call .stop())"""
+        return self.span(name, **labels)
+
+    def reset(self) -> None:
+        self.counters.clear()
+        self.histograms.clear()
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "counters": [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self.counters.items())
+            ],
+            "histograms": [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": h.count,
+                    "sum": h.sum,
+                    "buckets": {
+                        format_bound(le): x for le, x in zip(h.buckets, h.cumulative())
+                    },
+                }
+                for (name, labels), h in sorted(self.histograms.items())
+            ],
+        }
+
+    def to_prometheus(self, prefix: str = "acine_") -> str:
+        """Prometheus text exposition format"""
+        lines: List[str] = []
+        typed: set[str] = set()
+
+        def declare(name: str, type: str) -> None:
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} {type}")
+
+        for (name, labels), value in sorted(self.counters.items()):
+            declare(prefix + name, "counter")
+            lines.append(f"{prefix}{name}{format_labels(labels)} {value:g}")
+        for (name, labels), h in sorted(self.histograms.items()):
+            declare(prefix + name, "histogram")
+            for le, x in zip(h.buckets, h.cumulative()):
+                bucket = labels + (("le", format_bound(le)),)
+                lines.append(f"{prefix}{name}_bucket{format_labels(bucket)} {x}")
+            lines.append(f"{prefix}{name}_sum{format_labels(labels)} {h.sum:g}")
+            lines.append(f"{prefix}{name}_count{format_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+
+def format_bound(le: float) -> str:
+    return "+Inf" if le == math.inf else f"{le:g}"
+
+
+def format_labels(labels: LabelsType) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (k, v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in labels
+    )
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped) + "}"
+
+
+METRICS: Final[Metrics] = Metrics(enabled=bool(os.environ.get("ACINE_METRICS")))
+
+span = METRICS.span
+start = METRICS.start
+count = METRICS.count
+observe = METRICS.observe
+
+
+async def serve(
+    host: str, port: int, metrics: Metrics = METRICS
+) -> asyncio.AbstractServer:
+    """Serves GET /metrics (Prometheus text) and /metrics.json"""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = (await reader.readline()).decode(errors="replace").split()
+            while (await reader.readline()).strip():
+                pass  # skip headers
+            path = request[1] if len(request) >= 2 else ""
+            if path == "/metrics":
+                status, type = "200 OK", "text/plain; version=0.0.4"
+                body = metrics.to_prometheus()
+            elif path == "/metrics.json":
+                status, type = "200 OK", "application/json"
+                body = json.dumps(metrics.to_json())
+            else:
+                status, type, body = "404 Not Found", "text/plain", "not found\n"
+            data = body.encode()
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {type}\r\n"
+                f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode()
+                + data
+            )
+            await writer.drain()
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, host, port)
@@ -1,11 +1,16 @@
 """
 Image persistence / save to disk.
+
+Async functions run their blocking parts on a shared, bounded thread pool
+(see `run_io`) so the event loop stays free for input forwarding.
 """
 
+import asyncio
 import os
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from pathlib import Path
-from typing import Final, List, Optional
+from typing import Callable, Final, List, Optional, Sequence, TypeVar
 
 import py7zr
 from aiofiles import open as aopen
@@ -14,6 +19,31 @@ from py7zr.helpers import ArchiveTimestamp
 DIRNAME: Final[str] = os.path.dirname(__file__)
 PATH: Final[str] = os.path.join(DIRNAME, "..", "..", "data")
 
+IO_WORKERS: Final[int] = 8
+"""max amount of blocking operations (file i/o, encode/decode) running at once"""
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """shared thread pool for blocking i/o (created on first use)"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(IO_WORKERS, thread_name_prefix="acine-io")
+    return _executor
+
+
+async def run_io(fn: Callable[..., T], *args: object) -> T:
+    """
+    Runs a blocking function on the i/o thread pool.
+
+    Used for file access and image encode/decode, which would otherwise
+    stall everything else running on the event loop.
+    """
+    return await asyncio.get_running_loop().run_in_executor(get_executor(), fn, *args)
+
 
 def resolve(*paths: str) -> str:
     """
@@ -27,7 +57,7 @@ async def fs_write(filename: List[str], contents: bytes) -> None:
     """
     write as binary to file
     """
-    async with aopen(resolve(*filename), "wb") as f:
+    async with aopen(resolve(*filename), "wb", executor=get_executor()) as f:
         await f.write(contents)
 
 
@@ -52,11 +82,18 @@ async def fs_read(filename: List[str]) -> bytes:
     """
     read as binary from file
     """
-    async with aopen(resolve(*filename), "rb") as f:
+    async with aopen(resolve(*filename), "rb", executor=get_executor()) as f:
         out = await f.read()
     return out
 
 
+async def fs_read_many(filenames: Sequence[List[str]]) -> List[bytes]:
+    """
+    read multiple files concurrently (bounded by IO_WORKERS), keeps order
+    """
+    return await asyncio.gather(*(run_io(fs_read_sync, f) for f in filenames))
+
+
 def mkdir(dirpath: List[str]) -> None:
     """ensure folder exists"""
     os.makedirs(resolve(*dirpath), exist_ok=True)
@@ -126,6 +163,8 @@ class PrefixedFilesystem:
     def __init__(self, prefix: List[str] = []):
         if len(prefix):
             self.prefix = prefix
+        self.archive_lock = asyncio.Lock()
+        """archive is appended in place, so only allow one operation at a time"""
 
     def set_prefix(self, new_prefix: List[str]) -> None:
         self.prefix = new_prefix
@@ -137,6 +176,10 @@ class PrefixedFilesystem:
         return await fs_write([*self.prefix, *filename], contents)
 
     async def write_archive(self, filename: List[str], contents: bytes) -> None:
+        async with self.archive_lock:
+            await run_io(self.write_archive_sync, filename, contents)
+
+    def write_archive_sync(self, filename: List[str], contents: bytes) -> None:
         with py7zr.SevenZipFile(Path(self.resolve("archive.7z")), "a") as archive:
             # py7zr.SevenZipFile.write()
             folder = archive.header.initialize()
@@ -179,8 +222,30 @@ class PrefixedFilesystem:
     async def read(self, filename: List[str]) -> bytes:
         return await fs_read([*self.prefix, *filename])
 
+    async def read_many(self, filenames: Sequence[List[str]]) -> List[bytes]:
+        return await fs_read_many([[*self.prefix, *f] for f in filenames])
+
     async def read_archive(self, filename: List[str]) -> bytes:
+        async with self.archive_lock:
+            return await run_io(self.read_archive_sync, filename)
+
+    def read_archive_sync(self, filename: List[str]) -> bytes:
         factory = OutputStreamFactory()
         with py7zr.SevenZipFile(Path(self.resolve("archive.7z")), "r") as archive:
             archive.extract(factory=factory, path=self.resolve("tmp"), targets=filename)
         return next(iter(factory.files.values())).data
+
+    async def read_archive_many(self, filenames: Sequence[str]) -> dict[str, bytes]:
+        """reads several archive files in one pass over the archive"""
+        async with self.archive_lock:
+            return await run_io(self.read_archive_many_sync, filenames)
+
+    def read_archive_many_sync(self, filenames: Sequence[str]) -> dict[str, bytes]:
+        factory = OutputStreamFactory()
+        tmp = Path(self.resolve("tmp"))
+        with py7zr.SevenZipFile(Path(self.resolve("archive.7z")), "r") as archive:
+            archive.extract(factory=factory, path=tmp, targets=list(filenames))
+        return {
+            Path(k).relative_to(tmp).as_posix(): bytes(v.data)
+            for k, v in factory.files.items()
+        }
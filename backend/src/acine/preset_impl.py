@@ -2,43 +2,107 @@
 Utility classes that are basic implementation of interfaces.
 """
 
+import asyncio
+from typing import List, Optional
+
 from acine_proto_dist.routine_pb2 import Routine
 
 from acine.capture import GameCapture
 from acine.input_handler import InputHandler
+from acine.logging import mark_deadline_missed, mark_last_run
+from acine.runtime.check import ActionResult
 from acine.runtime.runtime import IController, ImageBmpType, Runtime
 from acine.scheduler.typing import ExecResult, ISchedulerRoutineInterface
 
 
 class BuiltinController(IController):
-    """basic controller (no hooks) that uses InputHandler and GameCapture"""
+    """
+    basic controller (no hooks) that uses InputHandler and GameCapture
+
+    When `input_lock` is given (shared between concurrently running routines),
+    it is held from mouse_down until mouse_up so gestures don't interleave.
+    """
 
     def __init__(
         self,
         game_capture: GameCapture,
         input_handler: InputHandler,
+        input_lock: Optional[asyncio.Lock] = None,
     ):
         super().__init__()
         self.gc = game_capture
         self.ih = input_handler
+        self.input_lock = input_lock
+        self.holding_input = False
 
     async def get_frame(self) -> ImageBmpType:
         return await self.gc.get_frame()
 
     async def mouse_move(self, x: int, y: int) -> None:
-        return await self.ih.mouse_move(x, y)
+        if self.holding_input or not self.input_lock:
+            return await self.ih.mouse_move(x, y)
+        async with self.input_lock:
+            return await self.ih.mouse_move(x, y)
 
     async def mouse_down(self) -> None:
+        if self.input_lock and not self.holding_input:
+            await self.input_lock.acquire()
+            self.holding_input = True
         return await self.ih.mouse_down()
 
     async def mouse_up(self) -> None:
-        return await self.ih.mouse_up()
+        try:
+            return await self.ih.mouse_up()
+        finally:
+            self.release_input()
+
+    def release_input(self) -> None:
+        """ends the current gesture (if any)"""
+        if self.input_lock and self.holding_input:
+            self.holding_input = False
+            self.input_lock.release()
 
 
 class BuiltinSchedulerRoutineInterface(ISchedulerRoutineInterface):
     def __init__(self, routine: Routine, runtime: Runtime):
         super().__init__(routine)
         self.runtime = runtime
+        self.edges = {e.id: e for u in routine.nodes.values() for e in u.edges}
 
     async def goto(self, e: Routine.Edge) -> ExecResult.ValueType:
-        return await self.runtime.queue_edge(e.id)
+        start = len(self.runtime.data.events)
+        result = await self.runtime.queue_edge(e.id)
+        self.__passed(e, start)
+        return result
+
+    async def goto_batch(self, e: Routine.Edge, n: int) -> List[ExecResult.ValueType]:
+        start = len(self.runtime.data.events)
+        results = await self.runtime.queue_edge_batch(e.id, n)
+        self.__passed(e, start)
+        return results
+
+    def __passed(self, e: Routine.Edge, start: int) -> None:
+        """reports edges passed through on the way to e (events since `start`)"""
+        if not self.on_edge_taken:
+            return
+        for event in self.runtime.data.events[start:]:
+            action = event.action
+            if (
+                action.id != e.id
+                and action.id in self.edges
+                and action.result == ActionResult.RESULT_PASS
+            ):
+                self.on_edge_taken(
+                    self.edges[action.id], ExecResult.REQUIREMENT_TYPE_COMPLETION
+                )
+
+    def distance(self, e: Routine.Edge) -> float:
+        return self.runtime.distance(e.u)
+
+    def on_deadline_missed(self, edge: Routine.Edge) -> None:
+        mark_deadline_missed(self.runtime.data.edges.get_or_create(edge.id))
+
+    def on_group_completed(self, group: Routine.SchedulingGroup, t: float) -> None:
+        info = self.runtime.data.sgroups.get_or_create(group.id)
+        info.id = group.id
+        mark_last_run(info, t)
@@ -2,8 +2,11 @@
 functions for checking conditions
 """
 
-from typing import Awaitable, Callable, Optional, Tuple, TypeAlias
+import logging
+from typing import Awaitable, Callable, Final, Optional, Sequence, Tuple, TypeAlias
 
+from acine import metrics
+from acine.diagnostics import TICK
 from acine.runtime.check_image import ImageBmpType, check_image
 from acine.runtime.util import now, sleep
 from acine_proto_dist.routine_pb2 import Routine
@@ -12,6 +15,71 @@ from acine_proto_dist.runtime_pb2 import Action
 GetImageCallableType: TypeAlias = Callable[[], Awaitable[ImageBmpType]]
 ActionResult: TypeAlias = Action.Result
 
+log = logging.getLogger(__name__)
+
+MAX_RECORDS: Final[int] = 32
+"""how many of the most recent pass times a condition keeps (records)"""
+
+ADAPTIVE_MIN_RECORDS: Final[int] = 3
+"""adaptive polling falls back to `interval` until there are this many records"""
+
+ADAPTIVE_LEAD: Final[float] = 0.8
+"""adaptive polling starts at this fraction of the earliest usual pass time"""
+
+ADAPTIVE_INTERVAL: Final[int] = 20
+"""ms; interval while polling densely around the usual pass time"""
+
+ADAPTIVE_MAX_INTERVAL: Final[int] = 1000
+"""ms; the interval doubles past the usual pass time up to this"""
+
+
+def quantile(xs: Sequence[int], q: float) -> float:
+    """nearest-rank quantile of sorted xs"""
+    return xs[min(len(xs) - 1, int(q * len(xs)))]
+
+
+class PollPlan:
+    """
+    When to check a condition, as ms since the check started.
+
+    Fixed: wait `delay` (unless no_delay), then check every `interval`.
+    Adaptive (`condition.adaptive` with enough records): wait until shortly
+    before the usual earliest pass (10th percentile), check densely until the
+    usual latest pass (90th percentile), then back off exponentially.
+    """
+
+    def __init__(self, condition: Routine.Condition, no_delay: bool = False):
+        self.interval = condition.interval
+        self.start = 0 if no_delay else condition.delay
+        self.adaptive = (
+            condition.adaptive and len(condition.records) >= ADAPTIVE_MIN_RECORDS
+        )
+        if self.adaptive:
+            records = sorted(condition.records)
+            if not no_delay:
+                lead = int(ADAPTIVE_LEAD * quantile(records, 0.1))
+                self.start = max(self.start, lead)
+            self.tail = quantile(records, 0.9)
+            self.interval = min(ADAPTIVE_INTERVAL, self.interval or ADAPTIVE_INTERVAL)
+        self.backoff = self.interval
+
+    def next(self, elapsed: float) -> float:
+        """how long to wait after a failed check at `elapsed`"""
+        if not self.adaptive or elapsed < self.tail:
+            return self.interval
+        self.backoff = min(ADAPTIVE_MAX_INTERVAL, max(1, self.backoff) * 2)
+        return self.backoff
+
+
+def record(condition: Routine.Condition, elapsed: float) -> None:
+    """
+    notes how long (ms) a condition took to pass (saved with the runtime data,
+    see acine.logging.save_condition_records)
+    """
+    condition.records.append(max(0, round(elapsed)))
+    if len(condition.records) > MAX_RECORDS:
+        del condition.records[: len(condition.records) - MAX_RECORDS]
+
 
 async def check(
     condition: Routine.Condition,
@@ -24,11 +92,14 @@ async def check(
     Implements runtime for Routine.Condition checks
 
     Makes multiple calls to get_img() until either
-    the check passes or until timing out.
+    the check passes or until timing out (see PollPlan for when).
+    How long it took to pass is added to the condition's records.
     """
 
-    if not no_delay:
-        await sleep(condition.delay)
+    t0 = now()
+    plan = PollPlan(condition, no_delay=no_delay)
+    if plan.start:
+        await sleep(plan.start)
     # if condition.WhichOneof("condition") is None:
     #     await sleep(100)
     timeout_duration = condition.timeout or 30000  # float('inf')
@@ -40,16 +111,18 @@ async def check(
         # print("[?] check", ct, timeout_info, end="\r")
         ct += 1
 
-        next = now() + condition.interval
-        img = await get_img()
+        next = now() + plan.next(now() - t0)
+        with metrics.span("frame"):
+            img = await get_img()
 
         if check_once(condition, img, ref_img):
-            print("[== OK ==]", ct)
+            log.debug("check passed after %d tries", ct, extra=TICK)
+            record(condition, now() - t0)
             return (ActionResult.RESULT_PASS, img)
 
         # allow at least one check before timeout
         if now() > timeout or next > timeout:
-            print(f"[X] check timeout after {timeout_duration / 1000:.1f}s")
+            log.info("check timeout after %.1fs", timeout_duration / 1000)
             return (ActionResult.RESULT_TIMEOUT, img)
 
         await sleep(next - now())
@@ -64,7 +137,18 @@ def check_once(
     Runs a check once, returns True if pass
     """
 
-    match condition.WhichOneof("condition"):
+    kind = condition.WhichOneof("condition")
+    with metrics.span("match", condition=str(kind)):
+        return _check_once(kind, condition, img, ref_img)
+
+
+def _check_once(
+    kind: Optional[str],
+    condition: Routine.Condition,
+    img: Optional[ImageBmpType],
+    ref_img: Optional[ImageBmpType],
+) -> bool:
+    match kind:
         case None:
             return True
         case "image":
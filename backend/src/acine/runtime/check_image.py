@@ -4,6 +4,7 @@ Implements image similarity checks
 
 from __future__ import annotations
 
+import logging
 from typing import List, Literal, TypeAlias
 
 import cv2
@@ -12,6 +13,8 @@ from acine_proto_dist.routine_pb2 import Routine
 
 ImageBmpType: TypeAlias = np.ndarray[tuple[int, int, Literal[3]], np.dtype[np.uint8]]
 
+log = logging.getLogger(__name__)
+
 
 class SimilarityResult:
     score: float
@@ -55,7 +58,7 @@ def check_similarity(
             condition, img, ref_img, return_one=return_one, argpartition=argpartition
         )
     except cv2.error as e:
-        print(Warning(e))
+        log.warning("image check failed: %s", e)
         return []
 
 
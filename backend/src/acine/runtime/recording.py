@@ -0,0 +1,185 @@
+"""
+Plays back a recorded session as an IController: the frames the runtime saved
+to the log archive while it ran, at the times they were captured. Lets
+navigation and checks run on real screen data with no window, capture or input
+backend (f.e. on Linux, in benchmarks).
+
+A frame where the recording passed a precondition and then acted is gated:
+playback only moves past it once input arrives (a mouse_up), no sooner than
+the recorded delay after it. Other frames follow each other by recorded time.
+Time is read from `acine.clock`, so under a VirtualClock playback is instant.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import List, Optional, Sequence
+
+import cv2
+import numpy as np
+from acine.clock import Clock, get_clock
+from acine.persist import PrefixedFilesystem
+from acine.runtime.check_image import ImageBmpType
+from acine.runtime.runtime import IController
+from acine_proto_dist.runtime_pb2 import Action, RuntimeData
+
+Phase = Action.Phase
+
+
+class RecordedFrame:
+    def __init__(
+        self,
+        t: float,
+        img: ImageBmpType,
+        *,
+        gated: bool = False,
+        edge_id: str = "",
+    ):
+        self.t = t
+        """seconds since the start of the recording"""
+
+        self.img = img
+        self.gated = gated
+        """the recording gave input after this frame (see module docstring)"""
+
+        self.edge_id = edge_id
+
+
+class FrameRef:
+    """where a recorded frame is in the archive, before it is loaded"""
+
+    def __init__(self, t: float, archive_id: str, gated: bool, edge_id: str):
+        self.t = t
+        self.archive_id = archive_id
+        self.gated = gated
+        self.edge_id = edge_id
+
+
+class Recording:
+    def __init__(self, frames: Sequence[RecordedFrame]):
+        assert frames, "recording has no frames"
+        self.frames = list(frames)
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    @property
+    def duration(self) -> float:
+        return self.frames[-1].t - self.frames[0].t
+
+    @staticmethod
+    def index(
+        data: RuntimeData, start: float = -math.inf, end: float = math.inf
+    ) -> List[FrameRef]:
+        """
+        Frames logged in `data` captured within [start, end) (seconds since the
+        Epoch), in capture order, with times relative to the first one.
+        """
+        found: List[tuple[float, str, int, str]] = []
+        for i, event in enumerate(data.events):
+            for x in event.action.events:
+                if not x.archive_id:
+                    continue
+                t = x.timestamp.ToNanoseconds() / 1e9
+                if start <= t < end:
+                    found.append((t, x.archive_id, i, Phase.Name(x.phase)))
+        found.sort()
+
+        out: List[FrameRef] = []
+        for j, (t, archive_id, i, phase) in enumerate(found):
+            # precondition passed, then the action ran before the postcondition
+            gated = (
+                phase == "PHASE_PRECONDITION"
+                and j + 1 < len(found)
+                and found[j + 1][2] == i
+                and found[j + 1][3] == "PHASE_POSTCONDITION"
+            )
+            edge_id = data.events[i].action.id
+            out.append(FrameRef(t - found[0][0], archive_id, gated, edge_id))
+        return out
+
+    @classmethod
+    async def load(
+        cls,
+        pfs: PrefixedFilesystem,
+        data: RuntimeData,
+        start: float = -math.inf,
+        end: float = math.inf,
+    ) -> Recording:
+        """reads the frames of a session (see `index`) from the log archive"""
+        refs = cls.index(data, start, end)
+        files = await pfs.read_archive_many([f"{x.archive_id}.bmp" for x in refs])
+        frames: List[RecordedFrame] = []
+        for x in refs:
+            buffer = np.frombuffer(files[f"{x.archive_id}.bmp"], np.uint8)
+            img: ImageBmpType = cv2.imdecode(buffer, cv2.IMREAD_COLOR)  # type: ignore
+            frames.append(RecordedFrame(x.t, img, gated=x.gated, edge_id=x.edge_id))
+        return cls(frames)
+
+
+class ReplayController(IController):
+    """
+    Shows the frames of a recording (see module docstring). Holds the last
+    frame once the recording is over.
+    """
+
+    def __init__(self, recording: Recording, clock: Optional[Clock] = None):
+        self.recording = recording
+        self.clock = clock or get_clock()
+        self.i = 0
+        """index of the frame showing"""
+
+        self.shown = self.clock.time()
+        """when the current frame started showing"""
+
+        self.released: Optional[float] = None
+        """when input arrived for the current (gated) frame"""
+
+        self.position = (0, 0)
+        self.pressed = False
+        self.inputs = 0
+        self.unexpected_inputs = 0
+        """input while not on a gated frame (the runtime went off script)"""
+
+    @property
+    def frame(self) -> RecordedFrame:
+        return self.recording.frames[self.i]
+
+    @property
+    def ended(self) -> bool:
+        return self.i + 1 >= len(self.recording)
+
+    def seek(self) -> RecordedFrame:
+        """moves to the frame that should be showing now"""
+        frames = self.recording.frames
+        t = self.clock.time()
+        while self.i + 1 < len(frames):
+            curr, next = frames[self.i], frames[self.i + 1]
+            due = self.shown + (next.t - curr.t)
+            if curr.gated:
+                if self.released is None:
+                    break
+                due = max(due, self.released)
+            if due > t:
+                break
+            self.i += 1
+            self.shown = due
+            self.released = None
+        return frames[self.i]
+
+    async def get_frame(self) -> ImageBmpType:
+        return self.seek().img
+
+    async def mouse_move(self, x: int, y: int) -> None:
+        self.position = (x, y)
+
+    async def mouse_down(self) -> None:
+        self.pressed = True
+
+    async def mouse_up(self) -> None:
+        self.pressed = False
+        self.inputs += 1
+        if self.seek().gated and self.released is None:
+            self.released = self.clock.time()
+        else:
+            self.unexpected_inputs += 1
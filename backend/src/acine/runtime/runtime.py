@@ -11,20 +11,25 @@ TODO: Possible improvements:
 
 from __future__ import annotations
 
-import asyncio
 import io
+import logging
+import math
 from typing import Callable, Final, List, Optional
 
 import cv2
 import networkx as nx
+from acine import metrics
+from acine.diagnostics import TICK
 from acine.instance_manager import get_pfs
 from acine.logging import (
     ActionLogger,
     NavigationLogger,
     is_edge_ready,
+    load_condition_records,
     mark_failure,
     mark_success,
 )
+from acine.persist import run_io
 from acine.runtime.check import Action, ActionResult, check, check_once
 from acine.runtime.check_image import ImageBmpType, check_similarity
 from acine.runtime.exceptions import (
@@ -40,12 +45,17 @@ from acine.runtime.util import get_frame, now, sleep
 from acine.scheduler.typing import ExecResult
 from acine_proto_dist.input_event_pb2 import InputReplay
 from acine_proto_dist.routine_pb2 import Routine
-from acine_proto_dist.runtime_pb2 import Level, RuntimeData, RuntimeState
+from acine_proto_dist.runtime_pb2 import Event, Level, RuntimeData, RuntimeState
 from uuid_utils import uuid7
 
 # timeout in milliseconds that overrides when the timeout is unset
 DEFAULT_TIMEOUT: Final[int] = 30000
 
+# milliseconds between navigation re-checking preconditions it's waiting on
+NAVIGATION_INTERVAL: Final[int] = 20
+
+log = logging.getLogger(__name__)
+
 
 class IController:
     """
@@ -124,6 +134,7 @@ class Runtime:
         on_change_curr: Optional[Callable[[Routine.Node], None]] = None,
         on_change_return: Optional[Callable[[List[Call]], None]] = None,
         on_change_edge: Optional[Callable[[Optional[Routine.Edge]], None]] = None,
+        on_event: Optional[Callable[[Event], None]] = None,
         enable_logs: bool = False,
     ):
         if routine.nodes:
@@ -132,6 +143,7 @@ class Runtime:
         self.routine = routine
         self.controller = controller
         self.data = data or RuntimeData()  # default parameter is a reference :moyai:
+        load_condition_records(routine, self.data)  # pass times from past runs
         self.enable_logs = enable_logs
         self.pfs = None
         if self.enable_logs:
@@ -140,6 +152,7 @@ class Runtime:
         self.nodes: dict[str, Routine.Node] = {}  # === routine.nodes
         self.edges: dict[str, Routine.Edge] = {}
         self.G: nx.DiGraph = nx.DiGraph()
+        self.distance_cache: dict[str, dict[str, int]] = {}  # see distances_from
         self.context = Runtime.Context()
         self.context.curr = routine.nodes["start"] if routine.nodes else Routine.Node()
         self.context.call_stack = [Runtime.Call(Routine.Edge())]
@@ -147,6 +160,7 @@ class Runtime:
         self.on_change_curr = on_change_curr
         self.on_change_return = on_change_return
         self.on_change_edge = on_change_edge
+        self.on_event = on_event
         """ the call stack but only the return nodes "addresses" """
 
         for n in self.routine.nodes.values():
@@ -191,6 +205,21 @@ class Runtime:
     def peek(self) -> Runtime.Call:
         return self.context.call_stack[-1]
 
+    def distances_from(self, id: str) -> dict[str, int]:
+        """
+        Navigation distance (edges taken, ignoring subroutines) from a node to
+        every node reachable from it. Cached since the navgraph doesn't change.
+        """
+        if id not in self.distance_cache:
+            if id not in self.G:
+                return {}
+            self.distance_cache[id] = nx.single_source_shortest_path_length(self.G, id)
+        return self.distance_cache[id]
+
+    def distance(self, id: str) -> float:
+        """navigation distance from the current node to a node (inf if unreachable)"""
+        return self.distances_from(self.context.curr.id).get(id, math.inf)
+
     def get_runtime_state(self) -> RuntimeState:
         return RuntimeState(
             current_node=Routine.Node(id=self.context.curr.id),
@@ -218,12 +247,34 @@ class Runtime:
             if self.on_change_return:
                 self.on_change_return(self.context.call_stack)
 
+    async def check_curr(self) -> bool:
+        """
+        Checks the current node's default condition once on a new frame. If it
+        doesn't hold (f.e. the window was used since the last run), resets to
+        the start node so navigation doesn't set off from a stale node.
+        Returns whether the current node was kept.
+        """
+        condition = self.context.curr.default_condition
+        if condition.WhichOneof("condition") == "image":
+            img = await self.controller.get_frame()
+            ref_img = get_frame(self.routine.id, condition.image.frame_id)
+            if not check_once(condition, img, ref_img):
+                log.info("not at %s anymore, restarting", self.context.curr.id)
+                self.set_curr(self.nodes["start"])
+                self.context.call_stack = [Runtime.Call(Routine.Edge())]
+                if self.on_change_return:
+                    self.on_change_return(self.context.call_stack)
+                return False
+        return True
+
     async def goto(self, id: str) -> None:
         if id not in self.nodes:
             raise ValueError(id, "target does not exist in loaded routine")
         self.target_node = self.nodes[id]
         while self.context.curr.id != id:
-            print(f"{self.context.curr.name} => {self.nodes[id].name}")
+            log.debug(
+                "%s => %s", self.context.curr.name, self.nodes[id].name, extra=TICK
+            )
 
             # handle pop stack (return nodes)
             # note: type=RETURN nodes have no fixed edges!
@@ -239,7 +290,10 @@ class Runtime:
                     next_id = e.subroutine  # retry
                 else:  # try checking for action completion
                     with NavigationLogger(
-                        self.data, self.get_runtime_state(), comment="goto::ret_pop"
+                        self.data,
+                        self.get_runtime_state(),
+                        comment="goto::ret_pop",
+                        on_exit=self.on_event,
                     ).action(e) as logger:
                         res = await self.__check(
                             e, Action.Phase.PHASE_POSTCONDITION, logger, use_dest=True
@@ -260,8 +314,12 @@ class Runtime:
                 continue
 
             with NavigationLogger(
-                self.data, self.get_runtime_state(), comment="goto"
+                self.data,
+                self.get_runtime_state(),
+                comment="goto",
+                on_exit=self.on_event,
             ) as navlogger:
+                route = metrics.start("route")
                 # --- Build graph with current state of return stack.
                 # NOTE: currently not optimized
                 # TODO: benchmark to see if precompute is necessary
@@ -356,6 +414,7 @@ class Runtime:
                     navlogger.set_exception(navlogger.Exception.EXCEPTION_NO_PATH)
                     raise AcineNoPath(s, t)
                 navlogger.set_ranking([e.id for e in sorted_edges])
+                route.stop()
 
                 # --- Knowing the edge priority, start checking.
                 # keep looking at preconditions until one passes all but higher
@@ -364,7 +423,8 @@ class Runtime:
                 start_time = now()
                 is_complete = False
                 while not is_complete:
-                    img = await self.controller.get_frame()
+                    with metrics.span("frame"):
+                        img = await self.controller.get_frame()
                     for edge in sorted_edges:
                         if not is_edge_ready(self.data, edge):
                             continue  # skip unready edges
@@ -398,26 +458,37 @@ class Runtime:
                         # then there is no path from this node.
                         navlogger.set_exception(navlogger.Exception.EXCEPTION_NO_PATH)
                         raise AcineNoPath(s, t)
-                    await asyncio.sleep(0)
+                    await sleep(NAVIGATION_INTERVAL)
         self.target_node = None
 
-    async def queue_edge(self, id: str) -> ExecResult.ValueType:
+    async def queue_edge(
+        self, id: str, *, repeat: bool = False
+    ) -> ExecResult.ValueType:
         """
         goes to the edge start node and then runs the action on the edge
+
+        `repeat`: the edge was just taken, so if it ended where it starts,
+        navigation is skipped and the precondition is checked without its delay
+        (like the repeats within an action)
         """
         if id not in self.edges:
             raise ValueError("Edge does not exist.")
         # s = self.context.curr  # source
         e = self.edges[id]
-        try:
-            await self.goto(e.u)
-        except AcineNavigationError:
-            return ExecResult.REQUIREMENT_TYPE_ATTEMPT
+        repeat = repeat and self.context.curr.id == e.u
+        if not repeat:
+            try:
+                await self.goto(e.u)
+            except AcineNavigationError:
+                return ExecResult.REQUIREMENT_TYPE_ATTEMPT
         try:
             with NavigationLogger(
-                self.data, self.get_runtime_state(), comment="queue_edge"
+                self.data,
+                self.get_runtime_state(),
+                comment="queue_edge",
+                on_exit=self.on_event,
             ) as logger:
-                await self.__run_action(e, logger)
+                await self.__run_action(e, logger, repeat=repeat)
         except PreconditionTimeoutError:
             return ExecResult.REQUIREMENT_TYPE_CHECK
         except PostconditionTimeoutError:
@@ -441,6 +512,66 @@ class Runtime:
 
         return ExecResult.REQUIREMENT_TYPE_COMPLETION
 
+    async def queue_edge_batch(self, id: str, times: int) -> List[ExecResult.ValueType]:
+        """
+        runs the edge `times` times in one visit, stopping at the first run that
+        doesn't complete. Returns the result of each run attempted.
+
+        Repeats of an edge that ends where it starts skip navigation (see
+        queue_edge `repeat`). Otherwise each repeat walks back to the source along
+        the shortest return path, found once, without re-ranking edges at every
+        hop like `goto` does. If a hop fails (or the path goes through a
+        subroutine), the repeat navigates with `goto` instead.
+        """
+        if id not in self.edges:
+            raise ValueError("Edge does not exist.")
+        e = self.edges[id]
+        subroutine = e.WhichOneof("action") == "subroutine"
+        back: dict[str, List[Routine.Edge]] = {}  # return paths, by starting node
+        results: List[ExecResult.ValueType] = []
+        for i in range(times):
+            repeat = i > 0 and not subroutine
+            if repeat and self.context.curr.id != e.u:
+                s = self.context.curr.id
+                if s not in back:
+                    back[s] = self.__return_path(s, e.u)
+                repeat = False  # came back through other edges, use the delay
+                await self.__follow(back[s])
+            results.append(await self.queue_edge(id, repeat=repeat))
+            if results[-1] != ExecResult.REQUIREMENT_TYPE_COMPLETION:
+                break
+        return results
+
+    def __return_path(self, s: str, t: str) -> List[Routine.Edge]:
+        """
+        edges along the shortest path from `s` to `t` (empty when there's none or
+        it needs a subroutine, since those only resolve through `goto`)
+        """
+        try:
+            path = nx.shortest_path(self.G, s, t)
+        except (nx.NetworkXNoPath, nx.NodeNotFound):
+            return []
+        edges = [self.G.edges[u, v]["data"] for u, v in zip(path, path[1:])]
+        if any(x.WhichOneof("action") == "subroutine" for x in edges):
+            return []
+        return edges
+
+    async def __follow(self, path: List[Routine.Edge]) -> None:
+        """takes the edges of a path in order, stopping at the first that fails"""
+        for edge in path:
+            if self.context.curr.id != edge.u:
+                return
+            try:
+                with NavigationLogger(
+                    self.data,
+                    self.get_runtime_state(),
+                    comment="queue_edge_batch::return",
+                    on_exit=self.on_event,
+                ) as logger:
+                    await self.__run_action(edge, logger)
+            except (PreconditionTimeoutError, PostconditionTimeoutError):
+                return
+
     def __resolve_condition(
         self, edge: Routine.Edge, condition: Routine.Condition, use_dest: bool = True
     ) -> Routine.Condition:
@@ -479,9 +610,10 @@ class Runtime:
         ref_img: Optional[ImageBmpType] = None
         if condition.WhichOneof("condition") == "image":
             ref_img = get_frame(self.routine.id, condition.image.frame_id)
-        res, img = await check(
-            condition, self.controller.get_frame, ref_img, no_delay=no_delay
-        )
+        with metrics.span("check", edge=edge.id, phase=Action.Phase.Name(phase)):
+            res, img = await check(
+                condition, self.controller.get_frame, ref_img, no_delay=no_delay
+            )
         await self.__log(
             edge,
             img,
@@ -531,10 +663,11 @@ class Runtime:
     ) -> None:
         if not self.enable_logs or not self.pfs:
             return
-        _, data = cv2.imencode(".bmp", img)
-        buffer = io.BytesIO(data)
-        id = str(uuid7())
-        await self.pfs.write_archive([f"{id}.bmp"], buffer.getvalue())
+        with metrics.span("log_write"):
+            _, data = await run_io(cv2.imencode, ".bmp", img)
+            buffer = io.BytesIO(data)
+            id = str(uuid7())
+            await self.pfs.write_archive([f"{id}.bmp"], buffer.getvalue())
 
         logger.log(phase, id)
         # event = Event(
@@ -544,17 +677,26 @@ class Runtime:
         # self.data.execution_info.get_or_create(edge.id).events.append(event)
 
     async def __run_action(
-        self, action: Routine.Edge, navigation_logger: NavigationLogger
+        self,
+        action: Routine.Edge,
+        navigation_logger: NavigationLogger,
+        repeat: bool = False,
     ) -> None:
         """
         Runs the precheck/action/postcheck of an action
+        (`repeat`: precheck without the delay since it was just taken)
         """
 
         if self.on_change_edge:
             self.on_change_edge(action)
 
-        with navigation_logger.action(action) as logger:
-            res = await self.__check(action, Action.Phase.PHASE_PRECONDITION, logger)
+        with (
+            metrics.span("edge", edge=action.id),
+            navigation_logger.action(action) as logger,
+        ):
+            res = await self.__check(
+                action, Action.Phase.PHASE_PRECONDITION, logger, no_delay=repeat
+            )
             if res != ActionResult.RESULT_PASS:
                 if self.on_change_edge:
                     self.on_change_edge(None)
@@ -562,7 +704,7 @@ class Runtime:
                 raise PreconditionTimeoutError(action)
 
             if action.WhichOneof("action") == "subroutine" and action.repeat_lower >= 1:
-                print("EXEC SUBROUTINE", action.description)
+                log.debug("exec subroutine %s", action.description)
                 self.push(action)
                 self.set_curr(self.nodes[action.subroutine])
                 logger.finalize(logger.Result.RESULT_PASS)
@@ -623,9 +765,10 @@ class Runtime:
                         px, py = replay.offset.x, replay.offset.y
                         y, x = offset
                         dx, dy = x - px, y - py
-                        print(f"o({x},{y}) po({px},{py}) d({dx},{dy})")
-                await self.run_replay(replay, dx, dy)
-                print("REPLAY DONE")
+                        log.debug("o(%d,%d) po(%d,%d) d(%d,%d)", x, y, px, py, dx, dy)
+                with metrics.span("replay", edge=action.id):
+                    await self.run_replay(replay, dx, dy)
+                log.debug("replay done %s", action.id)
             case _:
                 raise NotImplementedError()
 
@@ -637,7 +780,7 @@ class Runtime:
             ref = get_frame(self.routine.id, c.frame_id)
             img = await self.controller.get_frame()
             matches = check_similarity(c, img, ref)
-            print(matches)
+            log.debug("offset matches %s", matches)
             if matches:
                 return matches[0].position
         return None
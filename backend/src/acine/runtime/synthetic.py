@@ -0,0 +1,206 @@
+"""
+Headless stand-in for a window, for tests and benchmarks without a display or
+input backend: a state machine where each state renders to a deterministic
+frame (numpy), and clicks inside a transition's region move to another state
+after some latency (plus seeded jitter). Time is read from `acine.clock`.
+
+`from_routine` turns any navgraph (f.e. the generators in tests/runtime/util.py)
+into one: every node is a state with an image condition on its frame, every
+edge a click on its own region of the source node's frame.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import random
+from typing import Final, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from acine.clock import Clock, get_clock
+from acine.persist import fs_write_sync, mkdir
+from acine.runtime.check_image import ImageBmpType
+from acine.runtime.runtime import IController
+from acine_proto_dist.input_event_pb2 import InputEvent, InputReplay
+from acine_proto_dist.position_pb2 import Point, Rect
+from acine_proto_dist.routine_pb2 import Routine
+
+SIZE: Final[Tuple[int, int]] = (160, 120)
+"""default frame (width, height)"""
+
+BLOCK: Final[int] = 8
+"""frames are made of BLOCK x BLOCK squares of one color"""
+
+STAMP: Final[Rect] = Rect(left=0, top=0, right=4 * BLOCK - 1, bottom=2 * BLOCK - 1)
+"""part of the frame node conditions match on"""
+
+BUTTON: Final[int] = 16
+"""size of the square clicked to take an edge (see `from_routine`)"""
+
+
+def render(state: str, size: Tuple[int, int] = SIZE) -> ImageBmpType:
+    """the frame of a state: blocks of colors seeded by its name"""
+    w, h = size
+    seed = int.from_bytes(hashlib.blake2b(state.encode(), digest_size=8).digest())
+    rng = np.random.default_rng(seed)
+    blocks = rng.integers(0, 256, (-(-h // BLOCK), -(-w // BLOCK), 3), np.uint8)
+    img = np.repeat(np.repeat(blocks, BLOCK, axis=0), BLOCK, axis=1)[:h, :w]
+    return np.ascontiguousarray(img)  # type: ignore
+
+
+class Transition:
+    def __init__(self, region: Rect, to: str):
+        self.region = region
+        self.to = to
+
+    def __contains__(self, point: Tuple[int, int]) -> bool:
+        x, y = point
+        r = self.region
+        return r.left <= x <= r.right and r.top <= y <= r.bottom
+
+
+class SyntheticController(IController):
+    """
+    A click (mouse_down and mouse_up both inside a region of the current state)
+    starts that transition; the new state shows `latency` seconds later, give
+    or take up to `jitter`. Clicks elsewhere or during a transition are counted
+    in `misses`.
+    """
+
+    def __init__(
+        self,
+        transitions: dict[str, List[Transition]],
+        start: str = "start",
+        *,
+        size: Tuple[int, int] = SIZE,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        seed: int = 0,
+        clock: Optional[Clock] = None,
+    ):
+        self.transitions = transitions
+        self.state = start
+        self.size = size
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = random.Random(seed)
+        self.clock = clock or get_clock()
+
+        self.pending: Optional[Tuple[float, str]] = None
+        """(when, next state) of the transition in progress"""
+
+        self.frames: dict[str, ImageBmpType] = {}
+        self.position = (0, 0)
+        self.down: Optional[Tuple[int, int]] = None
+        self.clicks = 0
+        self.misses = 0
+
+    def frame(self, state: str) -> ImageBmpType:
+        if state not in self.frames:
+            self.frames[state] = render(state, self.size)
+        return self.frames[state]
+
+    def update(self) -> str:
+        """finishes the transition in progress if it's due, returns the state"""
+        if self.pending and self.pending[0] <= self.clock.time():
+            self.state = self.pending[1]
+            self.pending = None
+        return self.state
+
+    async def get_frame(self) -> ImageBmpType:
+        return self.frame(self.update())
+
+    async def mouse_move(self, x: int, y: int) -> None:
+        self.position = (x, y)
+
+    async def mouse_down(self) -> None:
+        self.down = self.position
+
+    async def mouse_up(self) -> None:
+        down, self.down = self.down, None
+        self.clicks += 1
+        self.update()
+        if down is not None and not self.pending:
+            for t in self.transitions.get(self.state, []):
+                if down in t and self.position in t:
+                    delay = self.latency + self.rng.uniform(-self.jitter, self.jitter)
+                    self.pending = (self.clock.time() + max(0.0, delay), t.to)
+                    return
+        self.misses += 1
+
+
+def button(i: int, size: Tuple[int, int] = SIZE) -> Rect:
+    """region of the i-th edge of a node (row-major, under the stamp)"""
+    w, h = size
+    per_row = w // BUTTON
+    rows = (h - STAMP.bottom - 1) // BUTTON
+    assert i < per_row * rows, f"frame too small for {i + 1} edges"
+    x, y = (i % per_row) * BUTTON, STAMP.bottom + 1 + (i // per_row) * BUTTON
+    return Rect(left=x, top=y, right=x + BUTTON - 1, bottom=y + BUTTON - 1)
+
+
+def click(region: Rect) -> InputReplay:
+    x, y = (region.left + region.right) // 2, (region.top + region.bottom) // 2
+    return InputReplay(
+        events=[
+            InputEvent(timestamp=0, move=Point(x=x, y=y)),
+            InputEvent(timestamp=0, mouse_down=InputEvent.MOUSE_BUTTON_LEFT),
+            InputEvent(timestamp=50, mouse_up=InputEvent.MOUSE_BUTTON_LEFT),
+        ]
+    )
+
+
+def from_routine(
+    routine: Routine,
+    *,
+    size: Tuple[int, int] = SIZE,
+    conditions: bool = True,
+    latency: float = 0.0,
+    jitter: float = 0.0,
+    seed: int = 0,
+) -> SyntheticController:
+    """
+    Makes an environment for a navgraph, and sets the routine up to run in it
+    (in place). Every edge that isn't a subroutine call gets a click replay on
+    its own button. With `conditions`, each node's default condition matches
+    its frame (id = node id, see `save_frames`) and edge pre/postconditions
+    that aren't set use it (auto). Without them nothing waits for a transition
+    to show, so leave `latency` at 0.
+    """
+    transitions: dict[str, List[Transition]] = {}
+    for node in routine.nodes.values():
+        transitions[node.id] = []
+        for i, edge in enumerate(node.edges):
+            if edge.WhichOneof("action") == "subroutine":
+                continue
+            region = button(i, size)
+            edge.replay.CopyFrom(click(region))
+            edge.repeat_lower = edge.repeat_lower or 1  # 0 skips the action
+            edge.repeat_upper = max(edge.repeat_upper, edge.repeat_lower)
+            transitions[node.id].append(Transition(region, edge.to))
+            if conditions:
+                for c in (edge.precondition, edge.postcondition):
+                    if c.WhichOneof("condition") is None:
+                        c.auto = True
+        if conditions:
+            # interval 0 polls without sleeping, which a VirtualClock can't
+            # move past
+            node.default_condition.interval = node.default_condition.interval or 100
+            image = node.default_condition.image
+            image.frame_id = node.id
+            image.threshold = 0.99
+            image.match_limit = 1
+            del image.regions[:]
+            image.regions.append(STAMP)
+    return SyntheticController(
+        transitions, size=size, latency=latency, jitter=jitter, seed=seed
+    )
+
+
+def save_frames(routine: Routine, controller: SyntheticController) -> None:
+    """writes each node's frame as its reference image (for node conditions)"""
+    assert routine.id, "routine id not set"
+    mkdir([routine.id, "img"])
+    for id in routine.nodes:
+        _, data = cv2.imencode(".png", controller.frame(id))
+        fs_write_sync([routine.id, "img", f"{id}.png"], data.tobytes())
@@ -1,15 +1,16 @@
 """
 Various utility functions.
 
-Currently only contains time (sleep/now) functions.
+Time (sleep/now, on the clock installed with `acine.clock.use_clock`),
+frame loading and IntertaskProcedure.
 """
 
 import asyncio
-import time
 from functools import lru_cache
 from typing import Generic, TypeVar
 
 import cv2
+from acine.clock import get_clock
 from acine.persist import resolve
 from acine.runtime.check_image import ImageBmpType
 
@@ -23,7 +24,7 @@ def now() -> int:
 
     https://stackoverflow.com/a/5998359
     """
-    return round(time.time() * 1000)
+    return round(get_clock().time() * 1000)
 
 
 async def sleep(ms: int) -> None:
@@ -31,7 +32,7 @@ async def sleep(ms: int) -> None:
     Sleeps for some time in milliseconds.
     `asyncio.sleep` (python in general) uses float seconds
     """
-    await asyncio.sleep(ms / 1000)
+    await get_clock().sleep(ms / 1000)
 
 
 @lru_cache(maxsize=64)
@@ -39,6 +40,15 @@ def get_frame(routine_id: str, frame_id: str) -> ImageBmpType:
     """
     Fetches the image data associated with a frame id. (has cache)
     """
+    return read_frame(routine_id, frame_id)
+
+
+def read_frame(routine_id: str, frame_id: str) -> ImageBmpType:
+    """
+    Fetches the image data associated with a frame id. (no cache)
+
+    Used for bulk reads that would otherwise evict everything from the cache.
+    """
     assert routine_id, "routine_id not set"
     assert frame_id, "frame_id not set"
     path = resolve(routine_id, "img", f"{frame_id}.png")  # probably in BGR
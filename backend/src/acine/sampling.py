@@ -0,0 +1,424 @@
+"""
+Batch condition sampling (which frames match this condition?) for the editor.
+
+Frames are placed once in shared memory and evaluated by a persistent pool of
+worker processes, so a query over a large routine doesn't pay for the GIL,
+re-reading frames, or pickling full images to the workers.
+
+Results are cached by frame content and condition (minus the threshold), so
+repeating a query or only changing its threshold skips the template matching.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import math
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import (
+    AsyncIterator,
+    Final,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+import numpy as np
+from acine.persist import run_io
+from acine.runtime.check_image import ImageBmpType, SimilarityResult, check_similarity
+from acine.runtime.util import read_frame
+from acine_proto_dist.routine_pb2 import Routine
+
+ATTACH_CACHE_SIZE: Final[int] = 64
+"""how many shared frames a worker process keeps mapped"""
+
+STORE_MAX_BYTES: Final[int] = 1 << 30
+"""shared memory the frame store keeps (least recently used frames go first)"""
+
+RESULT_CACHE_SIZE: Final[int] = 1 << 16
+"""how many (condition, frame) sampling results are kept"""
+
+STREAM_INTERVAL: Final[float] = 0.1
+"""how often (seconds) partial sampling results are flushed to the client"""
+
+T = TypeVar("T")
+
+
+class SharedFrame:
+    """Handle for a frame stored in shared memory (sent to worker processes)."""
+
+    def __init__(
+        self, name: str, shape: Tuple[int, ...], dtype: str, digest: bytes = b""
+    ):
+        self.name = name
+        self.shape = shape
+        self.dtype = dtype
+        self.digest = digest  # content hash (see frame_digest)
+
+    def __repr__(self) -> str:
+        return f"SharedFrame({self.name}, {self.shape}, {self.dtype})"
+
+
+def frame_digest(img: ImageBmpType) -> bytes:
+    """content hash of a frame"""
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str((img.shape, img.dtype.str)).encode())
+    h.update(np.ascontiguousarray(img).data)
+    return h.digest()
+
+
+def condition_fingerprint(condition: Routine.Condition.Image, ref: bytes) -> bytes:
+    """
+    Identifies what a condition computes, given the reference frame's digest.
+    Excludes the threshold (results are filtered by it afterwards) and the
+    reference frame id (its content is what matters).
+    """
+    c = Routine.Condition.Image()
+    c.CopyFrom(condition)
+    c.ClearField("threshold")
+    c.ClearField("frame_id")
+    return ref + c.SerializeToString(deterministic=True)
+
+
+class SamplingCache:
+    """LRU cache of unfiltered sampling results, keyed by (fingerprint, digest)"""
+
+    def __init__(self, size: int = RESULT_CACHE_SIZE):
+        self.size = size
+        self.entries: OrderedDict[Tuple[bytes, bytes], List[SimilarityResult]] = (
+            OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: Tuple[bytes, bytes]) -> Optional[List[SimilarityResult]]:
+        if key not in self.entries:
+            return None
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key: Tuple[bytes, bytes], results: List[SimilarityResult]) -> None:
+        self.entries[key] = results
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+
+class SharedFrameStore:
+    """
+    Owns the shared memory blocks for frames, keyed by (routine_id, frame_id).
+
+    Holds at most `max_bytes`, freeing the least recently used frames that
+    aren't pinned (in use by a query, see `pinned`) once over it.
+
+    Need to call .close() afterwards (blocks outlive the process otherwise).
+    """
+
+    def __init__(self, max_bytes: int = STORE_MAX_BYTES) -> None:
+        self.max_bytes = max_bytes
+        self.blocks: OrderedDict[Tuple[str, str], Tuple[SharedMemory, SharedFrame]] = (
+            OrderedDict()
+        )
+        """in least to most recently used order"""
+
+        self.nbytes = 0
+        self.pins: dict[Tuple[str, str], int] = {}
+        """key -> how many queries use it"""
+
+        self.generation = 0
+        """bumped whenever a block is freed (workers drop their mappings then)"""
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        return key in self.blocks
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    def put(
+        self, key: Tuple[str, str], img: ImageBmpType, digest: Optional[bytes] = None
+    ) -> SharedFrame:
+        """copies a frame into shared memory (replacing any previous version)"""
+        self.discard(key)
+        if digest is None:
+            digest = frame_digest(img)
+        shm = SharedMemory(create=True, size=max(1, img.nbytes))
+        view: np.ndarray = np.ndarray(img.shape, dtype=img.dtype, buffer=shm.buf)
+        view[:] = img
+        del view  # otherwise shm cannot be closed
+        frame = SharedFrame(shm.name, img.shape, img.dtype.str, digest)
+        self.blocks[key] = (shm, frame)
+        self.nbytes += shm.size
+        self.evict()
+        return frame
+
+    def get(self, key: Tuple[str, str]) -> Optional[SharedFrame]:
+        if key not in self.blocks:
+            return None
+        self.blocks.move_to_end(key)
+        return self.blocks[key][1]
+
+    def discard(self, key: Tuple[str, str]) -> None:
+        """frees a frame (if it exists)"""
+        if key not in self.blocks:
+            return
+        shm, _ = self.blocks.pop(key)
+        self.nbytes -= shm.size
+        shm.close()
+        shm.unlink()
+        self.generation += 1
+
+    def evict(self) -> None:
+        """frees unpinned frames, least recently used first, until under max_bytes"""
+        if self.nbytes <= self.max_bytes:
+            return
+        for key in [k for k in self.blocks if k not in self.pins]:
+            self.discard(key)
+            if self.nbytes <= self.max_bytes:
+                return
+
+    @contextmanager
+    def pinned(self, keys: Sequence[Tuple[str, str]]) -> Iterator[None]:
+        """keeps frames from being evicted (present or put later) for the block"""
+        for key in keys:
+            self.pins[key] = self.pins.get(key, 0) + 1
+        try:
+            yield
+        finally:
+            for key in keys:
+                self.pins[key] -= 1
+                if not self.pins[key]:
+                    del self.pins[key]
+            self.evict()
+
+    def close(self) -> None:
+        for key in tuple(self.blocks.keys()):
+            self.discard(key)
+
+
+# worker process state: shared frames currently mapped into this process
+_attached: OrderedDict[str, Tuple[SharedMemory, ImageBmpType]] = OrderedDict()
+
+# worker process state: SharedFrameStore.generation the mappings are from
+_generation = 0
+
+
+def _detach(shm: SharedMemory, img: ImageBmpType) -> None:
+    del img
+    try:
+        shm.close()
+    except BufferError:
+        pass  # still referenced, gets unmapped on process exit
+
+
+def _sync(generation: int) -> None:
+    """
+    Drops every mapping once the store freed a block. A freed block stays
+    allocated while any process still maps it, so stale frames would otherwise
+    stay pinned in each worker until evicted.
+    """
+    global _generation
+    if generation == _generation:
+        return
+    _generation = generation
+    while _attached:
+        _, (shm, img) = _attached.popitem()
+        _detach(shm, img)
+
+
+def _attach(frame: SharedFrame) -> ImageBmpType:
+    """maps a shared frame into this (worker) process, cached"""
+    if frame.name in _attached:
+        _attached.move_to_end(frame.name)
+        return _attached[frame.name][1]
+    shm = SharedMemory(name=frame.name)
+    img: ImageBmpType = np.ndarray(  # type: ignore
+        frame.shape, dtype=np.dtype(frame.dtype), buffer=shm.buf
+    )
+    img.flags.writeable = False
+    _attached[frame.name] = (shm, img)
+    while len(_attached) > ATTACH_CACHE_SIZE:
+        _, (old_shm, old_img) = _attached.popitem(last=False)
+        _detach(old_shm, old_img)
+    return img
+
+
+def _sample_chunk(
+    condition: bytes,
+    ref: SharedFrame,
+    frames: Sequence[Tuple[str, SharedFrame]],
+    generation: int = 0,
+) -> List[Tuple[str, List[SimilarityResult]]]:
+    """worker process: runs check_similarity for each frame in a chunk"""
+    _sync(generation)
+    c = Routine.Condition.Image.FromString(condition)
+    ref_img = _attach(ref)
+    return [
+        (id, check_similarity(c, _attach(f), ref_img, return_one=True))
+        for id, f in frames
+    ]
+
+
+def _read_frame(routine_id: str, frame_id: str) -> Tuple[Optional[ImageBmpType], bytes]:
+    """reads and hashes a frame (i/o thread)"""
+    img = read_frame(routine_id, frame_id)
+    return img, (frame_digest(img) if img is not None else b"")
+
+
+class SamplingPool:
+    """
+    Persistent process pool for batch condition sampling.
+
+    Frames are loaded into shared memory on first use and reused across
+    queries until discarded (f.e. when a frame gets saved again), which also
+    makes workers drop their mappings on their next chunk (see _sync).
+    Results are cached by content, so a reloaded frame is computed again.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.store = SharedFrameStore()
+        self.cache = SamplingCache()
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            # spawn (not fork) since the server has other threads running
+            self.executor = ProcessPoolExecutor(
+                self.workers, mp_context=get_context("spawn")
+            )
+        return self.executor
+
+    async def load(self, routine_id: str, frame_ids: Sequence[str]) -> None:
+        """places frames into shared memory (skips ones already there)"""
+        missing = [f for f in dict.fromkeys(frame_ids) if (routine_id, f) not in self]
+        imgs = await asyncio.gather(
+            *(run_io(_read_frame, routine_id, f) for f in missing)
+        )
+        for id, (img, digest) in zip(missing, imgs):
+            if img is not None:
+                self.store.put((routine_id, id), img, digest)
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        return key in self.store
+
+    def discard(self, routine_id: str, frame_id: str) -> None:
+        """drop a frame (it will be reloaded from disk when needed)"""
+        self.store.discard((routine_id, frame_id))
+
+    async def sample(
+        self,
+        routine_id: str,
+        condition: Routine.Condition.Image,
+        frame_ids: Sequence[str],
+        *,
+        chunksize: Optional[int] = None,
+    ) -> AsyncIterator[Tuple[str, List[SimilarityResult]]]:
+        """
+        Runs check_similarity(return_one=True) for each frame against the
+        condition's reference frame. Yields (frame_id, results) as chunks
+        complete (not in input order), cached results first.
+        Frames that failed to load are skipped.
+        """
+        used = [(routine_id, f) for f in (condition.frame_id, *frame_ids)]
+        with self.store.pinned(used):
+            await self.load(routine_id, [condition.frame_id, *frame_ids])
+            ref = self.store.get((routine_id, condition.frame_id))
+            if ref is None:
+                raise FileNotFoundError(routine_id, condition.frame_id)
+            threshold = condition.threshold
+            fingerprint = condition_fingerprint(condition, ref.digest)
+            frames: List[Tuple[str, SharedFrame]] = []
+            keys: dict[str, Tuple[bytes, bytes]] = {}
+            for id in frame_ids:
+                f = self.store.get((routine_id, id))
+                if f is None:
+                    continue
+                keys[id] = (fingerprint, f.digest)
+                cached = self.cache.get(keys[id])
+                if cached is None:
+                    frames.append((id, f))
+                else:
+                    yield id, [r for r in cached if r.score >= threshold]
+            if not frames:
+                return
+
+            if not chunksize:
+                # a few chunks per worker so stragglers don't hold up the rest
+                chunksize = max(1, -(-len(frames) // (self.workers * 4)))
+            # compute unfiltered, so the results can be reused for any threshold
+            c = Routine.Condition.Image()
+            c.CopyFrom(condition)
+            c.threshold = -math.inf
+            data = c.SerializeToString()
+            loop = asyncio.get_running_loop()
+            executor = self.get_executor()
+            generation = self.store.generation
+            futures = [
+                loop.run_in_executor(
+                    executor,
+                    _sample_chunk,
+                    data,
+                    ref,
+                    frames[i : i + chunksize],
+                    generation,
+                )
+                for i in range(0, len(frames), chunksize)
+            ]
+            try:
+                for future in asyncio.as_completed(futures):
+                    for id, results in await future:
+                        self.cache.put(keys[id], results)
+                        yield id, [r for r in results if r.score >= threshold]
+            finally:
+                for future in futures:
+                    future.cancel()  # no-op on completed; skips queued chunks
+
+    def close(self) -> None:
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        self.store.close()
+
+
+_pool: Optional[SamplingPool] = None
+
+
+def get_sampling_pool() -> SamplingPool:
+    """shared sampling pool (created on first use)"""
+    global _pool
+    if _pool is None:
+        _pool = SamplingPool()
+    return _pool
+
+
+async def batch_by_time(
+    items: AsyncIterator[T], interval: float = STREAM_INTERVAL
+) -> AsyncIterator[List[T]]:
+    """
+    Groups items into lists, flushing at most once every `interval` seconds
+    (and once at the end). Used to stream partial results without sending a
+    packet for every single frame.
+    """
+    batch: List[T] = []
+    t = time.monotonic()
+    async for item in items:
+        batch.append(item)
+        if time.monotonic() - t >= interval:
+            yield batch
+            batch = []
+            t = time.monotonic()
+    if batch:
+        yield batch
@@ -1,65 +1,158 @@
+"""
+Scheduling group dispatch times.
+
+`Schedule` is the compiled form of a SchedulingGroup (validated once, with the
+current period's bounds cached), use it when querying the same group repeatedly.
+"""
+
 import bisect
 import calendar
 from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
 
+import numpy as np
 from acine_proto_dist.routine_pb2 import Routine
 
 Period = Routine.SchedulingGroup.Period
 TZ = timezone(timedelta(), name="UTC")
 
+MAX_PERIOD: dict[int, timedelta] = {
+    Period.PERIOD_DAILY: timedelta(days=1),
+    Period.PERIOD_WEEKLY: timedelta(days=7),
+    Period.PERIOD_BIWEEKLY: timedelta(days=14),
+    Period.PERIOD_MONTHLY: timedelta(days=31),
+}
+"""longest period of each preset (monthly depends on the month)"""
 
-def next(ts: float, s: Routine.SchedulingGroup) -> float:
+
+class Schedule:
     """
-    Gets the next scheduled time for a SchedulingGroup given the last scheduled time.
+    Compiled SchedulingGroup: dispatch times are sorted and validated once, and
+    the bounds of the last period looked up are cached (so repeated queries
+    within a period don't redo the calendar math).
+
+    Raises ValueError on an invalid group, like `next`.
     """
 
-    s.dispatch_times.sort()
-    if not s.dispatch_times:
-        s.dispatch_times.append(0)
-    if len(set(s.dispatch_times)) != len(s.dispatch_times):
-        raise ValueError("cannot have duplicate times")
-
-    ct = datetime.fromtimestamp(ts, tz=TZ)  # current time (datetime)
-    pt = ct  # start of current period (datetime)
-    psz = timedelta()  # period size
-
-    if s.period_preset == Period.PERIOD_UNSPECIFIED:
-        if not s.period:
-            raise ValueError("expected nonzero s.period when period_preset is unset")
-        t = ct.timestamp()
-        pt = datetime.fromtimestamp(t - (t % s.period), tz=TZ)
-        psz = timedelta(seconds=s.period)
-    else:
-        period = s.period_preset
-        pt = pt.replace(hour=0, minute=0, second=0, microsecond=0)
-        match period:
-            case Period.PERIOD_DAILY:
-                psz = timedelta(days=1)
+    def __init__(self, s: Routine.SchedulingGroup):
+        self.preset = s.period_preset
+        self.period = s.period
+        times = sorted(s.dispatch_times) or [0]
+        if len(set(times)) != len(times):
+            raise ValueError("cannot have duplicate times")
+        if self.preset == Period.PERIOD_UNSPECIFIED:
+            if not self.period:
+                raise ValueError(
+                    "expected nonzero s.period when period_preset is unset"
+                )
+            size = float(self.period)
+        elif self.preset in MAX_PERIOD:
+            size = MAX_PERIOD[self.preset].total_seconds()
+        else:
+            raise ValueError("unhandled preset period", self.preset)
+        self.__check(times, size)
+        self.times = times
+        self.offsets = np.array(times, dtype=np.float64)
+
+        self.__bounds: Tuple[float, float, float, float] = (0.0, 0.0, 0.0, 0.0)
+        """cached (start, size) of the last period looked up, and [from, until)
+        which times it's valid for"""
+
+    @staticmethod
+    def __check(times: List[int], size: float) -> None:
+        for t in times:
+            if t < 0 or t >= size:
+                raise ValueError(f"invalid dispatch time {t} (T={size})")
+
+    def bounds(self, ts: float) -> Tuple[float, float]:
+        """(start, size) of the period `ts` is in"""
+        start, size, lo, hi = self.__bounds
+        if lo <= ts < hi:
+            return start, size
+
+        if self.preset == Period.PERIOD_UNSPECIFIED:
+            start = ts - (ts % self.period)
+            size = float(self.period)
+            self.__bounds = (start, size, start, start + size)
+            return start, size
+
+        ct = datetime.fromtimestamp(ts, tz=TZ)
+        pt = ct.replace(hour=0, minute=0, second=0, microsecond=0)
+        psz = MAX_PERIOD[self.preset]
+        begin, end = pt, pt + timedelta(days=1)  # the lookup is the same all day
+        match self.preset:
             case Period.PERIOD_WEEKLY:
-                psz = timedelta(days=7)
                 weekday = (pt.weekday() + 1) % 7  # convert to sunday==0
                 pt -= timedelta(days=weekday)
+                begin, end = pt, pt + psz
             case Period.PERIOD_BIWEEKLY:
-                psz = timedelta(days=14)
-                mt = pt.replace(day=1)  # first day of month
-                mt += timedelta(days=6 - mt.weekday())  # go to first Sunday
-                if pt.day - mt.day >= 14:  # go to the 3rd Sunday
-                    mt += timedelta(days=14)
-                pt = pt.replace(day=mt.day)
+                # from the latest 1st/3rd Sunday up to the next one
+                prev_month = (pt.replace(day=1) - timedelta(days=1)).replace(day=1)
+                sundays: List[datetime] = []
+                for mt in (prev_month, pt.replace(day=1)):
+                    mt += timedelta(days=6 - mt.weekday())  # go to first Sunday
+                    sundays += [mt, mt + timedelta(days=14)]
+                next_month = (pt.replace(day=28) + timedelta(days=4)).replace(day=1)
+                sundays.append(next_month + timedelta(days=6 - next_month.weekday()))
+                i = bisect.bisect_right(sundays, pt)
+                pt = sundays[i - 1]
+                psz = sundays[i] - pt
+                begin, end = pt, pt + psz
             case Period.PERIOD_MONTHLY:
                 _, days_in_month = calendar.monthrange(pt.year, pt.month)
                 psz = timedelta(days=days_in_month)
                 pt = pt.replace(day=1)
-            case _:
-                raise ValueError("unhandled preset period", period)
-
-    for t in s.dispatch_times:
-        if t < 0 or t >= psz.total_seconds():
-            raise ValueError(f"invalid dispatch time {t} (T={psz.total_seconds()})")
-
-    xts = (ct - pt).total_seconds()
-    i = bisect.bisect_right(s.dispatch_times, xts)
-    if i == len(s.dispatch_times):
-        return (pt + psz).timestamp() + s.dispatch_times[0]
-    else:
-        return (pt + timedelta(seconds=s.dispatch_times[i])).timestamp()
+                begin, end = pt, pt + psz
+                self.__check(self.times, psz.total_seconds())
+
+        start, size = pt.timestamp(), psz.total_seconds()
+        self.__bounds = (start, size, begin.timestamp(), end.timestamp())
+        return start, size
+
+    def next(self, ts: float) -> float:
+        """first dispatch time after `ts`"""
+        pt, psz = self.bounds(ts)
+        i = bisect.bisect_right(self.times, ts - pt)
+        if i == len(self.times):
+            return pt + psz + self.times[0]
+        return pt + self.times[i]
+
+    def next_n(self, ts: float, n: int) -> List[float]:
+        """the next `n` dispatch times after `ts`"""
+        out: List[float] = []
+        for _ in range(n):
+            ts = self.next(ts)
+            out.append(ts)
+        return out
+
+    def between(self, a: float, b: float) -> List[float]:
+        """dispatch times in [a, b), ascending"""
+        if b <= a:
+            return []
+        if self.preset == Period.PERIOD_UNSPECIFIED:
+            # fixed size periods, every (period start, offset) pair at once
+            P = float(self.period)
+            k = np.arange(a // P, b // P + 1) * P
+            out = (k[:, None] + self.offsets[None, :]).ravel()
+            return out[(out >= a) & (out < b)].tolist()
+
+        out = []
+        pt, _ = self.bounds(a)
+        t = a if a - pt in self.times else self.next(a)
+        while t < b:
+            out.append(t)
+            t = self.next(t)
+        return out
+
+
+def next(ts: float, s: Routine.SchedulingGroup) -> float:
+    """
+    Gets the next scheduled time for a SchedulingGroup given the last scheduled time.
+
+    Compiles the group each call, see `Schedule` for repeated queries.
+    """
+
+    s.dispatch_times.sort()
+    if not s.dispatch_times:
+        s.dispatch_times.append(0)
+    return Schedule(s).next(ts)
@@ -0,0 +1,114 @@
+"""
+Index over the dependencies between a routine's edges, built once per
+Scheduler (the routine doesn't change while it runs).
+"""
+
+from __future__ import annotations
+
+from typing import List
+
+import networkx as nx
+from acine_proto_dist.routine_pb2 import Routine
+
+DependencyType = Routine.DependencyType
+
+IMPLICIT: frozenset[DependencyType.ValueType] = frozenset(
+    (
+        DependencyType.DEPENDENCY_TYPE_UNSPECIFIED,  # default: implicit
+        DependencyType.DEPENDENCY_TYPE_IMPLICIT,
+    )
+)
+"""
+dependency types that can be met by the edge running for any reason
+(not STRICT_IMPLICIT: "must happen next" isn't implemented, so it's only met
+by runs scheduled for it, like explicit ones)
+"""
+
+
+def is_implicit(dependency: Routine.Dependency) -> bool:
+    return dependency.type in IMPLICIT
+
+
+class DependencyGraph:
+    """
+    DAG of edge dependencies (an arc u -> v when v requires u).
+
+    - `layers`: topological layering, an edge's dependencies are all in earlier
+      layers (layer 0 has none)
+    - `requirements`: every edge an edge transitively requires
+    - `dependents`: edges that directly depend on an edge, and `dependency`
+      how (one Dependency per pair)
+
+    Raises ValueError if the dependencies have a cycle (or require an edge
+    that doesn't exist), since those can never be met.
+    """
+
+    def __init__(self, routine: Routine):
+        self.G: nx.DiGraph = nx.DiGraph()
+        self.dependencies: dict[str, List[Routine.Dependency]] = {}
+        """edge id -> its dependencies"""
+
+        self.dependents: dict[str, List[Routine.Edge]] = {}
+        """edge id -> edges that depend on it"""
+
+        self.dependency: dict[tuple[str, str], Routine.Dependency] = {}
+        """(required edge id, dependent edge id) -> the dependency"""
+
+        edges: dict[str, Routine.Edge] = {}
+        for u in routine.nodes.values():
+            for edge in u.edges:
+                edges[edge.id] = edge
+                self.G.add_node(edge.id)
+                self.dependencies[edge.id] = list(edge.dependencies)
+                self.dependents[edge.id] = []
+        for edge in edges.values():
+            for dep in edge.dependencies:
+                if dep.requires not in edges:
+                    raise ValueError(f"{edge.id} requires unknown edge {dep.requires}")
+                self.G.add_edge(dep.requires, edge.id)
+                if (dep.requires, edge.id) not in self.dependency:
+                    self.dependents[dep.requires].append(edge)
+                self.dependency[dep.requires, edge.id] = dep
+
+        try:
+            self.layers: List[List[str]] = [
+                sorted(x) for x in nx.topological_generations(self.G)
+            ]
+        except nx.NetworkXUnfeasible:
+            cycle = [u for u, _ in nx.find_cycle(self.G)]
+            raise ValueError(f"dependency cycle {cycle}")
+        self.layer: dict[str, int] = {}
+        """edge id -> index of its layer"""
+
+        self.requirements: dict[str, frozenset[str]] = {}
+        """edge id -> every edge it transitively requires"""
+
+        for i, layer in enumerate(self.layers):
+            for id in layer:
+                self.layer[id] = i
+                req: set[str] = set()
+                for dep in self.dependencies[id]:
+                    req.add(dep.requires)
+                    req |= self.requirements[dep.requires]
+                self.requirements[id] = frozenset(req)
+
+        self.__chains: dict[str, List[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self.layer)
+
+    @property
+    def order(self) -> List[str]:
+        """edge ids in topological order (requirements first)"""
+        return [id for layer in self.layers for id in layer]
+
+    def chain(self, id: str) -> List[str]:
+        """
+        An edge and everything it requires, dependents before the edges they
+        require (reverse topological order). Cached, the routine doesn't change.
+        """
+        if id not in self.__chains:
+            self.__chains[id] = [id] + sorted(
+                self.requirements[id], key=lambda x: (-self.layer[x], x)
+            )
+        return self.__chains[id]
@@ -0,0 +1,143 @@
+"""
+Keeps routine instances (window, capture, runtime) open between scheduled runs,
+so routines that run every few minutes don't redo the setup each time.
+"""
+
+from __future__ import annotations
+
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Final, List, Optional, Tuple
+
+from acine.clock import get_clock
+from acine.scheduler.resources import ResourceLocks
+from acine.scheduler.typing import ISchedulerRoutineInterface
+from acine_proto_dist.routine_pb2 import Routine
+
+IDLE_TIMEOUT: Final[float] = 15 * 60.0
+"""seconds; instances unused for this long get closed"""
+
+
+def revision(routine: Routine) -> bytes:
+    """routine contents, minus the condition records the runtime appends to"""
+    r = Routine()
+    r.CopyFrom(routine)
+    for n in r.nodes.values():
+        n.default_condition.ClearField("records")
+        for e in n.edges:
+            e.precondition.ClearField("records")
+            e.postcondition.ClearField("records")
+    return r.SerializeToString(deterministic=True)
+
+
+class PooledInstance:
+    """
+    Something a routine runs in, opened once and reused across runs.
+    Runs are bracketed by acquire/release.
+    """
+
+    def __init__(self, routine: Routine):
+        self.routine = routine
+        self.revision = revision(routine)
+
+    async def open(self) -> None:
+        """one-time setup"""
+        pass
+
+    async def close(self) -> None:
+        """teardown (not reused after this)"""
+        pass
+
+    async def healthy(self) -> bool:
+        """whether it can still be reused (checked before each reuse)"""
+        return True
+
+    async def acquire(self) -> None:
+        """start of a run"""
+        pass
+
+    async def release(self) -> None:
+        """end of a run (flush anything that should be saved)"""
+        pass
+
+    def interface(self) -> ISchedulerRoutineInterface:
+        raise NotImplementedError("interface is not implemented")
+
+
+InstanceCreator = Callable[[Routine, ResourceLocks], PooledInstance]
+
+
+class InstancePool:
+    """
+    Warm instances, at most one idle instance per routine.
+
+    `open` is an InstanceFactory (see ManagedRuntime). An idle instance is reused
+    if the routine didn't change and it's still healthy, otherwise a new one is
+    created. Instances of failed runs are closed instead of returned to the pool.
+    Call `evict` periodically to close instances idle for over `idle_timeout`.
+    """
+
+    def __init__(
+        self,
+        create: InstanceCreator,
+        idle_timeout: float = IDLE_TIMEOUT,
+        now: Optional[Callable[[], float]] = None,
+    ):
+        self.create = create
+        self.idle_timeout = idle_timeout
+        self.now = now or get_clock().time
+        self.idle: dict[str, Tuple[PooledInstance, float]] = {}
+        """routine id -> (instance, when it was released)"""
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.idle)
+
+    @asynccontextmanager
+    async def open(
+        self, routine: Routine, locks: ResourceLocks
+    ) -> AsyncIterator[ISchedulerRoutineInterface]:
+        instance = await self.__take(routine, locks)
+        ok = False
+        try:
+            await instance.acquire()
+            yield instance.interface()
+            ok = True
+        finally:
+            try:
+                await instance.release()
+            finally:
+                if ok and routine.id not in self.idle:
+                    self.idle[routine.id] = (instance, self.now())
+                else:
+                    await instance.close()
+
+    async def __take(self, routine: Routine, locks: ResourceLocks) -> PooledInstance:
+        entry = self.idle.pop(routine.id, None)
+        if entry:
+            instance, _ = entry
+            if instance.revision == revision(routine) and await instance.healthy():
+                self.hits += 1
+                return instance
+            await instance.close()
+        self.misses += 1
+        instance = self.create(routine, locks)
+        await instance.open()
+        return instance
+
+    async def evict(self, now: Optional[float] = None) -> List[str]:
+        """Closes instances idle for too long, returns their routine ids"""
+        if now is None:
+            now = self.now()
+        expired = [k for k, (_, t) in self.idle.items() if now - t >= self.idle_timeout]
+        for k in expired:
+            instance, _ = self.idle.pop(k)
+            await instance.close()
+        return expired
+
+    async def close(self) -> None:
+        """Closes every idle instance"""
+        while self.idle:
+            _, (instance, _) = self.idle.popitem()
+            await instance.close()
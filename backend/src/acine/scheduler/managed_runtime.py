@@ -1,135 +1,226 @@
 from __future__ import annotations
 
-import time
-import traceback
-from types import TracebackType
-from typing import List, Optional
-
-from acine.capture import GameCapture
-from acine.input_handler import InputHandler
-from acine.instance_manager import get_runtime_data, write_runtime_data
-from acine.persist import fs_read_sync, fs_write_sync
-from acine.preset_impl import BuiltinController, BuiltinSchedulerRoutineInterface
-from acine.runtime.runtime import Routine, Runtime
-from acine.scheduler.cron import next
-from acine.scheduler.scheduler import Scheduler
-
-
-class RoutineInstance:
-    def __init__(self, routine: Routine):
-        self.routine = routine
+import logging
+import math
+from functools import partial
+from typing import AsyncContextManager, Callable, Final, List, Optional
 
-    async def init(self):
-        routine = self.routine
-        self.ih = InputHandler(
-            routine.launch_config.window_name, cmd=routine.launch_config.start_command
-        )
-        await self.ih.init()
-        pos = routine.launch_config.initial_position
-        await self.ih.resize(pos.width, pos.height)  # TODO: self.ih takes a Position?
-        self.gc = GameCapture(await self.ih.win.title)
-        self.controller = BuiltinController(self.gc, self.ih)
-        self.rt = Runtime(
-            routine, self.controller, get_runtime_data(routine), enable_logs=True
-        )
-
-    async def __aenter__(self) -> RoutineInstance:
-        await self.init()
-        self.time_opened = time.time()
-        return self
-
-    async def __aexit__(
-        self,
-        exc_type: Optional[type[BaseException]],
-        exc_val: Optional[BaseException],
-        exc_tb: Optional[TracebackType],
-    ) -> Optional[bool]:
-        self.__add_runtime(time.time() - self.time_opened)
-        await self.close()
-        if exc_type and exc_val:
-            raise exc_val
-        return None
-
-    async def queue_edge(self, edge: Routine.Edge) -> None:
-        await self.rt.queue_edge(edge.id)
-
-    async def close(self) -> None:
-        self.gc.close()
-        await self.ih.close()
-        write_runtime_data(self.routine, self.rt.data)
-
-    def __add_runtime(self, duration: float) -> None:
-        print(f"exec time {duration / 60:.2f}m")
-        assert duration >= 0, "expect nonnegative duration"
-        path = [self.routine.id, "time"]
-        t = 0.0
-        try:
-            t = float(fs_read_sync(path).decode())
-        except OSError:
-            pass
-        t += duration
-        fs_write_sync(path, str(t).encode())
+from acine.clock import get_clock
+from acine.instance_manager import get_routine
+from acine.runtime.runtime import Routine
+from acine.scheduler.cron import Schedule
+from acine.scheduler.resources import ResourceLocks, window_resource
+from acine.scheduler.scheduler import RetryPolicy, Scheduler
+from acine.scheduler.timers import TimerHeap
+from acine.scheduler.typing import ISchedulerRoutineInterface
+
+LOCALITY_WINDOW: Final[float] = 60.0
+"""
+seconds; scheduled edges with deadlines this close are ordered by navigation
+distance instead of deadline (see Scheduler)
+"""
+
+InstanceFactory = Callable[
+    [Routine, ResourceLocks], AsyncContextManager[ISchedulerRoutineInterface]
+]
+"""opens a routine (for the duration of the context) for the scheduler to use"""
+
+MAX_CATCH_UP: Final[int] = 16
+"""most missed dispatches that get their own run (see CATCH_UP_EACH)"""
+
+log = logging.getLogger(__name__)
+
+CatchUp = Routine.SchedulingGroup.CatchUp
 
 
 class SchedulingGroupInfo:
-    def __init__(self, group: Routine.SchedulingGroup):
+    """
+    `last_run` is when the group last ran (persisted, see ExecutionInfo). Dispatches
+    missed since then are caught up according to `group.catch_up`.
+    """
+
+    def __init__(
+        self,
+        group: Routine.SchedulingGroup,
+        on_change: Optional[Callable[[SchedulingGroupInfo], None]] = None,
+        last_run: Optional[float] = None,
+    ):
         self.group = group
+        self.schedule = Schedule(group)
         self.linked: List[Routine.Edge] = []
-        self.last_time = time.time()
-        self.next_time = next(time.time(), group)
+        self.on_change = on_change
+        """called whenever next_time changes (keeps timer indexes updated)"""
+
+        self.missed: List[float] = []
+        """dispatch times yet to be caught up (oldest first)"""
 
-    def on_scheduled(self) -> None:
+        t = get_clock().time()
+        if last_run is not None and group.catch_up != CatchUp.CATCH_UP_UNSPECIFIED:
+            self.missed = [
+                x for x in self.schedule.between(last_run, t) if x > last_run
+            ]
+            if group.catch_up == CatchUp.CATCH_UP_COALESCE:
+                self.missed = self.missed[-1:]
+            self.missed = self.missed[-MAX_CATCH_UP:]
+
+        self.last_time = t
+        self.__next_time = self.missed[0] if self.missed else self.schedule.next(t)
+
+    @property
+    def next_time(self) -> float:
+        return self.__next_time
+
+    @next_time.setter
+    def next_time(self, t: float) -> None:
+        self.__next_time = t
+        if self.on_change:
+            self.on_change(self)
+
+    def on_scheduled(self, now: Optional[float] = None) -> None:
+        """moves on to the next dispatch after `now` (defaults to the current time)"""
         self.last_time = self.next_time
-        self.next_time = next(time.time(), self.group)
+        if self.missed and self.missed[0] <= self.last_time:
+            self.missed.pop(0)
+        if self.missed:
+            self.next_time = self.missed[0]
+        else:
+            self.next_time = self.schedule.next(
+                get_clock().time() if now is None else now
+            )
 
 
 class ManagedRuntime:
     """
     Scheduler-controlled Runtime
+
+    `routine` can be just the metadata (see `get_routines`), the full routine
+    is only loaded once something needs to run.
+
+    `open_instance` defaults to opening the routine's actual window
+    (see `acine.scheduler.routine_instance`).
+
+    `last_runs` (group id -> time) is used to catch up on dispatches that were
+    missed while nothing was running (see `get_last_runs`).
     """
 
-    def __init__(self, routine: Routine):
+    def __init__(
+        self,
+        routine: Routine,
+        open_instance: Optional[InstanceFactory] = None,
+        last_runs: Optional[dict[str, float]] = None,
+    ):
         self.routine = routine
-        self.S = {k: SchedulingGroupInfo(v) for k, v in routine.sgroups.items()}
-        for node in routine.nodes.values():
+        self.open_instance = open_instance
+        self.is_linked = False
+        self.deadline_misses = 0
+        """how many scheduled edges were shed past their deadline"""
+
+        self.on_change: Optional[Callable[[ManagedRuntime], None]] = None
+        """called whenever a scheduling group's next_time changes"""
+
+        self.timers: TimerHeap[str] = TimerHeap()  # group key -> next_time
+        self.S: dict[str, SchedulingGroupInfo] = {}
+        last_runs = last_runs or {}
+        for k, v in routine.sgroups.items():
+            self.S[k] = SchedulingGroupInfo(
+                v, partial(self.__on_group_change, k), last_runs.get(k)
+            )
+            self.timers.set(k, self.S[k].next_time)
+
+    def __on_group_change(self, key: str, sg: SchedulingGroupInfo) -> None:
+        self.timers.set(key, sg.next_time)
+        if self.on_change:
+            self.on_change(self)
+
+    def link(self) -> None:
+        """Loads the full routine (if needed) and links edges to scheduling groups."""
+        if self.is_linked:
+            return
+        if not self.routine.nodes:
+            self.routine = get_routine(self.routine)
+        for node in self.routine.nodes.values():
             for edge in node.edges:
                 for s in edge.schedules:
                     # TODO: s.count, s.requirement
                     self.S[s.scheduling_group_id].linked.append(edge)
+        self.is_linked = True
 
     def next_time(self) -> float:
         """Returns the next time something gets scheduled."""
-        if not self.S.values():
-            return float("inf")
-        return min(sg.next_time for sg in self.S.values())
+        top = self.timers.peek()
+        return top[0] if top else float("inf")
 
     def next_groups(self, t: float) -> List[str]:
-        return [sg.group.name for sg in self.S.values() if sg.next_time == t]
+        return [self.S[k].group.name for tk, k in self.timers.due(t) if tk == t]
 
-    async def run(self, t: Optional[float] = None) -> None:
+    def resources(self) -> List[str]:
+        """resources held for the whole run (see ResourceLocks)"""
+        return [window_resource(self.routine.launch_config.window_name)]
+
+    def schedule_due(
+        self, scheduler: Scheduler, t: float, now: Optional[float] = None
+    ) -> List[str]:
+        """
+        Schedules the edges of every group due at `t`, then moves those groups
+        on to their next dispatch after `now` (see SchedulingGroupInfo.on_scheduled).
+        Returns the keys of the groups that were scheduled.
+        """
+        due = [k for _, k in self.timers.due(t)]
+        for k in due:
+            sg = self.S[k]
+            deadline = t + sg.group.deadline if sg.group.deadline else math.inf
+            retry = RetryPolicy.from_group(sg.group)
+            for edge in sg.linked:
+                scheduler.schedule(edge, deadline, retry=retry)
+            sg.on_scheduled(now)
+        return due
+
+    async def run(
+        self, t: Optional[float] = None, locks: Optional[ResourceLocks] = None
+    ) -> None:
         """
         `t` is seconds since UNIX epoch. When no `t` is provided, uses the current time.
 
         Schedules everything that happens <= `t` and runs it before exiting.
+        `locks` is shared with other routines that run at the same time.
         """
         if not t:
-            t = time.time()
+            t = get_clock().time()
         if self.next_time() > t:
             return  # nothing ready to run
 
-        async with RoutineInstance(self.routine) as instance:
-            await instance.init()  # TODO: __aenter__/__aexit__ ??
-            sri = BuiltinSchedulerRoutineInterface(self.routine, instance.rt)
-            scheduler = Scheduler(sri)
-            for sg in self.S.values():
-                if sg.next_time <= t:
-                    for edge in sg.linked:
-                        scheduler.schedule(edge, t)
-                    sg.on_scheduled()
+        self.link()
+        locks = locks or ResourceLocks()
+        open_instance = self.open_instance
+        if open_instance is None:
+            # platform-specific, only imported once something actually runs
+            from acine.scheduler.routine_instance import open_routine_instance
+
+            open_instance = open_routine_instance
+        async with (
+            locks.hold(self.resources()),
+            open_instance(self.routine, locks) as sri,
+        ):
+            scheduler = Scheduler(sri, locality=LOCALITY_WINDOW)
+            due = self.schedule_due(scheduler, t)
+            # the dispatch each group ran for (not `t`, which is later when
+            # catching up), so missed dispatches that haven't run yet are
+            # still found from the persisted last run
+            dispatched = {k: self.S[k].last_time for k in due}
             try:
                 while await scheduler.next():
                     pass
+                for k in due:
+                    sri.on_group_completed(self.S[k].group, dispatched[k])
             except BaseException as e:
-                print("FAILURE", e)
-                traceback.print_exc()
+                log.exception("%s failed", self.routine.name)
                 raise e
+            finally:
+                if scheduler.missed:
+                    self.deadline_misses += len(scheduler.missed)
+                    log.warning(
+                        "%s: shed %d past deadline (total %d)",
+                        self.routine.name,
+                        len(scheduler.missed),
+                        self.deadline_misses,
+                    )
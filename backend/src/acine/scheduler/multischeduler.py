@@ -1,34 +1,174 @@
+import asyncio
 import datetime
-import time
-from typing import List
+import logging
+from typing import Callable, Final, List, Optional
 
-from acine.scheduler.managed_runtime import ManagedRuntime
+from acine.clock import get_clock
+from acine.scheduler.managed_runtime import InstanceFactory, ManagedRuntime
+from acine.scheduler.resources import ResourceLocks
+from acine.scheduler.timers import TimerHeap
 from acine_proto_dist.routine_pb2 import Routine
 
+MAX_CONCURRENCY: Final[int] = 4
+"""default amount of routines the background service runs at the same time"""
+
+log = logging.getLogger(__name__)
+
 
 class Multischeduler:
-    """handles scheduling when there are multiple routines to schedule"""
+    """
+    handles scheduling when there are multiple routines to schedule
+
+    Ready routines are run as concurrent tasks (see `dispatch`), up to
+    `max_concurrency` at a time. Routines that need a resource held by a running
+    routine (f.e. the same window) wait without taking up a slot.
+
+    Fairness: ready routines are started in order of when they became ready,
+    ties go to whichever was started least recently.
+
+    Routines are indexed by next_time in a timer heap (which each routine
+    keeps updated), so finding what's next doesn't scan every routine.
+
+    `last_runs` loads when each of a routine's scheduling groups last ran, used
+    to catch up on missed dispatches (see SchedulingGroupInfo).
+    """
+
+    def __init__(
+        self,
+        routines: List[Routine],
+        max_concurrency: int = 1,
+        open_instance: Optional[InstanceFactory] = None,
+        last_runs: Optional[Callable[[Routine], dict[str, float]]] = None,
+    ):
+        self.open_instance = open_instance
+        self.last_runs = last_runs
+        self.max_concurrency = max(1, max_concurrency)
+        self.locks = ResourceLocks()
+        self.running: dict[ManagedRuntime, asyncio.Task] = {}
+        self.last_started: dict[ManagedRuntime, float] = {}
+        self.runtimes: dict[str, ManagedRuntime] = {}  # routine id -> runtime
+        self.timers: TimerHeap[ManagedRuntime] = TimerHeap()
+        for r in routines:
+            self.reload(r)
+
+    @property
+    def tasks(self) -> List[ManagedRuntime]:
+        return list(self.runtimes.values())
 
-    def __init__(self, routines: List[Routine]):
-        self.tasks = [ManagedRuntime(r) for r in routines]
+    def reload(self, routine: Routine) -> ManagedRuntime:
+        """
+        Adds a routine, or replaces it (f.e. after it was edited).
+        Scheduling groups that didn't change keep their next_time.
+        A running instance of the old version finishes on its own.
+        """
+        old = self.runtimes.get(routine.id)
+        last_runs = self.last_runs(routine) if self.last_runs and not old else None
+        x = ManagedRuntime(routine, self.open_instance, last_runs)
+        if old:
+            for k, sg in x.S.items():
+                if k in old.S and old.S[k].group == sg.group:
+                    sg.next_time = old.S[k].next_time
+            self.remove(routine.id)
+        self.runtimes[routine.id] = x
+        x.on_change = self.__on_change
+        self.timers.set(x, x.next_time())
+        return x
+
+    def remove(self, routine_id: str) -> None:
+        """Stops scheduling a routine (a running instance finishes on its own)"""
+        x = self.runtimes.pop(routine_id, None)
+        if x:
+            x.on_change = None
+            self.timers.remove(x)
+
+    def __on_change(self, x: ManagedRuntime) -> None:
+        self.timers.set(x, x.next_time())
 
     def __str__(self) -> str:
         lines = []
-        a = sorted([(x.next_time(), x) for x in self.tasks], key=lambda x: x[0])
-        for t, x in a:
-            dt = t - time.time()
+        for t, x in self.timers.ordered():
+            dt = t - get_clock().time()
             if dt > 1e9:
                 continue
             D = datetime.timedelta(seconds=int(dt)).__str__()
+            if x in self.running:
+                D = "RUNNING"
+            elif dt <= 0:
+                D = "READY"
             T = datetime.datetime.fromtimestamp(t).__str__()
             Z = ", ".join(x.next_groups(t))
-            lines.append(f"{D if dt > 0 else "READY":>16} {T} {x.routine.name} {Z}")
+            if x.deadline_misses:
+                Z += f" [missed {x.deadline_misses}]"
+            lines.append(f"{D:>16} {T} {x.routine.name} {Z}")
         return "\n".join(lines)
 
     def next_time(self) -> float:
-        """Returns the next time something happens"""
-        return min([x.next_time() for x in self.tasks])
+        """Returns the next time something happens (ignores running routines)"""
+        for t, x in self.timers.ordered():
+            if x not in self.running:
+                return t
+        return float("inf")
 
     def get_next(self) -> ManagedRuntime:
         """Returns the next task (runtime) to execute"""
-        return min(self.tasks, key=lambda x: x.next_time())
+        top = self.timers.peek()
+        assert top, "expected at least one routine"
+        return top[1]
+
+    def ready(self, t: Optional[float] = None) -> List[ManagedRuntime]:
+        """Routines that can start at `t` (defaults to now), in fairness order"""
+        if t is None:
+            t = get_clock().time()
+        return sorted(
+            (x for _, x in self.timers.due(t) if x not in self.running),
+            key=lambda x: (x.next_time(), self.last_started.get(x, 0.0)),
+        )
+
+    def dispatch(self, t: Optional[float] = None) -> List[ManagedRuntime]:
+        """
+        Starts ready routines as tasks (while there are free slots and their
+        resources are free). Returns the routines that were started.
+        """
+        if t is None:
+            t = get_clock().time()
+        busy = {r for x in self.running for r in x.resources()}
+        started: List[ManagedRuntime] = []
+        for x in self.ready(t):
+            if len(self.running) >= self.max_concurrency:
+                break
+            resources = x.resources()
+            if busy.intersection(resources):
+                continue  # skip (not block) so others can use the slot
+            busy.update(resources)
+            self.last_started[x] = get_clock().time()
+            self.running[x] = asyncio.create_task(self.__run(x, t))
+            started.append(x)
+        return started
+
+    async def __run(self, x: ManagedRuntime, t: float) -> None:
+        try:
+            await x.run(t, locks=self.locks)
+        except Exception:
+            # one routine failing shouldn't take down the others
+            log.exception("routine failure %s", x.routine.name)
+        finally:
+            del self.running[x]
+
+    async def wait(self, timeout: Optional[float] = None) -> None:
+        """Waits until a running routine finishes (or the timeout expires)"""
+        if not self.running:
+            if timeout:
+                await get_clock().sleep(timeout)
+            return
+        await asyncio.wait(
+            self.running.values(),
+            timeout=timeout,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+
+    async def close(self) -> None:
+        """Cancels running routines"""
+        tasks = list(self.running.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,51 @@
+"""
+Named locks for resources shared between routines that run concurrently
+(f.e. the same window, or the desktop's input focus).
+"""
+
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Final, Iterable
+
+INPUT: Final[str] = "input"
+"""desktop input (mouse gestures, window focus); shared by every routine"""
+
+
+def window_resource(window_name: str) -> str:
+    """resource name for a window (routines on the same window can't overlap)"""
+    return f"window:{window_name}"
+
+
+class ResourceLocks:
+    """Lazily created asyncio locks, one per resource name."""
+
+    def __init__(self) -> None:
+        self.locks: dict[str, asyncio.Lock] = {}
+
+    def get(self, name: str) -> asyncio.Lock:
+        if name not in self.locks:
+            self.locks[name] = asyncio.Lock()
+        return self.locks[name]
+
+    def locked(self, names: Iterable[str]) -> bool:
+        """True if any of the resources is currently held"""
+        return any(self.get(name).locked() for name in names)
+
+    @asynccontextmanager
+    async def hold(self, names: Iterable[str]) -> AsyncIterator[None]:
+        """
+        Acquires all of the resources for the duration of the context.
+        Locks are taken in sorted order, so two holders can't deadlock.
+        """
+        acquired: list[asyncio.Lock] = []
+        try:
+            for name in sorted(set(names)):
+                lock = self.get(name)
+                await lock.acquire()
+                acquired.append(lock)
+            yield
+        finally:
+            for lock in reversed(acquired):
+                lock.release()
@@ -0,0 +1,121 @@
+"""
+Opens a routine's target application (window, capture, input) for the scheduler.
+
+Kept separate from ManagedRuntime since this depends on the platform-specific
+capture and input modules.
+
+A RoutineInstance can be kept open between runs (see InstancePool), or opened
+for a single run with `open_routine_instance`.
+"""
+
+from __future__ import annotations
+
+import logging
+from contextlib import asynccontextmanager
+from types import TracebackType
+from typing import AsyncIterator, Optional
+
+from acine.capture import GameCapture
+from acine.clock import get_clock
+from acine.input_handler import InputHandler
+from acine.instance_manager import get_runtime_data_async, write_runtime_data_async
+from acine.logging import save_condition_records
+from acine.persist import fs_read_sync, fs_write_sync
+from acine.preset_impl import BuiltinController, BuiltinSchedulerRoutineInterface
+from acine.runtime.runtime import Routine, Runtime
+from acine.scheduler.instance_pool import PooledInstance
+from acine.scheduler.resources import INPUT, ResourceLocks
+from acine.scheduler.typing import ISchedulerRoutineInterface
+
+log = logging.getLogger(__name__)
+
+
+class RoutineInstance(PooledInstance):
+    def __init__(self, routine: Routine, locks: Optional[ResourceLocks] = None):
+        super().__init__(routine)
+        self.locks = locks or ResourceLocks()
+        self.time_opened = get_clock().monotonic()
+
+    async def init(self):
+        routine = self.routine
+        self.ih = InputHandler(
+            routine.launch_config.window_name, cmd=routine.launch_config.start_command
+        )
+        async with self.locks.hold([INPUT]):  # init activates the window
+            await self.ih.init()
+            pos = routine.launch_config.initial_position
+            await self.ih.resize(pos.width, pos.height)  # TODO: ih takes a Position?
+        self.gc = GameCapture(await self.ih.win.title)
+        self.controller = BuiltinController(
+            self.gc, self.ih, input_lock=self.locks.get(INPUT)
+        )
+        data = await get_runtime_data_async(routine)
+        self.rt = Runtime(routine, self.controller, data, enable_logs=True)
+
+    async def open(self) -> None:
+        await self.init()
+
+    async def healthy(self) -> bool:
+        return not self.gc.closed and bool(self.ih.win) and await self.ih.win.exists()
+
+    async def acquire(self) -> None:
+        self.time_opened = get_clock().monotonic()
+        await self.rt.check_curr()  # a warm instance resumes from its last node
+
+    async def release(self) -> None:
+        """end of a run, saves runtime data (the window stays open)"""
+        self.controller.release_input()
+        self.__add_runtime(get_clock().monotonic() - self.time_opened)
+        save_condition_records(self.routine, self.rt.data)
+        await write_runtime_data_async(self.routine, self.rt.data)
+
+    def interface(self) -> ISchedulerRoutineInterface:
+        return BuiltinSchedulerRoutineInterface(self.routine, self.rt)
+
+    async def __aenter__(self) -> RoutineInstance:
+        await self.open()
+        await self.acquire()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> Optional[bool]:
+        try:
+            await self.release()
+        finally:
+            await self.close()
+        if exc_type and exc_val:
+            raise exc_val
+        return None
+
+    async def queue_edge(self, edge: Routine.Edge) -> None:
+        await self.rt.queue_edge(edge.id)
+
+    async def close(self) -> None:
+        self.controller.release_input()
+        self.gc.close()
+        await self.ih.close()
+
+    def __add_runtime(self, duration: float) -> None:
+        log.info("%s exec time %.2fm", self.routine.name, duration / 60)
+        assert duration >= 0, "expect nonnegative duration"
+        path = [self.routine.id, "time"]
+        t = 0.0
+        try:
+            t = float(fs_read_sync(path).decode())
+        except OSError:
+            pass
+        t += duration
+        fs_write_sync(path, str(t).encode())
+
+
+@asynccontextmanager
+async def open_routine_instance(
+    routine: Routine, locks: ResourceLocks
+) -> AsyncIterator[ISchedulerRoutineInterface]:
+    """default instance factory for ManagedRuntime (opens the actual window)"""
+    async with RoutineInstance(routine, locks) as instance:
+        yield instance.interface()
@@ -1,12 +1,49 @@
 from __future__ import annotations
 
 import heapq
-from typing import List
+import logging
+import math
+from typing import Awaitable, Callable, Final, Iterator, List, Optional
 
+from acine import metrics
+from acine.clock import get_clock
 from acine_proto_dist.routine_pb2 import Routine
 
+from .dependencies import DependencyGraph, is_implicit
+from .timers import TimerHeap
 from .typing import ExecResult, ISchedulerRoutineInterface
 
+log = logging.getLogger(__name__)
+
+LOCALITY_WINDOW: Final[int] = 32
+"""most ready entries compared by distance per pop (see Scheduler.locality)"""
+
+
+class RetryPolicy:
+    """
+    How a failed entry is retried (see Routine.SchedulingGroup).
+
+    Up to `attempts` tries, `interval` seconds apart. Once those run out, one
+    last try after `reschedule` seconds (if set), then the entry is given up.
+    """
+
+    def __init__(self, interval: float = 0, attempts: int = 1, reschedule: float = 0):
+        self.interval = max(0.0, interval)
+        self.attempts = max(1, attempts)
+        self.reschedule = max(0.0, reschedule)
+
+    @staticmethod
+    def from_group(group: Routine.SchedulingGroup) -> RetryPolicy:
+        return RetryPolicy(group.retry_interval, group.retry_attempts, group.reschedule)
+
+    def delay(self, failures: int) -> Optional[float]:
+        """seconds until the next try after `failures` failures, None to give up"""
+        if failures < self.attempts:
+            return self.interval
+        if failures == self.attempts and self.reschedule:
+            return self.reschedule
+        return None
+
 
 class DependencyInfo:
     """Extra information per dependency instance at runtime"""
@@ -22,6 +59,11 @@ class DependencyInfo:
     def __repr__(self) -> str:
         return f"ok={self.__ok_count} E={self.target.id} d={self.dependency}"
 
+    @property
+    def requirement(self) -> ExecResult.ValueType:
+        """what result counts as meeting it"""
+        return self.dependency.requirement or ExecResult.REQUIREMENT_TYPE_COMPLETION
+
     def satisfy_once(self) -> bool:
         """returns True if met, False if not met yet"""
         self.__ok_count += 1
@@ -33,16 +75,21 @@ class DependencyInfo:
 class EdgeInfo:
     """Extra information per edge at runtime"""
 
-    def __init__(self, edge: Routine.Edge):
+    def __init__(self, edge: Routine.Edge, graph: DependencyGraph):
         self.edge = edge
 
-        self.dependents: List[DependencyInfo] = []
-        """references to DependencyInfo that depend on this edge happening"""
+        self.__dependents: dict[str, dict[str, SchedulerEntry]] = {
+            x.id: {} for x in graph.dependents[edge.id]
+        }
+        """dependent edge id -> its entries waiting on this edge"""
 
-        self.__dependents: dict[str, SchedulerEntry] = {}
+        self.__dependency: dict[str, Routine.Dependency] = {
+            x: graph.dependency[edge.id, x] for x in self.__dependents
+        }
+        """dependent edge id -> how it depends on this edge"""
 
-        self.dependencies: List[DependencyInfo] = []
-        """DependencyInfo this edge depends on"""
+        self.waiting: int = 0
+        """how many entries are waiting on this edge"""
 
         self.fail_count: int = 0
 
@@ -52,39 +99,50 @@ class EdgeInfo:
     def __repr__(self) -> str:
         return (
             f"pending={self.pending} fail={self.fail_count} "
-            + f"triggers[{len(self.dependents)}]={self.dependents}"
+            + f"subscribers={self.waiting}"
         )
 
     def fail_once(self) -> int:
         self.fail_count += 1
         return self.fail_count
 
-    def broadcast(self, result: ExecResult.ValueType) -> List[SchedulerEntry]:
-        """Notifies all subscriptions, returns completions"""
+    def broadcast(
+        self, result: ExecResult.ValueType, in_passing: bool = False
+    ) -> List[SchedulerEntry]:
+        """
+        Notifies all subscriptions, returns the entries that became ready.
+        Runs `in_passing` (not scheduled for them) only count for implicit ones.
+        """
         completions: List[SchedulerEntry] = []
-        for v in tuple(self.__dependents.values()):
-            # on_completed will call unsubscribe (modifying self.__dependents)
-            print(
-                "BROADCAST",
-                self.edge.description,
-                result,
-                v.edge.description,
-                v.requirement,
-            )
-            print("ACTUAL", v.requirement)
-            if result >= v.requirement:
+        for id, entries in self.__dependents.items():
+            dep = self.__dependency[id]
+            if not entries or (in_passing and not is_implicit(dep)):
+                continue
+            if result < (dep.requirement or ExecResult.REQUIREMENT_TYPE_COMPLETION):
+                continue
+            for v in tuple(entries.values()):
+                # on_completed will call unsubscribe (modifying entries)
                 if v.on_completed(self):
                     completions.append(v)
         return completions
 
     def subscribe(self, entry: SchedulerEntry) -> None:
+        entries = self.__dependents[entry.edge.id]
         assert (
-            entry.id not in self.__dependents or self.__dependents[entry.id] == entry
+            entry.id not in entries or entries[entry.id] == entry
         ), "No ID collision should happen."
-        self.__dependents[entry.id] = entry
+        if entry.id not in entries:
+            self.waiting += 1
+        entries[entry.id] = entry
 
     def unsubscribe(self, entry: SchedulerEntry) -> None:
-        del self.__dependents[entry.id]
+        entries = self.__dependents.get(entry.edge.id)
+        if entries and entries.pop(entry.id, None):
+            self.waiting -= 1
+
+    def subscribers(self) -> List[SchedulerEntry]:
+        """entries waiting on this edge"""
+        return [x for entries in self.__dependents.values() for x in entries.values()]
 
 
 class SchedulerEntry:
@@ -95,15 +153,23 @@ class SchedulerEntry:
         edge: Routine.Edge,
         deadline: float,
         requirement: ExecResult.ValueType = ExecResult.REQUIREMENT_TYPE_COMPLETION,
+        retry: Optional[RetryPolicy] = None,
     ):
         super().__init__()
         self.edge = edge
         self.deadline = deadline
         self.requirement = requirement
+        self.retry = retry or RetryPolicy()
         self.count = 0
         self.deps: dict[str, DependencyInfo] = {}
+        """unmet dependencies (by required edge id)"""
         for dep in edge.dependencies:
             self.deps[dep.requires] = DependencyInfo(edge, dep)
+        self.blocked = sum(max(1, d.dependency.count) for d in self.deps.values())
+        """how many more dependency runs until it's ready"""
+
+        self.for_dependency = False
+        """scheduled to meet another entry's dependency (not on its own)"""
 
         self.id = str(SchedulerEntry.counter)
         SchedulerEntry.counter += 1
@@ -120,129 +186,401 @@ class SchedulerEntry:
         """return True if ready to run"""
         id = e.edge.id
         if id in self.deps:
+            self.blocked -= 1
             if self.deps[id].satisfy_once():
                 del self.deps[id]
         if id not in self.deps:
             e.unsubscribe(self)
-        print("RESOLVing", e.edge.name, self.deps)
-        return not self.deps
+        return self.blocked <= 0
 
     def fail(self) -> None:
         self.count += 1
 
 
+class ReadyQueue:
+    """
+    Binary min-heap of ready entries (see SchedulerEntry.__lt__).
+
+    The position of each entry is tracked so any one can be taken out in
+    O(log n), and entries are indexed by edge so the ones of an edge are found
+    without scanning the queue (see Scheduler.__batch).
+    """
+
+    def __init__(self) -> None:
+        self.heap: List[SchedulerEntry] = []
+        self.pos: dict[SchedulerEntry, int] = {}
+        self.edges: dict[str, dict[SchedulerEntry, None]] = {}
+        """edge id -> its queued entries (in the order they were pushed)"""
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def __iter__(self) -> Iterator[SchedulerEntry]:
+        """in heap (not sorted) order"""
+        return iter(self.heap)
+
+    def __getitem__(self, i: int) -> SchedulerEntry:
+        return self.heap[i]
+
+    def of_edge(self, id: str) -> List[SchedulerEntry]:
+        """queued entries of an edge"""
+        return list(self.edges.get(id, ()))
+
+    def push(self, entry: SchedulerEntry) -> None:
+        self.heap.append(entry)
+        self.pos[entry] = len(self.heap) - 1
+        self.edges.setdefault(entry.edge.id, {})[entry] = None
+        self.__up(len(self.heap) - 1)
+
+    def pop(self, i: int = 0) -> SchedulerEntry:
+        """removes the entry at heap index i (the earliest by default)"""
+        entry = self.heap[i]
+        self.remove(entry)
+        return entry
+
+    def remove(self, entry: SchedulerEntry) -> None:
+        i = self.pos.pop(entry)
+        same = self.edges[entry.edge.id]
+        del same[entry]
+        if not same:
+            del self.edges[entry.edge.id]
+        last = self.heap.pop()
+        if i < len(self.heap):
+            self.heap[i] = last
+            self.pos[last] = i
+            self.__up(i)
+            self.__down(self.pos[last])
+
+    def __swap(self, i: int, j: int) -> None:
+        heap = self.heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self.pos[heap[i]] = i
+        self.pos[heap[j]] = j
+
+    def __up(self, i: int) -> None:
+        while i > 0:
+            parent = (i - 1) // 2
+            if not self.heap[i] < self.heap[parent]:
+                break
+            self.__swap(i, parent)
+            i = parent
+
+    def __down(self, i: int) -> None:
+        n = len(self.heap)
+        while True:
+            smallest = i
+            for j in (2 * i + 1, 2 * i + 2):
+                if j < n and self.heap[j] < self.heap[smallest]:
+                    smallest = j
+            if smallest == i:
+                break
+            self.__swap(i, smallest)
+            i = smallest
+
+
 class Scheduler:
     """
     Handles dependency ordering (given a list of things to do)
+
+    Ready entries run earliest deadline first (EDF). When a clock (`now`) is
+    given, an entry whose deadline has passed by the time it would run is shed
+    (see `missed`) instead of being retried, along with anything else past its
+    deadline waiting on it. Without one, deadlines are only used for ordering.
+
+    When `locality` is set, the next entry is instead the one cheapest to reach
+    (see ISchedulerRoutineInterface.distance) among entries with a deadline
+    within `locality` of the earliest one, so work near the current position
+    gets done before navigating elsewhere. Only the LOCALITY_WINDOW most urgent
+    of those are compared, so a queue without deadlines isn't scanned whole.
+
+    Retry waits use `sleep`, by default the clock installed where the Scheduler
+    is created (see acine.clock).
+
+    A failed entry waits in `retry_timers` until its next try is due (see
+    RetryPolicy) so other work can run in the meantime. When it runs out of
+    tries it is given up like a missed deadline, with everything waiting on it.
+
+    Scheduling an entry with dependencies schedules what it (transitively)
+    requires right away; it waits outside the ready queue until a counter of
+    dependency runs reaches zero. Implicit dependencies can also be met by the
+    required edge being taken in passing (see ISchedulerRoutineInterface).
+
+    Ready entries of the same edge are run as one batch (`goto_batch`), so an
+    edge pending N times is navigated to once instead of N times.
     """
 
-    def __init__(self, interface: ISchedulerRoutineInterface):
+    def __init__(
+        self,
+        interface: ISchedulerRoutineInterface,
+        now: Optional[Callable[[], float]] = None,
+        locality: Optional[float] = None,
+        sleep: Optional[Callable[[float], Awaitable[None]]] = None,
+    ):
         self.edges: dict[str, EdgeInfo] = {}
-        self.deps: dict[str, DependencyInfo] = {}
-        self.ready_queue: List[SchedulerEntry] = []  # heapq
+        self.ready_queue = ReadyQueue()
+        self.retry_timers: TimerHeap[SchedulerEntry] = TimerHeap()
+        self.now = now
+        self.locality = locality
+        self.sleep = sleep or get_clock().sleep
+
+        self.missed: List[SchedulerEntry] = []
+        """entries that were dropped since their deadline passed (or gave up)"""
 
         self.interface = interface
+        self.interface.on_edge_taken = self.passed
         self.routine = interface.routine
+        self.graph = DependencyGraph(self.routine)
         for u in self.routine.nodes.values():
             for edge in u.edges:
-                self.edges[edge.id] = EdgeInfo(edge)
-
-        for u in self.routine.nodes.values():
-            for edge in u.edges:
-                e = self.edges[edge.id]
-                for dep in edge.dependencies:
-                    d = DependencyInfo(edge, dep)
-                    self.deps[dep.id] = d
-                    print(dep.requires, "will trigger", d.target.id)
-                    self.edges[dep.requires].dependents.append(d)
-                    e.dependencies.append(d)
+                self.edges[edge.id] = EdgeInfo(edge, self.graph)
 
     def __schedulable(self, edge: Routine.Edge) -> bool:
         return self.edges[edge.id].pending >= 1
 
-    async def __exec(self, entry: SchedulerEntry) -> bool:
+    async def __exec(self, batch: List[SchedulerEntry]) -> List[SchedulerEntry]:
         """
-        Handle route to edge and execute, returns True if there is progress.
+        Handle route to edge and execute it once per entry (all of the same
+        edge, see __batch), returns the entries that made no progress.
         Updates failcount/okcount.
         """
 
-        edge = entry.edge
+        edge = batch[0].edge
         e = self.edges[edge.id]
-        deadline = entry.deadline
-
-        print("EXEC", entry.edge.id, [d.dependency.requires for d in e.dependencies])
 
         if not self.__schedulable(edge):
-            return False
-
-        if entry.deps:  # has dependencies to run
-            for dep in entry.deps.values():
-                e = self.edges[dep.dependency.requires]
-                print(
-                    entry.edge.description,
-                    "BLOCKED BY",
-                    e.edge.description,
-                    dep.dependency.requirement,
-                )
-                e.subscribe(entry)
-                for _ in range(max(0, dep.dependency.count - e.pending)):
-                    self.schedule(
-                        e.edge, deadline + 1, requirement=dep.dependency.requirement
-                    )
-            return True
+            return batch
 
-        # Able to run now.
-        assert e.pending >= 1, "should've been scheduled before exec"
+        assert all(x.blocked <= 0 for x in batch), "only ready entries are queued"
+        assert e.pending >= len(batch), "should've been scheduled before exec"
         e.fail_count = 0
-        e.pending -= 1
-
-        print("RUN ", edge.id, edge.name, edge.description)
-        result: ExecResult.ValueType = await self.interface.goto(edge)
-        print("RUN RESULT", result, ">=?", entry.requirement)
+        e.pending -= len(batch)
+
+        log.info("run %s %s %s x%d", edge.id, edge.name, edge.description, len(batch))
+        results: List[ExecResult.ValueType]
+        metrics.count("scheduler_runs", len(batch), edge=edge.id)
+        with metrics.span("scheduler_run", edge=edge.id):
+            if len(batch) == 1:
+                results = [await self.interface.goto(edge)]
+            else:
+                results = await self.interface.goto_batch(edge, len(batch))
+        log.debug("run result %s >=? %s", results, batch[0].requirement)
+
+        failed: List[SchedulerEntry] = []
+        for entry, result in zip(batch, results):
+            candidates = e.broadcast(result)
+            for x in candidates:
+                self.ready_queue.push(x)
+
+            progressing = result >= entry.requirement or candidates
+            if not progressing:
+                e.fail_once()
+                metrics.count("scheduler_failures", edge=edge.id)
+                failed.append(entry)
+
+        for entry in batch[len(results) :]:  # not attempted, run separately
+            e.pending += 1
+            self.ready_queue.push(entry)
+        return failed
 
-        candidates = e.broadcast(result)
-        print("RESOLVE", [x.edge.name for x in candidates])
-        for entry in candidates:
-            assert not entry.deps, "Should have no unmet dependencies."
-            heapq.heappush(self.ready_queue, entry)
+    def __batch(self, entry: SchedulerEntry) -> List[SchedulerEntry]:
+        """
+        Takes the other ready entries of the same edge out of the ready queue,
+        so they run in the same visit as `entry` (f.e. a dependency on count=N).
 
-        progressing = result >= entry.requirement or candidates
-        if not progressing:
-            e.fail_once()
-            return False
-        else:
-            return True
+        The visit saves the most on edges that end where they start: repeats
+        skip navigation entirely. For other edges, Runtime.queue_edge_batch
+        walks back to the source along a fixed shortest path, which saves
+        re-ranking routes but still takes the return edges every time.
+        """
+        e = self.edges[entry.edge.id]
+        same = self.ready_queue.of_edge(entry.edge.id)
+        if e.pending <= 1 or not same:
+            return []
+        t = self.now() if self.now else None
+        batch = sorted(
+            x
+            for x in same
+            if (t is None or x.deadline >= t)
+            and not (x.for_dependency and not e.waiting)
+        )[: e.pending - 1]
+        for x in batch:
+            self.ready_queue.remove(x)
+        return batch
 
     async def next(self) -> bool:
         """
         attempts to run the next scheduled item,
-        returns False when nothing to run (empty pq)
+        returns False when nothing to run (empty pq, no pending retries)
         """
+        for _, entry in list(self.retry_timers.due(self.__time())):
+            self.retry_timers.remove(entry)
+            self.ready_queue.push(entry)
         if not self.ready_queue:
-            return False
+            top = self.retry_timers.peek()
+            if not top:
+                return False
+            await self.sleep(max(0.0, top[0] - self.__time()))
+            return True
 
-        entry = heapq.heappop(self.ready_queue)
+        entry = self.__pop()
         edge = entry.edge
         if not self.__schedulable(edge):
             return True
 
-        if not await self.__exec(entry):
-            entry.fail()  # reschedule with lower priority
-            heapq.heappush(self.ready_queue, entry)
+        e = self.edges[edge.id]
+        if entry.for_dependency and not e.waiting:
+            e.pending -= 1  # whatever needed it was met some other way
+            return True
+
+        if self.now and entry.deadline < self.now():
+            self.__shed(entry)
+            return True
+
+        for x in await self.__exec([entry] + self.__batch(entry)):
+            self.__retry(x)
 
         return True
 
+    def __time(self) -> float:
+        return self.now() if self.now else get_clock().time()
+
+    def __retry(self, entry: SchedulerEntry) -> None:
+        """puts a failed entry back (after its retry delay), or gives it up"""
+        entry.fail()  # lower priority than entries that haven't failed
+        e = self.edges[entry.edge.id]
+        e.pending += 1  # exec counted it as done
+        delay = entry.retry.delay(entry.count)
+        if delay is None or (self.now and self.now() + delay > entry.deadline):
+            log.warning(
+                "give up %s %s after %d",
+                entry.edge.id,
+                entry.edge.description,
+                entry.count,
+            )
+            self.__shed(entry, reschedule=False)
+        elif delay:
+            self.retry_timers.set(entry, self.__time() + delay)
+        else:
+            self.ready_queue.push(entry)
+
+    def __pop(self) -> SchedulerEntry:
+        """removes the next entry to process from the ready queue"""
+        queue = self.ready_queue
+        if self.locality is None or len(queue) == 1:
+            return queue.pop()
+
+        # visits the heap in priority order, only within the deadline window
+        limit = queue[0].deadline + self.locality
+        best_i, best_cost = 0, math.inf
+        frontier = [(queue[0], 0)]
+        for _ in range(LOCALITY_WINDOW):
+            if not frontier:
+                break
+            entry, i = heapq.heappop(frontier)
+            if entry.deadline > limit:
+                break  # the rest come later
+            cost = self.interface.distance(entry.edge)
+            if cost < best_cost or (cost == best_cost and entry < queue[best_i]):
+                best_i, best_cost = i, cost
+            for j in (2 * i + 1, 2 * i + 2):
+                if j < len(queue):
+                    heapq.heappush(frontier, (queue[j], j))
+        return queue.pop(best_i)
+
+    def __shed(self, entry: SchedulerEntry, reschedule: bool = True) -> None:
+        """
+        Drops an entry past its deadline. Entries waiting on it that are also
+        past their deadline get dropped too, others get a new instance of it
+        (unless `reschedule` is False, then they're all dropped).
+        """
+        e = self.edges[entry.edge.id]
+        e.pending -= 1
+        self.missed.append(entry)
+        self.interface.on_deadline_missed(entry.edge)
+        log.warning(
+            "missed %s %s d=%s", entry.edge.id, entry.edge.description, entry.deadline
+        )
+
+        for id in entry.deps:  # no longer waiting
+            self.edges[id].unsubscribe(entry)
+        now = self.now() if self.now else -math.inf
+        for dependent in e.subscribers():
+            if not reschedule or dependent.deadline < now:
+                e.unsubscribe(dependent)
+                self.__shed(dependent, reschedule)
+            elif e.pending <= 0:
+                dep = dependent.deps[e.edge.id]
+                self.__add(e.edge, dependent.deadline, dep.requirement, dependent)
+
     def schedule(
         self,
         edge: Routine.Edge,
         deadline: float,
         update: bool = True,
         requirement: ExecResult.ValueType = ExecResult.REQUIREMENT_TYPE_CHECK,
+        retry: Optional[RetryPolicy] = None,
     ) -> None:
-        print("SCHEDULE", edge.id, f"d={deadline}")
+        log.debug("schedule %s d=%s", edge.id, deadline)
         self.interface.on_scheduled(edge)
         e = self.edges[edge.id]
         if update:
             e.pending += 1
-        entry = SchedulerEntry(edge, deadline, requirement=requirement)
-        heapq.heappush(self.ready_queue, entry)
+        entry = SchedulerEntry(edge, deadline, requirement=requirement, retry=retry)
+        self.__expand(entry)
+
+    def __add(
+        self,
+        edge: Routine.Edge,
+        deadline: float,
+        requirement: ExecResult.ValueType,
+        dependent: SchedulerEntry,
+    ) -> SchedulerEntry:
+        """schedules an instance of `edge` to meet a dependency of `dependent`"""
+        entry = self.__new(edge, deadline, requirement, dependent)
+        self.__expand(entry)
+        return entry
+
+    def __new(
+        self,
+        edge: Routine.Edge,
+        deadline: float,
+        requirement: ExecResult.ValueType,
+        dependent: SchedulerEntry,
+    ) -> SchedulerEntry:
+        """__add without expanding it"""
+        self.interface.on_scheduled(edge)
+        self.edges[edge.id].pending += 1
+        entry = SchedulerEntry(edge, deadline, requirement, retry=dependent.retry)
+        entry.for_dependency = True
+        return entry
+
+    def __expand(self, entry: SchedulerEntry) -> None:
+        """
+        Queues an entry if it's ready, otherwise subscribes it to its
+        dependencies and schedules the ones that aren't pending already, for
+        the whole chain at once. Goes through the edges it (transitively)
+        requires in reverse topological order (see DependencyGraph.chain), so
+        every instance of an edge is created before it is expanded.
+        """
+        todo: dict[str, List[SchedulerEntry]] = {entry.edge.id: [entry]}
+        for id in self.graph.chain(entry.edge.id):
+            for x in todo.pop(id, ()):
+                if x.blocked <= 0:
+                    self.ready_queue.push(x)
+                    continue
+                for dep in x.deps.values():
+                    e = self.edges[dep.dependency.requires]
+                    e.subscribe(x)
+                    for _ in range(max(0, dep.dependency.count - e.pending)):
+                        added = self.__new(e.edge, x.deadline, dep.requirement, x)
+                        todo.setdefault(e.edge.id, []).append(added)
+            if not todo:
+                break
+
+    def passed(self, edge: Routine.Edge, result: ExecResult.ValueType) -> None:
+        """
+        Notes that `edge` was taken while doing something else (f.e. on the way
+        to a scheduled edge), which meets implicit dependencies on it.
+        """
+        for x in self.edges[edge.id].broadcast(result, in_passing=True):
+            self.ready_queue.push(x)
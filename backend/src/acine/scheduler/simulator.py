@@ -0,0 +1,330 @@
+"""
+Offline schedule simulator / capacity planner.
+
+Replays the scheduling groups of some routines in virtual time, using edge
+durations measured in their RuntimeData, to answer "does everything fit?":
+how busy the service would be, what misses its deadline, and which idle
+windows are long enough to power-save in.
+
+Runs use the actual Scheduler (ordering, dependencies, deadlines, retries) and
+routines are dispatched with the same policy as the Multischeduler, but nothing
+waits on a wall clock, so months are simulated in seconds.
+
+Usage: python -m acine.scheduler.simulator [days]
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import sys
+import time
+from typing import Final, List, Optional, Tuple
+
+import networkx as nx
+from acine.clock import Clock
+from acine.diagnostics import quiet
+from acine.scheduler.managed_runtime import LOCALITY_WINDOW, ManagedRuntime
+from acine.scheduler.multischeduler import MAX_CONCURRENCY
+from acine.scheduler.scheduler import Scheduler
+from acine.scheduler.timers import TimerHeap
+from acine.scheduler.typing import ExecResult, ISchedulerRoutineInterface
+from acine_proto_dist.routine_pb2 import Routine
+from acine_proto_dist.runtime_pb2 import RuntimeData
+
+DEFAULT_DURATION: Final[float] = 5.0
+"""seconds; duration assumed for edges that were never measured"""
+
+POWER_SAVE_MIN_IDLE: Final[float] = 60.0
+"""seconds; shortest idle window the service would go to sleep in"""
+
+
+def edge_durations(data: RuntimeData) -> dict[str, float]:
+    """average duration (seconds) of each edge taken, from the event log"""
+    total: dict[str, float] = {}
+    count: dict[str, int] = {}
+    for event in data.events:
+        if not event.action.id or not event.HasField("time_end"):
+            continue
+        dt = (event.time_end.ToNanoseconds() - event.time_start.ToNanoseconds()) / 1e9
+        total[event.action.id] = total.get(event.action.id, 0.0) + max(0.0, dt)
+        count[event.action.id] = count.get(event.action.id, 0) + 1
+    return {k: total[k] / count[k] for k in total}
+
+
+class SteppingClock(Clock):
+    """
+    Time that jumps ahead on every sleep. Only right when one thing runs at a
+    time (as in the simulator), otherwise see acine.clock.VirtualClock.
+    """
+
+    def __init__(self, t: float = 0.0):
+        self.t = t
+
+    def time(self) -> float:
+        return self.t
+
+    def monotonic(self) -> float:
+        return self.t
+
+    async def sleep(self, dt: float) -> None:
+        self.t += max(0.0, dt)
+
+
+class SimulatedRoutineInterface(ISchedulerRoutineInterface):
+    """
+    Pretends to run a routine: taking an edge takes its measured duration,
+    navigating to it takes the durations of the shortest path there.
+    """
+
+    def __init__(
+        self,
+        routine: Routine,
+        durations: dict[str, float],
+        clock: SteppingClock,
+        default_duration: float = DEFAULT_DURATION,
+    ):
+        super().__init__(routine)
+        self.durations = durations
+        self.clock = clock
+        self.default_duration = default_duration
+        self.failures = 0
+        """edges that couldn't be reached"""
+
+        self.parent: dict[str, str] = {}  # edge id -> node id
+        self.G: nx.DiGraph = nx.DiGraph()
+        for n in routine.nodes.values():
+            self.G.add_node(n.id)
+            for e in n.edges:
+                self.parent[e.id] = n.id
+                if e.trigger & Routine.Edge.EDGE_TRIGGER_TYPE_STANDARD:
+                    self.G.add_edge(n.id, e.to, weight=self.duration(e))
+        self.travel_cache: dict[str, dict[str, float]] = {}
+        self.position: Optional[str] = None
+        self.reset()
+
+    def reset(self) -> None:
+        """back to where a freshly opened instance starts"""
+        self.position = "start" if "start" in self.routine.nodes else None
+
+    def duration(self, e: Routine.Edge) -> float:
+        return self.durations.get(e.id, self.default_duration)
+
+    def distance(self, e: Routine.Edge) -> float:
+        u = self.parent.get(e.id)
+        if self.position is None or u is None or u == self.position:
+            return 0
+        if self.position not in self.travel_cache:
+            self.travel_cache[self.position] = nx.single_source_dijkstra_path_length(
+                self.G, self.position
+            )
+        return self.travel_cache[self.position].get(u, math.inf)
+
+    async def goto(self, e: Routine.Edge) -> ExecResult.ValueType:
+        travel = self.distance(e)
+        if travel == math.inf:
+            self.failures += 1
+            return ExecResult.REQUIREMENT_TYPE_UNSPECIFIED
+        await self.clock.sleep(travel + self.duration(e))
+        if e.to in self.routine.nodes:
+            self.position = e.to
+        elif e.id in self.parent:
+            self.position = self.parent[e.id]
+        return ExecResult.REQUIREMENT_TYPE_COMPLETION
+
+
+class SimulatedRun:
+    def __init__(self, routine: Routine, start: float, end: float, groups: List[str]):
+        self.routine = routine
+        self.start = start
+        self.end = end
+        self.groups = groups
+        self.missed: List[Routine.Edge] = []
+        """edges shed past their deadline (or given up)"""
+
+        self.late: List[str] = []
+        """groups whose edges finished after their deadline"""
+
+    def __repr__(self) -> str:
+        return f"SimulatedRun({self.routine.name} {self.start}-{self.end})"
+
+
+class SimulationReport:
+    def __init__(self, start: float, end: float, runs: List[SimulatedRun]):
+        self.start = start
+        self.end = end
+        self.runs = runs
+
+    @property
+    def busy(self) -> List[Tuple[float, float]]:
+        """merged intervals where anything was running"""
+        out: List[Tuple[float, float]] = []
+        for run in sorted(self.runs, key=lambda x: x.start):
+            if out and run.start <= out[-1][1]:
+                out[-1] = (out[-1][0], max(out[-1][1], run.end))
+            else:
+                out.append((run.start, run.end))
+        return out
+
+    @property
+    def utilisation(self) -> float:
+        """fraction of the simulated time something was running"""
+        busy = sum(min(b, self.end) - a for a, b in self.busy)
+        return busy / (self.end - self.start) if self.end > self.start else 0.0
+
+    @property
+    def misses(self) -> List[Tuple[SimulatedRun, Routine.Edge]]:
+        """edges shed past their deadline"""
+        return [(run, e) for run in self.runs for e in run.missed]
+
+    @property
+    def late(self) -> List[Tuple[SimulatedRun, str]]:
+        """groups that finished after their deadline"""
+        return [(run, k) for run in self.runs for k in run.late]
+
+    def idle_windows(
+        self, min_idle: float = POWER_SAVE_MIN_IDLE
+    ) -> List[Tuple[float, float]]:
+        """gaps of at least `min_idle` seconds where nothing was running"""
+        out: List[Tuple[float, float]] = []
+        t = self.start
+        for a, b in self.busy + [(self.end, self.end)]:
+            if a - t >= min_idle:
+                out.append((t, a))
+            t = max(t, b)
+        return out
+
+    def __str__(self) -> str:
+        days = (self.end - self.start) / 86400
+        lines = [
+            f"simulated {days:.1f} days: {len(self.runs)} runs, "
+            f"utilisation {self.utilisation:.2%}, {len(self.misses)} deadline misses, "
+            f"{len(self.late)} late"
+        ]
+        per_routine: dict[str, List[SimulatedRun]] = {}
+        for run in self.runs:
+            per_routine.setdefault(run.routine.name, []).append(run)
+        for name, runs in per_routine.items():
+            busy = sum(x.end - x.start for x in runs)
+            missed = sum(len(x.missed) for x in runs)
+            late = sum(len(x.late) for x in runs)
+            lines.append(
+                f"  {name}: {len(runs)} runs, {busy / 3600:.2f}h busy, "
+                f"{missed} missed, {late} late"
+            )
+        idle = self.idle_windows()
+        if idle:
+            longest = max(b - a for a, b in idle)
+            total = sum(b - a for a, b in idle)
+            lines.append(
+                f"idle windows >= {POWER_SAVE_MIN_IDLE:.0f}s: {len(idle)} "
+                f"(longest {longest / 3600:.2f}h, total {total / 86400:.2f} days)"
+            )
+        return "\n".join(lines)
+
+
+class Simulator:
+    """
+    `routines` need to be fully loaded (with nodes).
+    `durations` is routine id -> edge id -> seconds (see `edge_durations`).
+    `startup` is how long opening a routine takes before it can run anything.
+    """
+
+    def __init__(
+        self,
+        routines: List[Routine],
+        durations: Optional[dict[str, dict[str, float]]] = None,
+        max_concurrency: int = MAX_CONCURRENCY,
+        default_duration: float = DEFAULT_DURATION,
+        startup: float = 0.0,
+    ):
+        self.routines = routines
+        self.durations = durations or {}
+        self.max_concurrency = max(1, max_concurrency)
+        self.default_duration = default_duration
+        self.startup = startup
+        self.clock = SteppingClock()
+        self.interfaces: dict[ManagedRuntime, SimulatedRoutineInterface] = {}
+
+    async def run(self, start: float, end: float) -> SimulationReport:
+        """Simulates every dispatch in [start, end)"""
+        timers: TimerHeap[ManagedRuntime] = TimerHeap()
+        for r in self.routines:
+            x = ManagedRuntime(r)
+            x.link()
+            self.interfaces[x] = SimulatedRoutineInterface(
+                r, self.durations.get(r.id, {}), self.clock, self.default_duration
+            )
+            x.on_change = lambda x: timers.set(x, x.next_time())
+            for sg in x.S.values():
+                sg.next_time = sg.schedule.next(start - 1e-6)
+
+        runs: List[SimulatedRun] = []
+        running: dict[ManagedRuntime, float] = {}  # -> when it finishes
+        last_started: dict[ManagedRuntime, float] = {}
+        t = start
+        with quiet():  # misses are in the report
+            while t < end:
+                for x in [x for x, t_end in running.items() if t_end <= t]:
+                    del running[x]
+
+                # same policy as Multischeduler.dispatch
+                busy = {r for x in running for r in x.resources()}
+                ready = sorted(
+                    (x for _, x in timers.due(t) if x not in running),
+                    key=lambda x: (x.next_time(), last_started.get(x, -math.inf)),
+                )
+                for x in ready:
+                    if len(running) >= self.max_concurrency:
+                        break
+                    if busy.intersection(x.resources()):
+                        continue
+                    busy.update(x.resources())
+                    last_started[x] = t
+                    run = await self.__run(x, t)
+                    runs.append(run)
+                    running[x] = run.end
+
+                events = list(running.values())
+                for tx, x in timers.ordered():
+                    if x not in running and tx > t:
+                        events.append(tx)
+                        break
+                if not events:
+                    break
+                t = min(events)
+        return SimulationReport(start, end, runs)
+
+    async def __run(self, x: ManagedRuntime, t: float) -> SimulatedRun:
+        clock = self.clock
+        clock.t = t + self.startup
+        sri = self.interfaces[x]
+        sri.reset()
+        scheduler = Scheduler(
+            sri, now=clock.time, locality=LOCALITY_WINDOW, sleep=clock.sleep
+        )
+        groups = x.schedule_due(scheduler, t, now=t)
+        while await scheduler.next():
+            pass
+        run = SimulatedRun(x.routine, t, clock.time(), groups)
+        run.missed = [entry.edge for entry in scheduler.missed]
+        for k in groups:
+            deadline = x.S[k].group.deadline
+            if deadline and run.end > t + deadline:
+                run.late.append(k)
+        return run
+
+
+async def main(days: float) -> None:
+    from acine.instance_manager import get_routines, get_runtime_data
+
+    routines = get_routines(full=True)
+    durations = {r.id: edge_durations(get_runtime_data(r)) for r in routines}
+    start = time.time()
+    report = await Simulator(routines, durations).run(start, start + days * 86400)
+    print(report)
+    print(f"(took {time.time() - start:.2f}s)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(float(sys.argv[1]) if len(sys.argv) > 1 else 7))
@@ -0,0 +1,124 @@
+"""
+Indexed timer heap, used to find what runs next without scanning every
+routine/scheduling group.
+"""
+
+from __future__ import annotations
+
+import heapq
+from typing import Generic, Hashable, Iterator, List, Optional, Tuple, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+
+
+class TimerHeap(Generic[K]):
+    """
+    Binary min-heap of (time, key) where each key appears at most once.
+
+    set/remove are O(log n) (the position of each key is tracked), peek is O(1).
+    Keys with equal times come out in the order they were set.
+    """
+
+    def __init__(self) -> None:
+        self.heap: List[Tuple[float, int, K]] = []
+        self.pos: dict[K, int] = {}
+        self.counter = 0
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self.pos
+
+    def __repr__(self) -> str:
+        return f"TimerHeap({list(self.ordered())})"
+
+    def get(self, key: K) -> Optional[float]:
+        """time of a key (None if not present)"""
+        if key not in self.pos:
+            return None
+        return self.heap[self.pos[key]][0]
+
+    def set(self, key: K, t: float) -> None:
+        """inserts a key, or moves it to a new time"""
+        self.counter += 1
+        item = (t, self.counter, key)
+        if key in self.pos:
+            i = self.pos[key]
+            old = self.heap[i]
+            self.heap[i] = item
+            if item < old:
+                self.__up(i)
+            else:
+                self.__down(i)
+        else:
+            self.heap.append(item)
+            self.pos[key] = len(self.heap) - 1
+            self.__up(len(self.heap) - 1)
+
+    def remove(self, key: K) -> None:
+        """removes a key (if present)"""
+        if key not in self.pos:
+            return
+        i = self.pos.pop(key)
+        last = self.heap.pop()
+        if i < len(self.heap):
+            self.heap[i] = last
+            self.pos[last[2]] = i
+            self.__up(i)
+            self.__down(self.pos[last[2]])
+
+    def peek(self) -> Optional[Tuple[float, K]]:
+        """earliest (time, key)"""
+        if not self.heap:
+            return None
+        t, _, key = self.heap[0]
+        return t, key
+
+    def ordered(self) -> Iterator[Tuple[float, K]]:
+        """
+        Yields (time, key) in ascending order without modifying the heap,
+        O(log k) per item for the first k items. Don't modify while iterating.
+        """
+        if not self.heap:
+            return
+        frontier = [(self.heap[0], 0)]
+        while frontier:
+            (t, _, key), i = heapq.heappop(frontier)
+            yield t, key
+            for j in (2 * i + 1, 2 * i + 2):
+                if j < len(self.heap):
+                    heapq.heappush(frontier, (self.heap[j], j))
+
+    def due(self, t: float) -> Iterator[Tuple[float, K]]:
+        """(time, key) with time <= t, in ascending order"""
+        for item in self.ordered():
+            if item[0] > t:
+                return
+            yield item
+
+    def __swap(self, i: int, j: int) -> None:
+        heap = self.heap
+        heap[i], heap[j] = heap[j], heap[i]
+        self.pos[heap[i][2]] = i
+        self.pos[heap[j][2]] = j
+
+    def __up(self, i: int) -> None:
+        while i > 0:
+            parent = (i - 1) // 2
+            if self.heap[i] >= self.heap[parent]:
+                break
+            self.__swap(i, parent)
+            i = parent
+
+    def __down(self, i: int) -> None:
+        n = len(self.heap)
+        while True:
+            smallest = i
+            for j in (2 * i + 1, 2 * i + 2):
+                if j < n and self.heap[j] < self.heap[smallest]:
+                    smallest = j
+            if smallest == i:
+                break
+            self.__swap(i, smallest)
+            i = smallest
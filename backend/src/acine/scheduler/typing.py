@@ -1,4 +1,4 @@
-from typing import Callable
+from typing import Callable, List, Optional
 
 from acine_proto_dist.routine_pb2 import Routine
 
@@ -8,6 +8,13 @@ ExecResult = Routine.RequirementType
 class ISchedulerRoutineInterface:
     def __init__(self, routine: Routine):
         self.routine = routine
+        self.on_edge_taken: Optional[
+            Callable[[Routine.Edge, ExecResult.ValueType], None]
+        ] = None
+        """
+        set by the scheduler; goto should call it for edges taken along the way
+        (other than e itself), so they can meet implicit dependencies
+        """
 
     async def goto(self, e: Routine.Edge) -> ExecResult.ValueType:
         """
@@ -16,8 +23,39 @@ class ISchedulerRoutineInterface:
         """
         raise NotImplementedError("goto is not implemented", e)
 
+    async def goto_batch(self, e: Routine.Edge, n: int) -> List[ExecResult.ValueType]:
+        """
+        Executes e up to n times in one visit (when it is pending several times).
+        Returns the result of each run attempted, it may stop after a failed run.
+        Implementations should navigate only once.
+        """
+        results: List[ExecResult.ValueType] = []
+        for _ in range(n):
+            results.append(await self.goto(e))
+            if results[-1] < ExecResult.REQUIREMENT_TYPE_COMPLETION:
+                break
+        return results
+
+    def distance(self, e: Routine.Edge) -> float:
+        """
+        Estimated cost of navigating to e from the current position (used to
+        order work by locality). 0 if unknown.
+        """
+        return 0
+
     def on_scheduled(self, edge: Routine.Edge) -> None:
         pass
 
+    def on_deadline_missed(self, edge: Routine.Edge) -> None:
+        """called when a scheduled edge is dropped since its deadline passed"""
+        pass
+
+    def on_group_completed(self, group: Routine.SchedulingGroup, t: float) -> None:
+        """
+        called when everything a scheduling group dispatched at `t` was run,
+        should persist `t` as the group's last run (see ExecutionInfo.last_run)
+        """
+        pass
+
 
 OnScheduledCallbackType = Callable[[Routine.Edge], None]
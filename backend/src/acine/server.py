@@ -1,21 +1,29 @@
 from __future__ import annotations
 
 import asyncio
-import multiprocessing.pool
+import logging
 import time
 import uuid
+from concurrent.futures import Future
 from copy import deepcopy
-from typing import List, Optional
+from typing import Callable, Final, List, Optional, Tuple
 
 from acine import instance_manager
 from acine.capture import GameCapture
 from acine.environ import get_start_command_candidates
 from acine.input_handler import InputHandler
-from acine.instance_manager import write_runtime_data
-from acine.persist import PrefixedFilesystem
+from acine.instance_manager import get_runtime_data_async, write_runtime_data
+from acine.logging import (
+    get_recent_runtime_events,
+    get_runtime_events,
+    save_condition_records,
+    summarize_runtime_data,
+)
+from acine.persist import PrefixedFilesystem, get_executor, run_io
 from acine.runtime.check_image import SimilarityResult, check_similarity
 from acine.runtime.runtime import IController, ImageBmpType, Runtime
 from acine.runtime.util import get_frame
+from acine.sampling import batch_by_time, get_sampling_pool
 
 # import acine_proto_dist as pb
 from acine_proto_dist.frame_pb2 import Frame
@@ -25,14 +33,15 @@ from acine_proto_dist.packet_pb2 import (
     Configuration,
     FrameOperation,
     Packet,
+    RuntimeEvents,
 )
 from acine_proto_dist.position_pb2 import Point
 from acine_proto_dist.routine_pb2 import Routine
-from acine_proto_dist.runtime_pb2 import RuntimeState
+from acine_proto_dist.runtime_pb2 import Event, RuntimeState
 from autobahn.asyncio.websocket import WebSocketServerProtocol  # type: ignore
 from autobahn.websocket.types import ConnectionRequest  # type: ignore
 
-# from .classifier import predict
+# from .classifier import StateClassifier
 
 # title = "Arknights"
 title = "TestEnv"
@@ -40,6 +49,41 @@ title = "TestEnv"
 # ih = InputHandler(title)  # ahk waits for window
 # gc = GameCapture(title)  # windows_capture doesn't wait for window
 
+# how many of the most recent runtime events are sent when loading a routine
+# older events are sent in pages of the same size when requested
+RUNTIME_EVENTS_WINDOW: Final[int] = 100
+
+log = logging.getLogger(__name__)
+
+
+def log_write_failure(routine_id: str) -> Callable[[Future[None]], None]:
+    """done callback for background writes, logs what went wrong (if anything)"""
+
+    def callback(future: Future[None]) -> None:
+        if not future.cancelled() and future.exception():
+            log.error(
+                "failed to save runtime data of %s",
+                routine_id,
+                exc_info=future.exception(),
+            )
+
+    return callback
+
+
+def to_condition_processing_frame(
+    frame: Frame, results: List[SimilarityResult]
+) -> Optional[ConditionProcessing.Frame]:
+    """converts sampling results for a frame (None if there's no match)"""
+    if not results:
+        return None
+    pb = ConditionProcessing.Frame(frame=frame)
+    for result in results:
+        y, x = result.position
+        pb.matches.append(
+            ConditionProcessing.Match(position=Point(x=x, y=y), score=result.score)
+        )
+    return pb
+
 
 class Controller(IController):
     def __init__(
@@ -87,22 +131,29 @@ class AcineServerProtocol(WebSocketServerProtocol):
         self.rt: Optional[Runtime] = None
         self.fs = PrefixedFilesystem()
         self.current_task: Optional[asyncio.Task] = None
+        self.sample_task: Optional[asyncio.Task] = None
 
     def onConnect(self, request: ConnectionRequest) -> None:
         """WebSocketServerProtocol method, 'connect' event"""
-        print("Client connecting: {}".format(request.peer))
+        log.info("client connecting: %s", request.peer)
 
     def onOpen(self) -> None:
         """WebSocketServerProtocol method, 'open' event"""
-        print("WebSocket connection open.")
+        log.info("websocket connection open")
 
     def onClose(self, wasClean: bool, code: int, reason: str) -> None:
-        print("WebSocket connection closed: {}".format(reason))
+        log.info("websocket connection closed: %s", reason)
 
         # cleanup
+        if self.sample_task:
+            self.sample_task.cancel()
         if self.gc:
-            print("run cleanup")
-            write_runtime_data(self.rt.routine, self.rt.data)  # persist logs
+            log.info("run cleanup")
+            # persist logs (snapshot now, write on the i/o thread pool)
+            save_condition_records(self.rt.routine, self.rt.data)
+            data = deepcopy(self.rt.data)
+            future = get_executor().submit(write_runtime_data, self.rt.routine, data)
+            future.add_done_callback(log_write_failure(self.rt.routine.id))
             self.gc.close()
             self.gc = None
             self.ih = None
@@ -140,9 +191,7 @@ class AcineServerProtocol(WebSocketServerProtocol):
                 case "configuration":
                     await self.on_configuration(packet)
                 case "routine":
-                    data = Routine.SerializeToString(packet.routine)
-                    await self.fs.write(["rt.pb"], data)
-                    await self.load_routine(packet.routine)
+                    await self.save_routine(packet.routine)
                 case "get_routine":
                     await self.on_get_routine(packet)
                 case "set_curr":
@@ -157,6 +206,8 @@ class AcineServerProtocol(WebSocketServerProtocol):
                     await self.on_sample_condition(packet, True)
                 case "get_window_size":
                     await self.get_window_size(packet)
+                case "runtime_events":
+                    await self.on_runtime_events(packet)
 
     def abort_task(f):
         """abort current task (goto/queue_edge) before running"""
@@ -189,6 +240,15 @@ class AcineServerProtocol(WebSocketServerProtocol):
         self.gc = GameCapture(await self.ih.win.title)
         self.fs.set_prefix([routine.id])
 
+    async def save_routine(self, routine: Routine) -> None:
+        """
+        Persists an updated routine (and its metadata index entry), then reloads.
+        """
+        await self.fs.write(["rt.pb"], routine.SerializeToString())
+        metadata = instance_manager.get_routine_metadata(routine)
+        await self.fs.write(["meta.pb"], metadata.SerializeToString())
+        await self.load_routine(routine)
+
     @abort_task
     async def load_routine(self, routine: Routine) -> None:
         """
@@ -212,14 +272,22 @@ class AcineServerProtocol(WebSocketServerProtocol):
 
         assert self.gc and self.ih, "Peripherals should be initialized."
 
+        # keep runtime data (and its event log) across routine revisions
+        if self.rt and self.rt.routine.id == routine.id:
+            data = self.rt.data
+        else:
+            data = await get_runtime_data_async(routine)
+
         self.rt = Runtime(
             routine,
             Controller(self, self.gc, self.ih),
+            data,
             on_change_curr=self.on_change_curr,
             on_change_return=self.on_change_return,
             on_change_edge=self.on_change_edge,
-            # NOTE: this is only for testing, this won't persist since
-            # runtimedata is not set (so it gets reset repeatedly)
+            on_event=self.on_event,
+            # NOTE: this is only for testing, frames are archived on every
+            # check so the archive grows quickly
             # enable_logs=True,
         )
         if old_context:
@@ -231,7 +299,7 @@ class AcineServerProtocol(WebSocketServerProtocol):
                 if not self.gc:
                     return
                 img, width, height = await self.gc.get_png_frame()
-                state = "DISABLED"  # predict(img)
+                state = "DISABLED"  # StateClassifier.classify on the raw frame
                 data = img.tobytes()
                 p = Packet(
                     frame_operation=FrameOperation(
@@ -256,10 +324,14 @@ class AcineServerProtocol(WebSocketServerProtocol):
             case FrameOperation.OPERATION_SAVE:
                 f: Frame = packet.frame_operation.frame
                 await self.fs.write(["img", f"{f.id}.png"], f.data)
+                if self.rt:
+                    get_sampling_pool().discard(self.rt.routine.id, f.id)
             case FrameOperation.OPERATION_BATCH_GET:
-                # populate requested frames
-                for i, f in enumerate(packet.frame_operation.frames):
-                    f.data = await self.fs.read(["img", f"{f.id}.png"])
+                # populate requested frames (read concurrently)
+                frames = packet.frame_operation.frames
+                paths = [["img", f"{f.id}.png"] for f in frames]
+                for f, data in zip(frames, await self.fs.read_many(paths)):
+                    f.data = data
                 self.sendMessage(
                     packet.SerializeToString(),
                     isBinary=True,
@@ -319,6 +391,27 @@ class AcineServerProtocol(WebSocketServerProtocol):
         )
         self.sendMessage(response.SerializeToString(), isBinary=True)
 
+    def on_event(self, event: Event) -> None:
+        """streams a single newly logged event (appended to runtime data)"""
+        if not self.rt:
+            return
+        total = len(self.rt.data.events)
+        response = Packet(
+            runtime_events=RuntimeEvents(offset=total - 1, total=total, events=[event])
+        )
+        self.sendMessage(response.SerializeToString(), isBinary=True)
+
+    async def on_runtime_events(self, packet: Packet) -> None:
+        """(from client) request for a page of (older) runtime events"""
+        if not self.rt:
+            return
+        request = packet.runtime_events
+        count = min(request.count or RUNTIME_EVENTS_WINDOW, RUNTIME_EVENTS_WINDOW)
+        packet.runtime_events.CopyFrom(
+            get_runtime_events(self.rt.data, request.offset, count)
+        )
+        self.sendMessage(packet.SerializeToString(), isBinary=True)
+
     @abort_task
     async def on_set_curr(self, packet: Packet) -> None:
         """(from client) request to set curr"""
@@ -376,63 +469,102 @@ class AcineServerProtocol(WebSocketServerProtocol):
 
         match packet.WhichOneof("type"):
             case "sample_condition":
-                imgs = [
-                    (f, get_frame(self.rt.routine.id, f.id))
-                    for f in self.rt.routine.frames.values()
-                ]
-                output = packet.sample_condition.frames
-                condition = packet.sample_condition.condition
+                request = packet.sample_condition
             case "sample_current":
-                emptyFrame = Frame(id="REALTIME")
-                imgs = [(emptyFrame, await self.gc.get_frame())]
-                output = packet.sample_current.frames
-                condition = packet.sample_current.condition
+                request = packet.sample_current
             case _:
                 raise NotImplementedError(
                     "Unsupported packet type for on_sample_condition",
                     packet.WhichOneof("type"),
                 )
+        if not curr and (request.stream or request.cancel):
+            if self.sample_task:
+                # abort previous query (if still running)
+                self.sample_task.cancel()
+            if request.cancel:
+                return
+            self.sample_task = asyncio.create_task(self.stream_sample_condition(packet))
+            await self.sample_task
+            return
+
+        output = request.frames
+        condition = request.condition
         condition_type = condition.WhichOneof("condition")
         match condition_type:
             case "image":
                 c = condition.image
                 c.threshold = 0.4  # clientside can filter
-                ref = get_frame(self.rt.routine.id, c.frame_id)
-                iresults: List[List[SimilarityResult]] = []
-                if len(imgs) == 1:
-                    iresults.append(check_similarity(c, imgs[0][1], ref))
+                iresults: List[Tuple[Frame, List[SimilarityResult]]] = []
+                if curr:
+                    img = await self.gc.get_frame()
+                    ref = await run_io(get_frame, self.rt.routine.id, c.frame_id)
+                    results = await asyncio.to_thread(check_similarity, c, img, ref)
+                    iresults.append((Frame(id="REALTIME"), results))
                 else:
-
-                    def exec(
-                        fimg: tuple[Frame, ImageBmpType],
-                    ) -> List[SimilarityResult]:
-                        return check_similarity(c, fimg[1], ref, return_one=True)
-
+                    frames = {f.id: f for f in self.rt.routine.frames.values()}
                     t0 = time.time()
-                    print(f"[ ] Start processing {len(imgs)} frames")
-                    with multiprocessing.pool.ThreadPool() as p:
-                        iresults = p.map(exec, imgs, chunksize=3)
-                    print(f"[+] Completed {time.time() - t0:.2f}s")
-                for i, fimg in enumerate(imgs):
-                    f, _ = fimg
-                    results = iresults[i]
-                    if not results:
-                        continue
-
-                    pb = ConditionProcessing.Frame(frame=f)
-                    for result in results:
-                        y, x = result.position
-                        pb.matches.append(
-                            ConditionProcessing.Match(
-                                position=Point(x=x, y=y), score=result.score
-                            )
-                        )
-                    output.append(pb)
+                    log.info("start processing %d frames", len(frames))
+                    pool = get_sampling_pool()
+                    async for id, results in pool.sample(
+                        self.rt.routine.id, c, list(frames.keys())
+                    ):
+                        iresults.append((frames[id], results))
+                    log.info("completed %.2fs", time.time() - t0)
+                for f, results in iresults:
+                    if pb := to_condition_processing_frame(f, results):
+                        output.append(pb)
                 output.sort(key=lambda x: x.matches[0].score, reverse=True)
             case _:
                 raise NotImplementedError(f"No implementation for {condition_type}")
         self.sendMessage(packet.SerializeToString(), isBinary=True)
 
+    async def stream_sample_condition(self, packet: Packet) -> None:
+        """
+        Streaming variant of on_sample_condition (saved frames only).
+
+        Sends a packet with each chunk of results as they are computed (each
+        sorted best-first), followed by an empty packet marked `done`.
+        """
+
+        assert self.rt
+        request = packet.sample_condition
+        condition = request.condition
+        c = condition.image
+        c.threshold = 0.4  # clientside can filter
+        frames = {f.id: f for f in self.rt.routine.frames.values()}
+
+        def send(output: List[ConditionProcessing.Frame], done: bool) -> None:
+            output.sort(key=lambda x: x.matches[0].score, reverse=True)
+            res = ConditionProcessing(frames=output, done=done)
+            p = Packet(id=packet.id, sample_condition=res)
+            self.sendMessage(p.SerializeToString(), isBinary=True)
+
+        t0 = time.time()
+        log.info("start streaming %d frames", len(frames))
+        try:
+            condition_type = condition.WhichOneof("condition")
+            if condition_type != "image":
+                raise NotImplementedError(f"No implementation for {condition_type}")
+            pool = get_sampling_pool()
+            results = pool.sample(self.rt.routine.id, c, list(frames.keys()))
+            async for batch in batch_by_time(results):
+                output = [
+                    pb
+                    for id, r in batch
+                    if (pb := to_condition_processing_frame(frames[id], r))
+                ]
+                if output:
+                    send(output, False)
+            log.info("completed %.2fs", time.time() - t0)
+        except asyncio.CancelledError:
+            log.info("cancelled after %.2fs", time.time() - t0)
+            return  # superseded, the client isn't waiting on it anymore
+        except Exception:
+            # f.e. the reference frame is missing, still end the stream so the
+            # client doesn't wait on it forever
+            log.exception("sampling failed after %.2fs", time.time() - t0)
+        send([], True)
+
     async def on_create_routine(self, packet: Packet) -> None:
         routine = instance_manager.create_routine(packet.create_routine)
         await self.load_routine(routine)
@@ -447,8 +579,14 @@ class AcineServerProtocol(WebSocketServerProtocol):
         packet = Packet(get_routine=routine)
         self.sendMessage(packet.SerializeToString(), isBinary=True)
 
-        data = instance_manager.get_runtime_data(routine)
-        self.sendMessage(Packet(runtime=data).SerializeToString(), isBinary=True)
+        # the full event log can be large, so only send the most recent window
+        assert self.rt, "Runtime should be loaded."
+        data = self.rt.data
+        packet = Packet(runtime=summarize_runtime_data(data))
+        self.sendMessage(packet.SerializeToString(), isBinary=True)
+        events = get_recent_runtime_events(data, RUNTIME_EVENTS_WINDOW)
+        packet = Packet(runtime_events=events)
+        self.sendMessage(packet.SerializeToString(), isBinary=True)
 
     async def on_get_configuration(self, packet: Packet) -> None:
         config = packet.get_configuration
@@ -3,13 +3,14 @@ from __future__ import annotations
 import asyncio
 import inspect
 import sys
-from typing import Any, Callable, Coroutine, Optional, TypeVar
+from typing import Any, Callable, Coroutine, Iterator, Optional, TypeVar
 
 import pytest
 from _pytest.config import Config
 from _pytest.nodes import Item
 from _pytest.reports import TestReport
 from _pytest.runner import CallInfo
+from acine.clock import VirtualClock, use_clock
 
 T = TypeVar("T")
 
@@ -29,6 +30,13 @@ def pytest_configure(config: Config) -> None:
     )
 
 
+@pytest.fixture
+def virtual_clock() -> Iterator[VirtualClock]:
+    """runs the test on virtual time (see acine.clock)"""
+    with use_clock(VirtualClock()) as clock:
+        yield clock
+
+
 # item is type Item ... but is also a Coroutine ...
 # but somehow you want item.obj (not sure why)
 @pytest.hookimpl(hookwrapper=True)
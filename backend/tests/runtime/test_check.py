@@ -1,8 +1,18 @@
-from typing import cast
+from typing import List, cast
 
 import numpy as np
 import pytest
-from acine.runtime.check import ImageBmpType, Routine, check_once
+from acine.runtime.check import (
+    ADAPTIVE_INTERVAL,
+    ADAPTIVE_MAX_INTERVAL,
+    MAX_RECORDS,
+    ActionResult,
+    ImageBmpType,
+    PollPlan,
+    Routine,
+    check,
+    check_once,
+)
 from acine_proto_dist.position_pb2 import Rect
 from pytest_mock import MockerFixture
 
@@ -33,3 +43,69 @@ class TestCheck:
         p.return_value = ret
         assert check_once(c, img, ref_img) == ret
         p.assert_called_once_with(c.image, img, ref_img)
+
+
+class FakeClock:
+    """for check(); a condition that passes once `ready` ms have passed"""
+
+    def __init__(self, mocker: MockerFixture, ready: float):
+        self.t = 0.0
+        self.ready = ready
+        self.polls: List[float] = []
+        mocker.patch("acine.runtime.check.now", side_effect=lambda: self.t)
+        mocker.patch("acine.runtime.check.sleep", side_effect=self.sleep)
+        mocker.patch("acine.runtime.check.check_once", side_effect=self.check_once)
+
+    async def sleep(self, ms: float) -> None:
+        self.t += max(0, ms)
+
+    async def get_img(self) -> ImageBmpType:
+        self.polls.append(self.t)
+        return cast(ImageBmpType, None)
+
+    def check_once(self, *args: object) -> bool:
+        return self.t >= self.ready
+
+
+@pytest.mark.asyncio
+class TestPolling:
+    async def test_records(self, mocker: MockerFixture) -> None:
+        clock = FakeClock(mocker, ready=250)
+        c = Routine.Condition(delay=50, interval=100)
+        res, _ = await check(c, clock.get_img)
+        assert res == ActionResult.RESULT_PASS
+        assert clock.polls == [50, 150, 250], "fixed delay and interval"
+        assert list(c.records) == [250]
+
+        c.records.extend([1] * MAX_RECORDS)
+        await check(c, clock.get_img)
+        assert len(c.records) == MAX_RECORDS, "only keeps the recent ones"
+
+    async def test_adaptive(self, mocker: MockerFixture) -> None:
+        clock = FakeClock(mocker, ready=1000)
+        c = Routine.Condition(interval=100, adaptive=True, records=[1000] * 5)
+        await check(c, clock.get_img)
+        assert clock.polls[0] == 800, "sleeps until shortly before the usual time"
+        assert len(clock.polls) == 1 + 200 // ADAPTIVE_INTERVAL, "then polls densely"
+
+    async def test_adaptive_few_records(self, mocker: MockerFixture) -> None:
+        clock = FakeClock(mocker, ready=300)
+        c = Routine.Condition(interval=100, adaptive=True, records=[300])
+        await check(c, clock.get_img)
+        assert clock.polls == [0, 100, 200, 300], "not enough data yet"
+
+
+def test_backoff() -> None:
+    c = Routine.Condition(interval=100, adaptive=True, records=[100, 200, 300, 400])
+    plan = PollPlan(c)
+    assert plan.start == 80
+    assert plan.next(200) == ADAPTIVE_INTERVAL
+    waits = [plan.next(500 + i) for i in range(10)]
+    assert waits[:3] == [
+        2 * ADAPTIVE_INTERVAL,
+        4 * ADAPTIVE_INTERVAL,
+        8 * ADAPTIVE_INTERVAL,
+    ]
+    assert waits[-1] == ADAPTIVE_MAX_INTERVAL
+
+    assert PollPlan(c, no_delay=True).start == 0, "checks right away"
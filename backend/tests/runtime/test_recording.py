@@ -0,0 +1,140 @@
+import shutil
+from typing import Iterator, List
+
+import cv2
+import numpy as np
+import pytest
+from acine.clock import VirtualClock
+from acine.persist import PrefixedFilesystem, mkdir, resolve
+from acine.runtime.recording import RecordedFrame, Recording, ReplayController
+from acine.runtime.runtime import Routine, Runtime
+from acine_proto_dist.input_event_pb2 import InputEvent, InputReplay
+from acine_proto_dist.runtime_pb2 import Action, RuntimeData
+
+Phase = Action.Phase
+
+
+def image(value: int) -> np.ndarray:
+    return np.full((4, 4, 3), value, np.uint8)
+
+
+def value(img: np.ndarray) -> int:
+    return int(img[0, 0, 0])
+
+
+def session() -> RuntimeData:
+    """edge a: precondition at 10s, postcondition at 12s; edge b times out at 20s"""
+    logged = {
+        "a": [
+            (10, "f1", Phase.PHASE_PRECONDITION),
+            (12, "f2", Phase.PHASE_POSTCONDITION),
+        ],
+        "b": [(20, "f3", Phase.PHASE_PRECONDITION)],
+    }
+    data = RuntimeData()
+    for edge_id, frames in logged.items():
+        event = data.events.add(action=Action.Log(id=edge_id))
+        for t, archive_id, phase in frames:
+            x = event.action.events.add(archive_id=archive_id, phase=phase)
+            x.timestamp.FromSeconds(t)
+    return data
+
+
+@pytest.fixture
+def pfs() -> Iterator[PrefixedFilesystem]:
+    shutil.rmtree(resolve("test_recording"), ignore_errors=True)
+    mkdir(["test_recording"])
+    yield PrefixedFilesystem(["test_recording"])
+    shutil.rmtree(resolve("test_recording"), ignore_errors=True)
+
+
+def test_index() -> None:
+    refs = Recording.index(session())
+    assert [(x.t, x.archive_id, x.gated) for x in refs] == [
+        (0, "f1", True),
+        (2, "f2", False),
+        (10, "f3", False),
+    ]
+    assert [x.archive_id for x in Recording.index(session(), start=11)] == [
+        "f2",
+        "f3",
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("virtual_clock")
+class TestReplayController:
+    async def test_timing(self, virtual_clock: VirtualClock) -> None:
+        recording = Recording(
+            [RecordedFrame(t, image(t)) for t in (0, 5, 6)]
+            + [RecordedFrame(60, image(60))]
+        )
+        controller = ReplayController(recording)
+        seen: List[int] = []
+        for _ in range(8):
+            seen.append(value(await controller.get_frame()))
+            await virtual_clock.sleep(2)
+        assert seen == [0, 0, 0, 6, 6, 6, 6, 6]
+        await virtual_clock.sleep(60)
+        assert value(await controller.get_frame()) == 60
+        assert controller.ended
+
+    async def test_gated(self, virtual_clock: VirtualClock) -> None:
+        recording = Recording(
+            [
+                RecordedFrame(0, image(0), gated=True),
+                RecordedFrame(1, image(1)),
+            ]
+        )
+        controller = ReplayController(recording)
+        await virtual_clock.sleep(10)
+        assert value(await controller.get_frame()) == 0, "waits for input"
+        await controller.mouse_down()
+        await controller.mouse_up()
+        assert value(await controller.get_frame()) == 1
+        await controller.mouse_up()
+        assert (controller.inputs, controller.unexpected_inputs) == (2, 1)
+
+    async def test_gated_delay(self, virtual_clock: VirtualClock) -> None:
+        recording = Recording(
+            [
+                RecordedFrame(0, image(0), gated=True),
+                RecordedFrame(3, image(3)),
+            ]
+        )
+        controller = ReplayController(recording)
+        await controller.mouse_up()
+        assert value(await controller.get_frame()) == 0, "not before recorded delay"
+        await virtual_clock.sleep(3)
+        assert value(await controller.get_frame()) == 3
+
+    async def test_runtime(self, virtual_clock: VirtualClock) -> None:
+        recording = Recording(
+            [
+                RecordedFrame(0, image(0), gated=True),
+                RecordedFrame(1, image(1)),
+            ]
+        )
+        controller = ReplayController(recording)
+        routine = Routine(nodes={"start": Routine.Node(id="start")})
+        click = InputReplay(
+            events=[
+                InputEvent(timestamp=100, mouse_down=1),
+                InputEvent(timestamp=200, mouse_up=1),
+            ]
+        )
+        with Runtime(routine, controller) as rt:
+            await rt.run_replay(click)
+        await virtual_clock.sleep(1)
+        assert value(await controller.get_frame()) == 1
+        assert controller.unexpected_inputs == 0
+
+    async def test_load(
+        self, pfs: PrefixedFilesystem, virtual_clock: VirtualClock
+    ) -> None:
+        for i, id in enumerate(("f1", "f2", "f3")):
+            _, data = cv2.imencode(".bmp", image(i))
+            await pfs.write_archive([f"{id}.bmp"], data.tobytes())
+        recording = await Recording.load(pfs, session())
+        assert [value(x.img) for x in recording.frames] == [0, 1, 2]
+        assert recording.duration == 10
@@ -4,7 +4,14 @@ from unittest.mock import AsyncMock, Mock
 
 import pytest
 import pytest_asyncio
-from acine.runtime.runtime import ActionResult, IController, Routine, Runtime
+from acine.metrics import METRICS
+from acine.runtime.runtime import (
+    ActionResult,
+    ExecResult,
+    IController,
+    Routine,
+    Runtime,
+)
 from acine_proto_dist.input_event_pb2 import InputEvent, InputReplay
 from acine_proto_dist.position_pb2 import Point
 from pytest_mock import MockerFixture
@@ -75,7 +82,7 @@ def single_event_replay(event: InputEvent) -> InputReplay:
 
 
 @pytest.mark.asyncio
-@pytest.mark.asyncio_time_limit(time_limit=2)
+@pytest.mark.usefixtures("virtual_clock")
 class TestRuntime:
     @pytest.mark.parametrize("x", (1, 4))
     @pytest.mark.parametrize("y", (2, 3))
@@ -130,7 +137,7 @@ class TestRuntime:
 
 
 @pytest.mark.asyncio
-@pytest.mark.asyncio_time_limit(time_limit=2)
+@pytest.mark.usefixtures("virtual_clock")
 class TestRuntimeIntegration:
     """
     Various tests on the graph traversal algorithm
@@ -467,3 +474,70 @@ class TestRuntimeIntegration:
             cast(AsyncMock, rt.run_replay).assert_has_calls(
                 [mocker.call(e34.replay, 0, 0) for _ in range(total)]
             )
+
+    @pytest.mark.dependency(depends=["goto"])
+    async def test_queue_edge_batch(
+        self,
+        mocker: MockerFixture,
+        checks_always_pass: Never,
+        mocked_check: AsyncMock,
+        mocked_controller: IController,
+    ) -> None:
+        """
+        n1 -> n1 (e11), n1 <-> n2
+        """
+        n1 = self.node("start")
+        n2 = self.node("n2")
+        e11 = self.add_edge(n1, n1)
+        e12 = self.add_edge(n1, n2)
+        e21 = self.add_edge(n2, n1)
+
+        r = Routine(nodes={u.id: u for u in (n1, n2)})
+        with Runtime(r, mocked_controller) as rt:
+            mocker.patch.object(rt, "run_replay", return_value=None)
+            await rt.goto(n2.id)
+            goto = mocker.spy(rt, "goto")
+            mocked_check.reset_mock()
+            cast(AsyncMock, rt.run_replay).reset_mock()
+
+            assert (
+                await rt.queue_edge_batch(e11.id, 3)
+                == [ExecResult.REQUIREMENT_TYPE_COMPLETION] * 3
+            )
+            goto.assert_called_once_with(n1.id)
+            assert cast(AsyncMock, rt.run_replay).call_count == 4, "n2->n1 + 3 e11"
+            no_delay = [c.kwargs["no_delay"] for c in mocked_check.call_args_list]
+            assert no_delay.count(True) == 2, "repeats skip the precondition delay"
+
+            cast(AsyncMock, rt.run_replay).reset_mock()
+            n = len(rt.data.events)
+            assert (
+                await rt.queue_edge_batch(e12.id, 3)
+                == [ExecResult.REQUIREMENT_TYPE_COMPLETION] * 3
+            )
+            cast(AsyncMock, rt.run_replay).assert_has_calls(
+                [mocker.call(x.replay, 0, 0) for x in (e12, e21) * 2 + (e12,)]
+            )
+            comments = [x.debug.comment for x in rt.data.events[n:]]
+            assert "goto" not in comments, "walks back to n1 without re-ranking"
+            assert comments.count("queue_edge_batch::return") == 2
+
+    async def test_metrics(
+        self,
+        mocker: MockerFixture,
+        checks_always_pass: Never,
+        mocked_controller: IController,
+    ) -> None:
+        n1 = self.node("start")
+        n2 = self.node("n2")
+        e12 = self.add_edge(n1, n2)
+        mocker.patch.object(METRICS, "enabled", True)
+        mocker.patch.object(METRICS, "histograms", {})
+        with Runtime(Routine(nodes={"start": n1, "n2": n2}), mocked_controller) as rt:
+            mocker.patch.object(rt, "run_replay", return_value=None)
+            await rt.queue_edge(e12.id)
+        edge = (("edge", e12.id),)
+        assert METRICS.histograms[("edge_seconds", edge)].count == 1
+        assert METRICS.histograms[("replay_seconds", edge)].count == 1
+        pre = edge + (("phase", "PHASE_PRECONDITION"),)
+        assert METRICS.histograms[("check_seconds", pre)].count == 1
@@ -171,7 +171,7 @@ def test_enable_disable_condition() -> None:
 
 
 @pytest.mark.asyncio
-@pytest.mark.asyncio_time_limit(time_limit=2)
+@pytest.mark.usefixtures("virtual_clock")
 class TestRuntimeExceptions:
     async def test_basic(self, sab: Routine, mocker: MockerFixture) -> None:
         with MockRuntime(sab, mocker) as rt:
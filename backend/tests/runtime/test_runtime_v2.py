@@ -3,6 +3,7 @@ A more complete test suite for Runtime?
 """
 
 import asyncio
+import math
 from copy import deepcopy
 from typing import AsyncIterator, Iterator
 
@@ -43,7 +44,7 @@ async def runtime(
 
 
 @pytest.mark.asyncio
-@pytest.mark.asyncio_time_limit(time_limit=2)
+@pytest.mark.usefixtures("virtual_clock")
 class TestInvalid:
     async def test_no_start(self, mocked_controller: IController) -> None:
         """the node with id=start is required to initialize"""
@@ -73,7 +74,7 @@ def class_setup_teardown() -> Iterator[None]:
 
 
 @pytest.mark.asyncio
-@pytest.mark.asyncio_time_limit(time_limit=2)
+@pytest.mark.usefixtures("virtual_clock")
 @pytest.mark.usefixtures("class_setup_teardown")
 class TestRunEdge:
     """
@@ -84,7 +85,7 @@ class TestRunEdge:
 
 
 @pytest.mark.asyncio
-@pytest.mark.asyncio_time_limit(time_limit=2)
+@pytest.mark.usefixtures("virtual_clock")
 class TestQueueEdge:
     """
     `queue_edge` should only make calls to `goto` and `run_edge`.
@@ -105,7 +106,7 @@ class TestQueueEdge:
 
 
 @pytest.mark.asyncio
-@pytest.mark.asyncio_time_limit(time_limit=2)
+@pytest.mark.usefixtures("virtual_clock")
 class TestGoto:
     """
     `goto` handles path-finding. It handles edge failures and rerouting.
@@ -145,8 +146,19 @@ class TestGoto:
         assert runtime.context.curr.id == "n9", "should reach target"
 
 
+class TestDistance:
+    @pytest.mark.parametrize("runtime", (chain(10),), indirect=True, ids=["chain"])
+    def test_chain(self, runtime: Runtime) -> None:
+        assert runtime.distances_from("start")["n3"] == 3
+        assert runtime.distance("n9") == 9
+        runtime.set_curr(runtime.nodes["n5"])
+        assert runtime.distance("n9") == 4
+        assert runtime.distance("n1") == math.inf, "no way back in a chain"
+        assert runtime.distances_from("INVALID") == {}
+
+
 @pytest.mark.asyncio
-@pytest.mark.asyncio_time_limit(time_limit=2)
+@pytest.mark.usefixtures("virtual_clock")
 class TestGotoOnline:
     """
     `goto` online tests, only required for editor
@@ -180,7 +192,7 @@ class TestGotoOnline:
 
 
 @pytest.mark.asyncio
-@pytest.mark.asyncio_time_limit(time_limit=2)
+@pytest.mark.usefixtures("virtual_clock")
 class TestContext:
     """
     `get_context` and `restore_context` are used to restore state when the
@@ -204,9 +216,35 @@ class TestContext:
         await runtime.goto(target)
         assert runtime.context.curr.id == target, "should reach target"
 
+    @pytest.mark.parametrize("runtime", (chain(10),), indirect=True, ids=["chain"])
+    @pytest.mark.parametrize("holds", (True, False))
+    async def test_check_curr(
+        self, runtime: Runtime, mocker: MockerFixture, holds: bool
+    ) -> None:
+        """a warm instance only resumes from its last node if it's still there"""
+        mocker.patch("acine.runtime.runtime.get_frame")
+        check_once = mocker.patch("acine.runtime.runtime.check_once")
+        check_once.return_value = holds
+        runtime.set_curr(runtime.nodes["n3"])
+        runtime.nodes["n3"].default_condition.image.frame_id = "n3"
+        assert await runtime.check_curr() == holds
+        check_once.assert_called_once()
+        assert runtime.context.curr.id == ("n3" if holds else "start")
+
+    @pytest.mark.parametrize("runtime", (chain(10),), indirect=True, ids=["chain"])
+    async def test_check_curr_unchecked(
+        self, runtime: Runtime, mocker: MockerFixture
+    ) -> None:
+        """nodes without a default condition can't be told apart, kept"""
+        check_once = mocker.patch("acine.runtime.runtime.check_once")
+        runtime.set_curr(runtime.nodes["n3"])
+        assert await runtime.check_curr()
+        check_once.assert_not_called()
+        assert runtime.context.curr.id == "n3"
+
 
 @pytest.mark.asyncio
-@pytest.mark.asyncio_time_limit(time_limit=2)
+@pytest.mark.usefixtures("virtual_clock")
 class TestLogging:
     @pytest.mark.parametrize(
         "runtime",
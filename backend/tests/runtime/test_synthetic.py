@@ -0,0 +1,94 @@
+import shutil
+from random import Random
+
+import numpy as np
+import pytest
+from acine.clock import VirtualClock
+from acine.persist import resolve
+from acine.runtime.runtime import Runtime
+from acine.runtime.synthetic import (
+    SyntheticController,
+    Transition,
+    button,
+    from_routine,
+    render,
+    save_frames,
+)
+from acine.runtime.util import get_frame
+
+from .util import chain, create_from_edge_list  # type: ignore
+
+
+def test_render() -> None:
+    assert np.array_equal(render("a"), render("a")), "deterministic"
+    assert not np.array_equal(render("a"), render("b"))
+    assert render("a", (50, 30)).shape == (30, 50, 3)
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("virtual_clock")
+class TestSyntheticController:
+    async def test_click(self, virtual_clock: VirtualClock) -> None:
+        env = SyntheticController({"start": [Transition(button(1), "b")]}, latency=0.5)
+        await env.mouse_move(button(0).left, button(0).top)  # wrong button
+        await env.mouse_down()
+        await env.mouse_up()
+        assert env.misses == 1
+
+        await env.mouse_move(button(1).left, button(1).top)
+        await env.mouse_down()
+        await env.mouse_up()
+        assert np.array_equal(await env.get_frame(), env.frame("start"))
+        await virtual_clock.sleep(0.5)
+        assert np.array_equal(await env.get_frame(), env.frame("b"))
+        assert (env.clicks, env.misses) == (2, 1)
+
+    async def test_jitter(self, virtual_clock: VirtualClock) -> None:
+        async def delays(seed: int) -> list[float]:
+            env = SyntheticController(
+                {"start": [Transition(button(0), "start")]},
+                latency=1,
+                jitter=0.5,
+                seed=seed,
+            )
+            out = []
+            for _ in range(5):
+                await env.mouse_move(button(0).left, button(0).top)
+                await env.mouse_down()
+                await env.mouse_up()
+                assert env.pending
+                out.append(env.pending[0] - virtual_clock.time())
+                env.pending = None
+            return out
+
+        assert await delays(1) == await delays(1)
+        assert await delays(1) != await delays(2)
+        assert all(0.5 <= t <= 1.5 for t in await delays(3))
+
+    async def test_navigation(self, virtual_clock: VirtualClock) -> None:
+        routine = chain(20)
+        routine.id = "test_synthetic"
+        shutil.rmtree(resolve(routine.id), ignore_errors=True)
+        get_frame.cache_clear()
+        env = from_routine(routine, latency=0.3, jitter=0.1)
+        save_frames(routine, env)
+        with Runtime(routine, env) as rt:
+            await rt.goto("n19")
+        assert env.state == "n19"
+        assert env.misses == 0
+        assert virtual_clock.time() > 19 * 0.2
+        shutil.rmtree(resolve(routine.id), ignore_errors=True)
+
+    async def test_large(self, virtual_clock: VirtualClock) -> None:
+        """1000-node graph, without image conditions (no reference frames)"""
+        rng = Random(0)
+        ids = ["start"] + [f"n{i}" for i in range(1, 1000)]
+        edges = [(u, v) for u, v in zip(ids, ids[1:])]
+        edges += [(rng.choice(ids), rng.choice(ids)) for _ in range(1000)]
+        routine = create_from_edge_list(*edges)
+        env = from_routine(routine, conditions=False)
+        with Runtime(routine, env) as rt:
+            for target in ("n999", "n500", "n10"):
+                await rt.goto(target)
+                assert env.state == target
+        assert env.misses == 0
@@ -4,7 +4,7 @@ from random import randint, random, seed, shuffle
 from typing import List
 
 import pytest
-from acine.scheduler.cron import TZ, next
+from acine.scheduler.cron import TZ, Schedule, next
 from acine_proto_dist.routine_pb2 import Routine
 
 SG = Routine.SchedulingGroup
@@ -159,6 +159,13 @@ class TestNext:
                 datetime(2025, 8, 18, 2, tzinfo=TZ),  # Monday after 3rd Sunday 2AM
                 id="biweekly 3rd-sunday +offset",
             ),
+            pytest.param(
+                SG.PERIOD_BIWEEKLY,
+                [3600],
+                datetime(2025, 3, 30, 1, tzinfo=TZ),  # 5th Sunday
+                datetime(2025, 4, 6, 1, tzinfo=TZ),  # next month's 1st Sunday
+                id="biweekly 5th-sunday",
+            ),
             pytest.param(
                 SG.PERIOD_MONTHLY,
                 [],
@@ -200,3 +207,54 @@ class TestNext:
         result = next(curr.timestamp(), sg)
         assert datetime.fromtimestamp(result, tz=TZ).__str__() == expected.__str__()
         assert result == expected.timestamp()
+
+
+class TestSchedule:
+    PRESETS = (
+        SG(period=3600, dispatch_times=[0, 100, 1800]),
+        SG(period_preset=SG.PERIOD_DAILY, dispatch_times=[3600, 7200]),
+        SG(period_preset=SG.PERIOD_WEEKLY, dispatch_times=[0, 86400 * 3]),
+        SG(period_preset=SG.PERIOD_BIWEEKLY, dispatch_times=[3600]),
+        SG(period_preset=SG.PERIOD_MONTHLY, dispatch_times=[0, 86400 * 10]),
+    )
+
+    @pytest.mark.parametrize("sg", PRESETS)
+    def test_same_as_next(self, sg: SG) -> None:
+        seed(0)
+        start = datetime(2025, 1, 1, tzinfo=TZ).timestamp()
+        times = [start + randint(0, 86400 * 400) + random() for _ in range(300)]
+        in_order = sorted(times)
+        shuffle(times)
+        schedule = Schedule(sg)
+        for t in in_order + times:  # cached periods, then out of order
+            assert schedule.next(t) == next(t, SG(**sg_kwargs(sg))), t
+
+    @pytest.mark.parametrize("sg", PRESETS)
+    def test_bulk(self, sg: SG) -> None:
+        schedule = Schedule(sg)
+        a = datetime(2025, 2, 20, tzinfo=TZ).timestamp() + 1
+        fires = schedule.next_n(a, 20)
+        assert fires == sorted(fires) and fires[0] > a
+        assert schedule.between(a, fires[-1]) == fires[:-1]
+        assert schedule.between(fires[0], fires[-1] + 1) == fires, "[a, b)"
+        assert schedule.between(a, a) == []
+        assert len(set(fires)) == len(fires), "always moves forward"
+
+    def test_invalid(self) -> None:
+        for sg in (SG(), SG(period=10, dispatch_times=[10]), SG(dispatch_times=[1, 1])):
+            with pytest.raises(ValueError):
+                Schedule(sg)
+        schedule = Schedule(
+            SG(period_preset=SG.PERIOD_MONTHLY, dispatch_times=[0, 86400 * 30])
+        )
+        schedule.next(datetime(2025, 1, 5, tzinfo=TZ).timestamp())
+        with pytest.raises(ValueError):
+            schedule.next(datetime(2025, 2, 5, tzinfo=TZ).timestamp())
+
+
+def sg_kwargs(sg: SG) -> dict:
+    return dict(
+        period=sg.period,
+        period_preset=sg.period_preset,
+        dispatch_times=list(sg.dispatch_times),
+    )
@@ -0,0 +1,54 @@
+from typing import List, Tuple
+
+import pytest
+from acine.scheduler.dependencies import DependencyGraph, is_implicit
+from acine_proto_dist.routine_pb2 import Routine
+
+
+def routine(n: int, deps: List[Tuple[int, int]]) -> Routine:
+    """edges 0..n-1, where (u, v) means v requires u"""
+    edges = [Routine.Edge(id=str(i)) for i in range(n)]
+    for u, v in deps:
+        edges[v].dependencies.append(Routine.Dependency(requires=str(u)))
+    return Routine(nodes={"n": Routine.Node(id="n", edges=edges)})
+
+
+class TestDependencyGraph:
+    def test_layers(self) -> None:
+        g = DependencyGraph(routine(5, [(0, 1), (1, 2), (0, 2), (3, 2)]))
+        assert g.layers == [["0", "3", "4"], ["1"], ["2"]]
+        assert g.layer["2"] == 2
+        assert g.order == ["0", "3", "4", "1", "2"]
+        assert len(g) == 5
+
+    def test_requirements(self) -> None:
+        g = DependencyGraph(routine(5, [(0, 1), (1, 2), (3, 2)]))
+        assert g.requirements["2"] == {"0", "1", "3"}
+        assert g.requirements["1"] == {"0"}
+        assert not g.requirements["4"]
+        assert [e.id for e in g.dependents["1"]] == ["2"]
+
+    def test_chain(self) -> None:
+        g = DependencyGraph(routine(6, [(0, 1), (1, 2), (0, 2), (3, 2), (4, 5)]))
+        assert g.chain("2") == ["2", "1", "0", "3"]
+        assert g.chain("5") == ["5", "4"]
+        assert g.chain("0") == ["0"]
+        assert g.dependency["0", "2"].requires == "0"
+
+    def test_cycle(self) -> None:
+        with pytest.raises(ValueError, match="cycle"):
+            DependencyGraph(routine(3, [(0, 1), (1, 2), (2, 0)]))
+
+    def test_unknown(self) -> None:
+        r = routine(1, [])
+        r.nodes["n"].edges[0].dependencies.append(Routine.Dependency(requires="x"))
+        with pytest.raises(ValueError, match="unknown"):
+            DependencyGraph(r)
+
+
+def test_is_implicit() -> None:
+    assert is_implicit(Routine.Dependency()), "implicit by default"
+    assert is_implicit(Routine.Dependency(type=Routine.DEPENDENCY_TYPE_IMPLICIT))
+    assert not is_implicit(Routine.Dependency(type=Routine.DEPENDENCY_TYPE_EXPLICIT))
+    strict = Routine.Dependency(type=Routine.DEPENDENCY_TYPE_STRICT_IMPLICIT)
+    assert not is_implicit(strict), "must happen next, not in passing"
@@ -0,0 +1,126 @@
+from typing import List
+
+import pytest
+from acine.clock import VirtualClock
+from acine.scheduler.instance_pool import InstancePool, PooledInstance
+from acine.scheduler.multischeduler import Multischeduler
+from acine.scheduler.resources import ResourceLocks
+from acine.scheduler.typing import ExecResult, ISchedulerRoutineInterface
+from acine_proto_dist.routine_pb2 import Routine
+
+from .test_multischeduler import routine  # type: ignore
+
+
+class Interface(ISchedulerRoutineInterface):
+    async def goto(self, e: Routine.Edge) -> ExecResult.ValueType:
+        return ExecResult.REQUIREMENT_TYPE_COMPLETION
+
+
+class FakeInstance(PooledInstance):
+    def __init__(self, routine: Routine, log: List[str]):
+        super().__init__(routine)
+        self.log = log
+        self.ok = True
+
+    async def open(self) -> None:
+        self.log.append(f"open {self.routine.id}")
+
+    async def close(self) -> None:
+        self.log.append(f"close {self.routine.id}")
+
+    async def healthy(self) -> bool:
+        return self.ok
+
+    async def release(self) -> None:
+        self.log.append(f"release {self.routine.id}")
+
+    def interface(self) -> ISchedulerRoutineInterface:
+        return Interface(self.routine)
+
+
+def make() -> tuple[InstancePool, List[str]]:
+    log: List[str] = []
+
+    def create(r: Routine, locks: ResourceLocks) -> FakeInstance:
+        return FakeInstance(r, log)
+
+    return InstancePool(create, idle_timeout=60), log
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("virtual_clock")
+class TestInstancePool:
+    async def test_reuse(self) -> None:
+        pool, log = make()
+        locks = ResourceLocks()
+        r = routine("a", "a")
+        for _ in range(3):
+            async with pool.open(r, locks):
+                pass
+        assert log == ["open a"] + ["release a"] * 3
+        assert (pool.hits, pool.misses) == (2, 1)
+
+        async with pool.open(routine("a", "a"), locks):
+            pass  # equal routine (f.e. reloaded) is still reused
+        assert log.count("open a") == 1
+
+        changed = routine("a", "a")
+        changed.name = "b"
+        async with pool.open(changed, locks):
+            pass
+        assert log[-3:] == ["close a", "open a", "release a"], "routine changed"
+
+    async def test_unhealthy(self) -> None:
+        pool, log = make()
+        r = routine("a", "a")
+        async with pool.open(r, ResourceLocks()):
+            pass
+        instance, _ = pool.idle["a"]
+        assert isinstance(instance, FakeInstance)
+        instance.ok = False
+        async with pool.open(r, ResourceLocks()):
+            pass
+        assert log == ["open a", "release a", "close a", "open a", "release a"]
+
+    async def test_failure(self) -> None:
+        pool, log = make()
+        with pytest.raises(RuntimeError):
+            async with pool.open(routine("a", "a"), ResourceLocks()):
+                raise RuntimeError("run failed")
+        assert log == ["open a", "release a", "close a"]
+        assert len(pool) == 0, "not reused"
+
+    async def test_evict(self, virtual_clock: VirtualClock) -> None:
+        pool, log = make()
+        for name in ("a", "b"):
+            virtual_clock.advance(30)
+            async with pool.open(routine(name, name), ResourceLocks()):
+                pass
+        virtual_clock.advance(30)
+        assert await pool.evict() == ["a"]
+        assert list(pool.idle) == ["b"]
+        await pool.close()
+        assert len(pool) == 0
+        assert log[-2:] == ["close a", "close b"]
+
+    async def test_multischeduler(self) -> None:
+        pool, log = make()
+        ms = Multischeduler([routine("a", "a")], open_instance=pool.open)
+        for t in (0, 1):
+            ms.tasks[0].S["sg"].next_time = t
+            ms.dispatch(t)
+            await ms.wait()
+        assert log == ["open a", "release a", "release a"]
+
+    async def test_records_ignored(self) -> None:
+        pool, log = make()
+        r = routine("a", "a")
+        async with pool.open(r, ResourceLocks()):
+            pass
+        for n in r.nodes.values():  # what the runtime does while it runs
+            n.default_condition.records.append(100)
+            for e in n.edges:
+                e.precondition.records.append(100)
+        async with pool.open(r, ResourceLocks()):
+            pass
+        assert log.count("open a") == 1
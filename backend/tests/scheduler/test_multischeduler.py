@@ -0,0 +1,216 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List
+
+import pytest
+from acine.clock import VirtualClock, get_clock
+from acine.scheduler.managed_runtime import MAX_CATCH_UP, CatchUp
+from acine.scheduler.multischeduler import Multischeduler
+from acine.scheduler.resources import ResourceLocks
+from acine.scheduler.typing import ExecResult, ISchedulerRoutineInterface
+from acine_proto_dist.routine_pb2 import Routine
+
+
+def routine(name: str, window: str) -> Routine:
+    """routine with a single scheduled edge (group period 1h)"""
+    edge = Routine.Edge(
+        id=f"{name}-e",
+        schedules=[Routine.Edge.ScheduleInstance(scheduling_group_id="sg")],
+    )
+    return Routine(
+        id=name,
+        name=name,
+        launch_config=Routine.LaunchConfiguration(window_name=window),
+        nodes={"n": Routine.Node(id="n", edges=[edge])},
+        sgroups={"sg": Routine.SchedulingGroup(id="sg", name="sg", period=3600)},
+    )
+
+
+class Tracker:
+    """fake instance factory, records which routines run at the same time"""
+
+    def __init__(self, duration: float = 0.05):
+        self.duration = duration
+        self.active: set[str] = set()
+        self.overlaps: List[set[str]] = []
+        self.order: List[str] = []
+        self.failing: set[str] = set()
+        self.completed: List[tuple[str, float]] = []
+
+    @asynccontextmanager
+    async def open(
+        self, routine: Routine, locks: ResourceLocks
+    ) -> AsyncIterator[ISchedulerRoutineInterface]:
+        tracker = self
+
+        class Interface(ISchedulerRoutineInterface):
+            async def goto(self, e: Routine.Edge) -> ExecResult.ValueType:
+                if routine.id in tracker.failing:
+                    raise RuntimeError("failed")
+                await asyncio.sleep(tracker.duration)
+                return ExecResult.REQUIREMENT_TYPE_COMPLETION
+
+            def on_group_completed(
+                self, group: Routine.SchedulingGroup, t: float
+            ) -> None:
+                tracker.completed.append((group.id, t))
+
+        self.order.append(routine.id)
+        self.active.add(routine.id)
+        self.overlaps.append(set(self.active))
+        try:
+            yield Interface(routine)
+        finally:
+            self.active.remove(routine.id)
+
+    def peak(self) -> int:
+        return max(len(x) for x in self.overlaps)
+
+
+def make(routines: List[Routine], tracker: Tracker, n: int) -> Multischeduler:
+    ms = Multischeduler(routines, max_concurrency=n, open_instance=tracker.open)
+    for i, x in enumerate(ms.tasks):
+        x.S["sg"].next_time = i  # all ready, in order
+    return ms
+
+
+async def drain(ms: Multischeduler) -> None:
+    while ms.dispatch(100) or ms.running:
+        await ms.wait()
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("virtual_clock")
+class TestConcurrent:
+    @pytest.mark.parametrize("n", (1, 2, 4))
+    async def test_max_concurrency(self, n: int) -> None:
+        tracker = Tracker()
+        ms = make([routine(str(i), str(i)) for i in range(6)], tracker, n)
+        await drain(ms)
+        assert sorted(tracker.order) == [str(i) for i in range(6)]
+        assert tracker.peak() == n
+        assert ms.next_time() > 100, "all groups rescheduled"
+
+    async def test_same_window(self) -> None:
+        tracker = Tracker()
+        routines = [routine("a", "w"), routine("b", "w"), routine("c", "x")]
+        ms = make(routines, tracker, 3)
+        assert [x.routine.id for x in ms.dispatch(100)] == ["a", "c"]
+        await drain(ms)
+        assert all(not {"a", "b"} <= x for x in tracker.overlaps)
+        assert sorted(tracker.order) == ["a", "b", "c"]
+
+    async def test_failure_isolated(self) -> None:
+        tracker = Tracker()
+        tracker.failing.add("a")
+        ms = make([routine("a", "a"), routine("b", "b")], tracker, 2)
+        await drain(ms)
+        assert sorted(tracker.order) == ["a", "b"]
+
+    async def test_fairness(self) -> None:
+        tracker = Tracker()
+        ms = make([routine(str(i), str(i)) for i in range(3)], tracker, 1)
+        for x in ms.tasks:
+            x.S["sg"].next_time = 0  # tie: least recently started goes first
+        ms.last_started = {ms.tasks[0]: 3.0, ms.tasks[1]: 1.0, ms.tasks[2]: 2.0}
+        assert [x.routine.id for x in ms.ready(100)] == ["1", "2", "0"]
+
+        ms.tasks[0].S["sg"].next_time = -1  # waited longest
+        assert [x.routine.id for x in ms.ready(100)] == ["0", "1", "2"]
+        await ms.close()
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("virtual_clock")
+class TestResourceLocks:
+    async def test_exclusive(self) -> None:
+        locks = ResourceLocks()
+        order: List[str] = []
+
+        async def hold(name: str, resources: List[str]) -> None:
+            async with locks.hold(resources):
+                order.append(f"+{name}")
+                await asyncio.sleep(0.01)
+                order.append(f"-{name}")
+
+        await asyncio.gather(hold("a", ["x", "y"]), hold("b", ["y", "x"]))
+        assert order == ["+a", "-a", "+b", "-b"]
+        assert not locks.locked(["x", "y"])
+
+    async def test_independent(self) -> None:
+        locks = ResourceLocks()
+        async with locks.hold(["x"]):
+            assert locks.locked(["x"])
+            assert not locks.locked(["y"])
+            async with locks.hold(["y"]):
+                assert locks.locked(["x", "y"])
+
+
+class TestIndex:
+    def test_on_scheduled(self) -> None:
+        ms = make([routine(str(i), str(i)) for i in range(3)], Tracker(), 1)
+        assert ms.get_next().routine.id == "0"
+        ms.tasks[0].S["sg"].on_scheduled()
+        assert ms.get_next().routine.id == "1"
+        assert ms.next_time() == 1
+        assert [x.routine.id for x in ms.ready(1.5)] == ["1"]
+        assert ms.tasks[0].next_groups(ms.tasks[0].next_time()) == ["sg"]
+
+    def test_reload(self) -> None:
+        ms = make([routine("a", "a"), routine("b", "b")], Tracker(), 1)
+        assert ms.next_time() == 0
+        x = ms.reload(routine("a", "a"))
+        assert x.next_time() == 0, "unchanged group keeps its time"
+        assert ms.get_next() is x
+
+        r = routine("a", "a")
+        r.sgroups["sg"].period = 60  # changed group is rescheduled
+        x = ms.reload(r)
+        assert x.next_time() > 1
+        assert ms.get_next().routine.id == "b"
+        assert len(ms.tasks) == 2
+
+        ms.remove("b")
+        assert ms.get_next() is x
+        assert [x.routine.id for x in ms.tasks] == ["a"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("virtual_clock")
+class TestCatchUp:
+    async def run(self, catch_up: int, missed: int) -> Tracker:
+        r = routine("a", "a")
+        r.sgroups["sg"].catch_up = catch_up  # type: ignore
+        last_run = get_clock().time() - 3600 * missed - 1
+        tracker = Tracker(duration=0)
+        ms = Multischeduler(
+            [r], open_instance=tracker.open, last_runs=lambda _: {"sg": last_run}
+        )
+        while ms.dispatch() or ms.running:
+            await ms.wait()
+        assert ms.next_time() > get_clock().time(), "caught up"
+        return tracker
+
+    @pytest.mark.parametrize(
+        "catch_up,runs",
+        (
+            (CatchUp.CATCH_UP_UNSPECIFIED, 0),
+            (CatchUp.CATCH_UP_COALESCE, 1),
+            (CatchUp.CATCH_UP_EACH, 3),
+        ),
+    )
+    async def test_catch_up(
+        self, catch_up: int, runs: int, virtual_clock: VirtualClock
+    ) -> None:
+        t = virtual_clock.time()
+        tracker = await self.run(catch_up, 3)
+        assert len(tracker.order) == runs
+        assert [k for k, _ in tracker.completed] == ["sg"] * runs
+        times = [x for _, x in tracker.completed]
+        assert times == sorted(times) and all(x < t for x in times), "dispatch times"
+        if catch_up == CatchUp.CATCH_UP_EACH:
+            assert times[1] - times[0] == 3600
+
+    async def test_max_catch_up(self) -> None:
+        tracker = await self.run(CatchUp.CATCH_UP_EACH, MAX_CATCH_UP + 5)
+        assert len(tracker.order) == MAX_CATCH_UP
@@ -1,9 +1,16 @@
+import math
 from random import randint, seed, shuffle
 from typing import Any, List, Sequence, Tuple
 from unittest.mock import AsyncMock, Mock, call
 
 import pytest
-from acine.scheduler.scheduler import Scheduler
+from acine.scheduler.scheduler import (
+    LOCALITY_WINDOW,
+    ReadyQueue,
+    RetryPolicy,
+    Scheduler,
+    SchedulerEntry,
+)
 from acine.scheduler.typing import (
     ExecResult,
     ISchedulerRoutineInterface,
@@ -30,7 +37,7 @@ class AlwaysOk(ISchedulerRoutineInterface):
 
 
 @pytest.mark.asyncio
-@pytest.mark.asyncio_time_limit(time_limit=2)
+@pytest.mark.usefixtures("virtual_clock")
 class TestBasic:
     """Very basic dependencies. (star graph)"""
 
@@ -97,6 +104,15 @@ class TestBasic:
         goto.assert_called_with(edges[n])
         goto.assert_has_calls([call(edges[i]) for i in range(n + 1)], any_order=True)
 
+    async def test_deep_chain(self) -> None:
+        """deeper than the recursion limit"""
+        n = 3000
+        edges, goto, s = self.__basic([(i, i + 1) for i in range(n)])
+        s.schedule(edges[n], 0)
+        while await s.next():
+            pass
+        goto.assert_has_calls([call(edges[i]) for i in range(n + 1)])
+
     async def test_tree(self) -> None:
         edges, goto, s = self.__basic([(0, 1), (1, 3), (2, 3)])
         s.schedule(edges[3], 0)
@@ -246,7 +262,7 @@ class TestMockRuntime:
 
 
 @pytest.mark.asyncio
-@pytest.mark.asyncio_time_limit(time_limit=2)
+@pytest.mark.usefixtures("virtual_clock")
 class TestOrdering:
     @pytest.mark.parametrize("n", (2, 4, 7, 15, 16, 99))
     @pytest.mark.parametrize("b", (2, 5))
@@ -322,3 +338,370 @@ class TestOrdering:
         await a.step(100)
         assert not await a.next(), "Should finish within 100 steps. (50 exec, 50 run)"
         a.goto.assert_any_call(a.edges[0])
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("virtual_clock")
+class TestDeadline:
+    """Earliest deadline first, shedding entries past their deadline."""
+
+    def setup(
+        self, deps: List[Tuple[int, int]], n: int
+    ) -> Tuple[List[Routine.Edge], AlwaysOk, Scheduler, List[float]]:
+        edges = [Routine.Edge(id=str(i)) for i in range(n)]
+        for i, (u, v) in enumerate(deps):
+            edges[v].dependencies.append(
+                Routine.Dependency(
+                    requirement=Routine.REQUIREMENT_TYPE_COMPLETION,
+                    type=Routine.DEPENDENCY_TYPE_EXPLICIT,
+                    requires=str(u),
+                    count=1,
+                    id=str(i),
+                )
+            )
+        r = Routine(nodes={"n": Routine.Node(id="n", edges=edges)})
+        ri = AlwaysOk(r)
+        ri.on_deadline_missed = Mock()  # type: ignore
+        clock = [0.0]
+        return edges, ri, Scheduler(ri, now=lambda: clock[0]), clock
+
+    async def test_edf(self) -> None:
+        edges, ri, s, _ = self.setup([], 3)
+        for i, deadline in enumerate((30, 10, 20)):
+            s.schedule(edges[i], deadline)
+        while await s.next():
+            pass
+        ri.goto.assert_has_calls([call(edges[1]), call(edges[2]), call(edges[0])])
+
+    async def test_shed(self) -> None:
+        edges, ri, s, clock = self.setup([], 2)
+        s.schedule(edges[0], 5)
+        s.schedule(edges[1], 50)
+        clock[0] = 10
+        while await s.next():
+            pass
+        ri.goto.assert_called_once_with(edges[1])
+        assert [x.edge for x in s.missed] == [edges[0]]
+        ri.on_deadline_missed.assert_called_once_with(edges[0])
+
+    async def test_shed_dependents(self) -> None:
+        edges, ri, s, clock = self.setup([(0, 1)], 2)
+        s.schedule(edges[1], 10)  # also schedules 0
+        clock[0] = 20
+        while await s.next():
+            pass
+        ri.goto.assert_not_called()
+        assert sorted(x.edge.id for x in s.missed) == ["0", "1"]
+
+    async def test_keep_live_dependents(self) -> None:
+        edges, ri, s, clock = self.setup([(0, 1)], 2)
+        s.schedule(edges[1], 10)  # also schedules 0
+        s.schedule(edges[0], 5, update=True)
+        (entry,) = [x for x in s.ready_queue if x.for_dependency]
+        entry.deadline = 0  # pretend 0 was scheduled long ago
+        clock[0] = 6
+        while await s.next():
+            pass
+        ri.goto.assert_has_calls([call(edges[0]), call(edges[1])])
+
+    async def test_dependency_deadline(self) -> None:
+        edges, ri, s, clock = self.setup([(0, 1)], 2)
+        s.schedule(edges[1], 10)
+        assert [x.deadline for x in s.ready_queue] == [10], "dependent's deadline"
+        clock[0] = 10.5
+        while await s.next():
+            pass
+        ri.goto.assert_not_called()  # no work for a dependent that gets shed
+
+
+class PassingInterface(ISchedulerRoutineInterface):
+    """taking `via` also takes `passes` on the way"""
+
+    def __init__(self, r: Routine, via: Routine.Edge, passes: Routine.Edge):
+        super().__init__(r)
+        self.via = via
+        self.passes = passes
+        self.order: List[str] = []
+
+    async def goto(self, e: Routine.Edge) -> ExecResult.ValueType:
+        if e.id == self.via.id and self.on_edge_taken:
+            self.order.append(self.passes.id)
+            self.on_edge_taken(self.passes, ExecResult.REQUIREMENT_TYPE_COMPLETION)
+        self.order.append(e.id)
+        return ExecResult.REQUIREMENT_TYPE_COMPLETION
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("virtual_clock")
+class TestDependencyTypes:
+    def setup(
+        self, type: Routine.DependencyType.ValueType, count: int = 1
+    ) -> Tuple[List[Routine.Edge], PassingInterface, Scheduler]:
+        """1 requires 0; taking 2 passes through 0"""
+        edges = [Routine.Edge(id=str(i)) for i in range(3)]
+        edges[1].dependencies.append(
+            Routine.Dependency(requires="0", count=count, type=type, id="d")
+        )
+        r = Routine(nodes={"n": Routine.Node(id="n", edges=edges)})
+        ri = PassingInterface(r, edges[2], edges[0])
+        return edges, ri, Scheduler(ri)
+
+    async def test_implicit(self) -> None:
+        edges, ri, s = self.setup(Routine.DEPENDENCY_TYPE_IMPLICIT)
+        s.schedule(edges[1], 10)
+        s.schedule(edges[2], 5)
+        while await s.next():
+            pass
+        assert ri.order == ["0", "2", "1"], "0 was met on the way to 2"
+        assert not s.ready_queue
+
+    async def test_explicit(self) -> None:
+        edges, ri, s = self.setup(Routine.DEPENDENCY_TYPE_EXPLICIT)
+        s.schedule(edges[1], 10)
+        s.schedule(edges[2], 5)
+        while await s.next():
+            pass
+        assert ri.order == ["0", "2", "0", "1"], "needs its own run of 0"
+
+    async def test_count(self) -> None:
+        edges, ri, s = self.setup(Routine.DEPENDENCY_TYPE_EXPLICIT, count=3)
+        s.schedule(edges[1], 10)
+        assert [x.edge.id for x in s.ready_queue] == ["0"] * 3, "1 isn't ready"
+        while await s.next():
+            pass
+        assert ri.order == ["0", "0", "0", "1"]
+
+
+class BatchInterface(ISchedulerRoutineInterface):
+    def __init__(self, r: Routine):
+        super().__init__(r)
+        self.visits: List[Tuple[str, int]] = []
+        self.fail_after = 100
+
+    async def goto(self, e: Routine.Edge) -> ExecResult.ValueType:
+        return (await self.goto_batch(e, 1))[0]
+
+    async def goto_batch(self, e: Routine.Edge, n: int) -> List[ExecResult.ValueType]:
+        self.visits.append((e.id, n))
+        ok = min(n, self.fail_after)
+        results = [ExecResult.REQUIREMENT_TYPE_COMPLETION] * ok
+        if ok < n:
+            results.append(ExecResult.REQUIREMENT_TYPE_ATTEMPT)
+        return results
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("virtual_clock")
+class TestBatch:
+    """Ready entries of the same edge run in one visit."""
+
+    def setup(self, count: int) -> Tuple[List[Routine.Edge], BatchInterface]:
+        """1 requires 0 `count` times"""
+        edges = [Routine.Edge(id=str(i)) for i in range(2)]
+        edges[1].dependencies.append(
+            Routine.Dependency(
+                requires="0", count=count, type=Routine.DEPENDENCY_TYPE_EXPLICIT
+            )
+        )
+        r = Routine(nodes={"n": Routine.Node(id="n", edges=edges)})
+        return edges, BatchInterface(r)
+
+    async def test_dependency_count(self) -> None:
+        edges, ri = self.setup(5)
+        s = Scheduler(ri)
+        s.schedule(edges[1], 10)
+        while await s.next():
+            pass
+        assert ri.visits == [("0", 5), ("1", 1)]
+
+    async def test_partial_failure(self) -> None:
+        edges, ri = self.setup(5)
+        ri.fail_after = 2
+        s = Scheduler(ri)
+        s.schedule(edges[1], 10, retry=RetryPolicy(attempts=3))
+        assert await s.next()
+        assert ri.visits == [("0", 5)]
+        assert len(s.ready_queue) == 3, "failed one and the 2 not attempted"
+        ri.fail_after = 100
+        while await s.next():
+            pass
+        assert ri.visits == [("0", 5), ("0", 3), ("1", 1)]
+
+    async def test_shed(self) -> None:
+        edges, ri = self.setup(1)
+        s = Scheduler(ri, now=lambda: 5)
+        for deadline in (10, 1, 10):
+            s.schedule(edges[0], deadline)
+        while await s.next():
+            pass
+        assert ri.visits == [("0", 2)]
+        assert len(s.missed) == 1
+
+
+class LineInterface(ISchedulerRoutineInterface):
+    """edges are at positions on a line (id), distance is how far away"""
+
+    def __init__(self, r: Routine, position: int):
+        super().__init__(r)
+        self.position = position
+        self.order: List[int] = []
+
+    def distance(self, e: Routine.Edge) -> float:
+        return abs(int(e.id) - self.position)
+
+    async def goto(self, e: Routine.Edge) -> ExecResult.ValueType:
+        self.position = int(e.id)
+        self.order.append(self.position)
+        return ExecResult.REQUIREMENT_TYPE_COMPLETION
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("virtual_clock")
+class TestLocality:
+    def setup(
+        self, positions: List[int], start: int, locality: float
+    ) -> Tuple[dict[int, Routine.Edge], LineInterface, Scheduler]:
+        edges = {i: Routine.Edge(id=str(i)) for i in positions}
+        r = Routine(nodes={"n": Routine.Node(id="n", edges=list(edges.values()))})
+        ri = LineInterface(r, start)
+        return edges, ri, Scheduler(ri, locality=locality)
+
+    async def test_nearest_first(self) -> None:
+        positions = [20, 0, 11, 3, 10, 4]
+        edges, ri, s = self.setup(positions, 9, 60)
+        for i in positions:
+            s.schedule(edges[i], 0)
+        while await s.next():
+            pass
+        assert ri.order == [10, 11, 4, 3, 0, 20]
+
+    async def test_deadline_window(self) -> None:
+        edges, ri, s = self.setup([0, 1, 50], 0, 60)
+        s.schedule(edges[0], 30)
+        s.schedule(edges[1], 30)
+        s.schedule(edges[50], 10)  # earliest, others within window
+        while await s.next():
+            pass
+        assert ri.order == [0, 1, 50]
+
+        edges, ri, s = self.setup([0, 1, 50], 0, 60)
+        s.schedule(edges[0], 100)
+        s.schedule(edges[1], 100)
+        s.schedule(edges[50], 0)  # others are outside the window
+        while await s.next():
+            pass
+        assert ri.order == [50, 1, 0]
+
+    async def test_no_deadline(self) -> None:
+        n = 10 * LOCALITY_WINDOW
+        edges, ri, s = self.setup(list(range(n)), n, 60)
+        calls = 0
+        distance = ri.distance
+
+        def counted(e: Routine.Edge) -> float:
+            nonlocal calls
+            calls += 1
+            return distance(e)
+
+        ri.distance = counted  # type: ignore
+        for i in range(n):
+            s.schedule(edges[i], math.inf)
+        assert await s.next()
+        assert calls == LOCALITY_WINDOW, "window capped when deadlines are inf"
+        while await s.next():
+            pass
+        assert sorted(ri.order) == list(range(n))
+
+
+def test_ready_queue() -> None:
+    seed(1)
+    edges = [Routine.Edge(id=str(i)) for i in range(3)]
+    for _ in range(200):
+        q = ReadyQueue()
+        entries = [SchedulerEntry(edges[i % 3], randint(0, 20)) for i in range(30)]
+        for x in entries:
+            q.push(x)
+        x = entries[randint(0, len(entries) - 1)]
+        q.remove(x)
+        assert x not in q and len(q) == 29
+        assert len(q.of_edge(x.edge.id)) == 9
+        for j in range(1, len(q)):
+            assert not q[j] < q[(j - 1) // 2]
+        for j, y in enumerate(q):
+            assert q.pos[y] == j
+        order = [q.pop() for _ in range(len(q))]
+        assert order == sorted(order) and not q.edges
+
+
+@pytest.mark.asyncio
+@pytest.mark.usefixtures("virtual_clock")
+class TestRetry:
+    """Failed entries wait out their retry interval, then give up."""
+
+    def setup(
+        self, deps: List[Tuple[int, int]], n: int, failing: int
+    ) -> Tuple[List[Routine.Edge], AlwaysOk, Scheduler, List[Tuple[float, str]]]:
+        edges = [Routine.Edge(id=str(i)) for i in range(n)]
+        for i, (u, v) in enumerate(deps):
+            edges[v].dependencies.append(
+                Routine.Dependency(
+                    requirement=Routine.REQUIREMENT_TYPE_COMPLETION,
+                    type=Routine.DEPENDENCY_TYPE_EXPLICIT,
+                    requires=str(u),
+                    count=1,
+                    id=str(i),
+                )
+            )
+        r = Routine(nodes={"n": Routine.Node(id="n", edges=edges)})
+        ri = AlwaysOk(r)
+        ri.on_deadline_missed = Mock()  # type: ignore
+        clock = [0.0]
+        runs: List[Tuple[float, str]] = []
+
+        async def goto(e: Routine.Edge) -> ExecResult.ValueType:
+            runs.append((clock[0], e.id))
+            if int(e.id) == failing:
+                return ExecResult.REQUIREMENT_TYPE_ATTEMPT
+            return ExecResult.REQUIREMENT_TYPE_COMPLETION
+
+        async def sleep(dt: float) -> None:
+            clock[0] += dt
+
+        ri.goto = AsyncMock(side_effect=goto)
+        s = Scheduler(ri, now=lambda: clock[0], sleep=sleep)
+        return edges, ri, s, runs
+
+    async def test_interval(self) -> None:
+        edges, ri, s, runs = self.setup([], 2, failing=0)
+        retry = RetryPolicy(interval=10, attempts=3, reschedule=100)
+        s.schedule(edges[0], 1000, retry=retry)
+        s.schedule(edges[1], 1000)
+        while await s.next():
+            pass
+        assert runs == [(0, "0"), (0, "1"), (10, "0"), (20, "0"), (120, "0")]
+        assert [x.edge for x in s.missed] == [edges[0]]
+        ri.on_deadline_missed.assert_called_once_with(edges[0])
+
+    async def test_no_retry(self) -> None:
+        edges, ri, s, runs = self.setup([], 1, failing=0)
+        s.schedule(edges[0], 1000)
+        while await s.next():
+            pass
+        assert runs == [(0, "0")], "default policy doesn't retry"
+        assert len(s.missed) == 1
+
+    async def test_deadline(self) -> None:
+        edges, ri, s, runs = self.setup([], 1, failing=0)
+        s.schedule(edges[0], 25, retry=RetryPolicy(interval=10, attempts=10))
+        while await s.next():
+            pass
+        assert runs == [(0, "0"), (10, "0"), (20, "0")], "next try is too late"
+
+    async def test_give_up_dependents(self) -> None:
+        edges, ri, s, runs = self.setup([(0, 1)], 2, failing=0)
+        s.schedule(edges[1], 1000, retry=RetryPolicy(interval=5, attempts=2))
+        while await s.next():
+            pass
+        assert runs == [(0, "0"), (5, "0")], "dependency inherits the policy"
+        assert sorted(x.edge.id for x in s.missed) == ["0", "1"]
+        assert not s.ready_queue and not s.retry_timers
@@ -0,0 +1,102 @@
+import time
+
+import pytest
+from acine.scheduler.simulator import Simulator, edge_durations
+from acine_proto_dist.routine_pb2 import Routine
+from acine_proto_dist.runtime_pb2 import Event, RuntimeData
+
+HOUR = 3600
+DAY = 86400
+
+
+def routine(name: str, window: str, period: int, deadline: int = 0) -> Routine:
+    """start -(a)-> n -(b)-> start, with `b` scheduled (which requires going to n)"""
+    a = Routine.Edge(
+        id=f"{name}-a", to="n", trigger=Routine.Edge.EDGE_TRIGGER_TYPE_STANDARD
+    )
+    b = Routine.Edge(
+        id=f"{name}-b",
+        to="start",
+        trigger=Routine.Edge.EDGE_TRIGGER_TYPE_STANDARD,
+        schedules=[Routine.Edge.ScheduleInstance(scheduling_group_id="sg")],
+    )
+    return Routine(
+        id=name,
+        name=name,
+        launch_config=Routine.LaunchConfiguration(window_name=window),
+        nodes={
+            "start": Routine.Node(id="start", edges=[a]),
+            "n": Routine.Node(id="n", edges=[b]),
+        },
+        sgroups={
+            "sg": Routine.SchedulingGroup(
+                id="sg", name="sg", period=period, deadline=deadline
+            )
+        },
+    )
+
+
+def durations(name: str, a: float, b: float) -> dict[str, dict[str, float]]:
+    return {name: {f"{name}-a": a, f"{name}-b": b}}
+
+
+@pytest.mark.asyncio
+class TestSimulator:
+    async def test_utilisation(self) -> None:
+        sim = Simulator([routine("r", "w", HOUR)], durations("r", 60, 120))
+        report = await sim.run(0, DAY)
+        assert len(report.runs) == 24
+        assert report.runs[1].start == HOUR
+        assert report.runs[0].end == 180, "navigates to n, then takes b"
+        assert report.utilisation == pytest.approx(180 / HOUR)
+        assert not report.misses
+        idle = report.idle_windows()
+        assert len(idle) == 24
+        assert idle[0] == (180, HOUR)
+        assert report.idle_windows(HOUR) == []
+
+    async def test_deadline(self) -> None:
+        sim = Simulator(
+            [routine("r", "w", HOUR, deadline=100)], durations("r", 60, 120)
+        )
+        report = await sim.run(0, DAY)
+        assert not report.misses, "started in time"
+        assert len(report.late) == 24, "but finished too late"
+
+        r = routine("r", "w", HOUR, deadline=50)
+        a = r.nodes["start"].edges[0]
+        a.schedules.append(Routine.Edge.ScheduleInstance(scheduling_group_id="sg"))
+        report = await Simulator([r], durations("r", 60, 120)).run(0, DAY)
+        assert [e.id for _, e in report.misses] == ["r-b"] * 24, "a is closer"
+
+    async def test_same_window(self) -> None:
+        routines = [routine("r", "w", HOUR), routine("s", "w", HOUR)]
+        sim = Simulator(routines, {**durations("r", 60, 120), **durations("s", 0, 60)})
+        report = await sim.run(0, HOUR)
+        (r, s) = sorted(report.runs, key=lambda x: x.start)
+        assert (r.start, r.end) == (0, 180)
+        assert (s.start, s.end) == (180, 240), "waits for the window"
+
+        routines = [routine("r", "w", HOUR), routine("s", "x", HOUR)]
+        report = await Simulator(routines, durations("r", 60, 120)).run(0, HOUR)
+        assert [x.start for x in report.runs] == [0, 0], "different windows overlap"
+
+    @pytest.mark.timeout(10)
+    async def test_fast(self) -> None:
+        routines = [routine(str(i), str(i), 600 * (i + 1)) for i in range(5)]
+        t = time.time()
+        report = await Simulator(routines).run(0, 90 * DAY)
+        assert len(report.runs) > 90 * 24
+        assert time.time() - t < 5
+
+
+def test_edge_durations() -> None:
+    data = RuntimeData()
+    for edge, start, end in (("a", 0, 2), ("a", 10, 14), ("b", 0, 1)):
+        event = Event()
+        event.action.id = edge
+        event.time_start.FromSeconds(start)
+        event.time_end.FromSeconds(end)
+        data.events.append(event)
+    data.events.append(Event())  # not an action
+    assert edge_durations(data) == {"a": 3, "b": 1}
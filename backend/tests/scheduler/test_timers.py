@@ -0,0 +1,64 @@
+from random import randint, seed
+
+import pytest
+from acine.scheduler.timers import TimerHeap
+
+
+def check(timers: TimerHeap[int], expect: dict[int, float]) -> None:
+    """compares against a plain dict (by value, ties in any order)"""
+    assert len(timers) == len(expect)
+    items = list(timers.ordered())
+    assert sorted(items) == sorted((t, k) for k, t in expect.items())
+    assert [t for t, _ in items] == sorted(expect.values())
+    for k, t in expect.items():
+        assert timers.get(k) == t
+    if expect:
+        top = timers.peek()
+        assert top and top[0] == min(expect.values())
+    else:
+        assert timers.peek() is None
+
+
+class TestTimerHeap:
+    def test_basic(self) -> None:
+        timers: TimerHeap[str] = TimerHeap()
+        timers.set("a", 3)
+        timers.set("b", 1)
+        timers.set("c", 2)
+        assert timers.peek() == (1, "b")
+        timers.set("b", 5)  # increase
+        assert list(timers.ordered()) == [(2, "c"), (3, "a"), (5, "b")]
+        timers.set("b", 0)  # decrease
+        assert timers.peek() == (0, "b")
+        timers.remove("b")
+        timers.remove("missing")
+        assert list(timers.ordered()) == [(2, "c"), (3, "a")]
+        assert "b" not in timers and "a" in timers
+
+    def test_ties_fifo(self) -> None:
+        timers: TimerHeap[str] = TimerHeap()
+        for k in "dcba":
+            timers.set(k, 1)
+        assert [k for _, k in timers.ordered()] == list("dcba")
+
+    def test_due(self) -> None:
+        timers: TimerHeap[int] = TimerHeap()
+        for i in range(10):
+            timers.set(i, 10 - i)
+        assert [k for _, k in timers.due(3)] == [9, 8, 7]
+        assert list(timers.due(0)) == []
+
+    @pytest.mark.parametrize("s", range(5))
+    def test_random(self, s: int) -> None:
+        seed(s)
+        timers: TimerHeap[int] = TimerHeap()
+        expect: dict[int, float] = {}
+        for _ in range(500):
+            k, t = randint(0, 40), randint(0, 100)
+            if randint(0, 3) == 0:
+                timers.remove(k)
+                expect.pop(k, None)
+            else:
+                timers.set(k, t)
+                expect[k] = t
+            check(timers, expect)
@@ -0,0 +1,38 @@
+import json
+from pathlib import Path
+from typing import Any
+
+from benchmarks.compare import compare, main, report
+
+
+def run(**medians: float) -> dict[str, Any]:
+    return {
+        "machine_info": {"node": "test"},
+        "benchmarks": [
+            {"fullname": k, "stats": {"median": v, "mean": v}}
+            for k, v in medians.items()
+        ],
+    }
+
+
+def test_compare() -> None:
+    changes = compare(run(a=1.0, b=1.0, c=1.0), run(a=1.1, b=1.5, d=1.0))
+    assert [(x.name, x.regressed(0.15)) for x in changes] == [
+        ("a", False),
+        ("b", True),
+        ("c", False),
+        ("d", False),
+    ]
+    text = report(changes, 0.15)
+    assert "+50.0%  REGRESSION" in text
+    assert "missing" in text and "new" in text
+
+
+def test_main(tmp_path: Path) -> None:
+    baseline, ok, slow = (tmp_path / f"{x}.json" for x in ("b", "ok", "slow"))
+    baseline.write_text(json.dumps(run(a=1e-3)))
+    ok.write_text(json.dumps(run(a=1.05e-3)))
+    slow.write_text(json.dumps(run(a=2e-3)))
+    assert main([str(baseline), str(ok)]) == 0
+    assert main([str(baseline), str(slow)]) == 1
+    assert main([str(baseline), str(slow), "--threshold", "1.5"]) == 0
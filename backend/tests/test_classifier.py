@@ -0,0 +1,110 @@
+import os
+import time
+
+import numpy as np
+import pytest
+from acine.classifier import (
+    CentroidBackend,
+    LinearBackend,
+    StateClassifier,
+    features,
+    nodes_in_state,
+)
+from acine.runtime.synthetic import SIZE, render
+from acine_proto_dist.routine_pb2 import Routine
+
+STATES = [f"s{i}" for i in range(8)]
+
+
+def noisy(state: str, rng: np.random.Generator, scale: int = 30) -> np.ndarray:
+    img = render(state).astype(np.int16)
+    img += rng.integers(-scale, scale + 1, img.shape, np.int16)
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+def samples(n: int = 3, seed: int = 0) -> dict[str, list[np.ndarray]]:
+    rng = np.random.default_rng(seed)
+    return {s: [noisy(s, rng) for _ in range(n)] for s in STATES}
+
+
+def test_features() -> None:
+    X = features([render("a"), render("b", (64, 48))])
+    assert X.shape == (2, 10 * 10 * 3) and X.dtype == np.float32
+    assert 0 <= X.min() and X.max() <= 1
+    assert len(features([])) == 0
+
+
+@pytest.mark.parametrize("backend", ["centroid", "linear"])
+def test_classify(backend: str) -> None:
+    c = StateClassifier(samples(), backend)
+    assert not c.trained, "trains on first use"
+    test = samples(seed=1)
+    imgs = [img for s in STATES for img in test[s]]
+    expected = [s for s in STATES for _ in test[s]]
+    assert c.classify_batch(imgs) == expected
+    assert c.classify(imgs[0]) == expected[0]
+    assert c.classify_batch([]) == []
+
+
+def test_backend_instance() -> None:
+    backend = LinearBackend(alpha=0.1)
+    c = StateClassifier(samples(), backend)
+    assert c.classify(render("s3")) == "s3"
+    assert c.backend is backend
+
+
+def test_reject() -> None:
+    c = StateClassifier(samples(), max_distance=0.01)
+    assert c.classify(render("s2")) == "s2"
+    assert c.classify(render("unknown")) is None
+    assert isinstance(c.backend, CentroidBackend)
+
+
+def test_lazy_loader() -> None:
+    calls = []
+
+    def load() -> dict[str, list[np.ndarray]]:
+        calls.append(1)
+        return samples(1)
+
+    c = StateClassifier(load)
+    assert calls == []
+    c.classify(render("s0"))
+    c.classify(render("s1"))
+    assert calls == [1]
+
+
+def test_for_routine() -> None:
+    r = Routine(id="r")
+    for s in STATES:
+        r.states[s].id = s
+        r.states[s].samples.extend([f"{s}-0", f"{s}-1"])
+    r.states["empty"].id = "empty"  # no samples, can't be predicted
+    r.nodes["n"].id = "n"
+    r.nodes["n"].state_id = "s5"
+
+    read: list[tuple[str, str]] = []
+
+    def read_frame(routine_id: str, frame_id: str) -> np.ndarray:
+        read.append((routine_id, frame_id))
+        return render(frame_id.split("-")[0])
+
+    c = StateClassifier.for_routine(r, read_frame, backend="linear")
+    assert read == []
+    state = c.classify(render("s5"))
+    assert state == "s5" and len(read) == 16
+    assert nodes_in_state(r, state) == ["n"]
+    assert nodes_in_state(r, None) == []
+
+
+@pytest.mark.skipif(bool(os.getenv("CI")), reason="timing")
+def test_fast() -> None:
+    c = StateClassifier(samples(4))
+    img = noisy("s0", np.random.default_rng(2))
+    c.classify(img)
+    n = 200
+    t = time.perf_counter()
+    for _ in range(n):
+        c.classify(img)
+    per_call = (time.perf_counter() - t) / n
+    assert per_call < 1e-3, f"{per_call * 1e6:.0f}us per frame ({SIZE})"
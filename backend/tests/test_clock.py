@@ -0,0 +1,99 @@
+import asyncio
+import time
+from typing import List
+
+import pytest
+from acine.clock import WALL_CLOCK, VirtualClock, get_clock, use_clock
+from acine.runtime.check import ActionResult, check
+from acine.runtime.runtime import IController, Routine, Runtime
+from acine.runtime.util import now, sleep
+from acine_proto_dist.input_event_pb2 import InputEvent, InputReplay
+from acine_proto_dist.position_pb2 import Point
+from pytest_mock import MockerFixture
+
+HOUR = 3600
+
+
+def test_default() -> None:
+    assert get_clock() is WALL_CLOCK
+    clock = VirtualClock(5)
+    with use_clock(clock):
+        assert get_clock() is clock
+        assert now() == 5000, "util.now reads the installed clock (ms)"
+    assert get_clock() is WALL_CLOCK
+
+
+@pytest.mark.asyncio
+@pytest.mark.asyncio_time_limit(time_limit=2)
+class TestVirtualClock:
+    async def test_order(self, virtual_clock: VirtualClock) -> None:
+        woke: List[tuple[str, float]] = []
+
+        async def task(name: str, dt: float) -> None:
+            await virtual_clock.sleep(dt)
+            woke.append((name, virtual_clock.time()))
+
+        t0 = time.perf_counter()
+        await asyncio.gather(task("a", 2 * HOUR), task("b", HOUR), task("c", HOUR))
+        assert time.perf_counter() - t0 < 1
+        assert woke == [("b", HOUR), ("c", HOUR), ("a", 2 * HOUR)]
+
+    async def test_waits_for_runnable(self, virtual_clock: VirtualClock) -> None:
+        """time doesn't move while something can still run"""
+        q: asyncio.Queue[float] = asyncio.Queue()
+
+        async def producer() -> None:
+            for _ in range(3):
+                await q.put(virtual_clock.time())
+
+        async def sleeper() -> float:
+            await virtual_clock.sleep(10)
+            return virtual_clock.time()
+
+        task = asyncio.create_task(sleeper())
+        await producer()
+        assert [q.get_nowait() for _ in range(3)] == [0, 0, 0]
+        assert await task == 10
+
+    async def test_cancel(self, virtual_clock: VirtualClock) -> None:
+        task = asyncio.create_task(virtual_clock.sleep(HOUR))
+        await asyncio.sleep(0)
+        task.cancel()
+        await virtual_clock.sleep(1)
+        await asyncio.sleep(0)
+        assert virtual_clock.time() == 1, "cancelled sleep doesn't hold a wake-up"
+
+    async def test_advance(self, virtual_clock: VirtualClock) -> None:
+        virtual_clock.settle = 10**9  # so only advance() moves time
+        task = asyncio.create_task(sleep(1000))
+        await asyncio.sleep(0)
+        virtual_clock.advance(1)
+        await task
+        assert now() == 1000
+
+    async def test_check_timeout(
+        self, mocker: MockerFixture, virtual_clock: VirtualClock
+    ) -> None:
+        mocker.patch("acine.runtime.check.check_once", return_value=False)
+        get_img = mocker.AsyncMock()
+        res, _ = await check(Routine.Condition(interval=100), get_img)
+        assert res == ActionResult.RESULT_TIMEOUT
+        assert virtual_clock.time() == pytest.approx(30, abs=0.2), "default timeout"
+        assert get_img.call_count == pytest.approx(300, abs=2)
+
+    async def test_replay(
+        self, mocker: MockerFixture, virtual_clock: VirtualClock
+    ) -> None:
+        controller = IController()
+        mocker.patch.object(controller, "mouse_move")
+        replay = InputReplay(
+            events=[
+                InputEvent(timestamp=t * 1000 * HOUR, move=Point(x=t, y=t))
+                for t in range(24)
+            ]
+        )
+        routine = Routine(nodes={"start": Routine.Node(id="start")})
+        with Runtime(routine, controller) as rt:
+            await rt.run_replay(replay)
+        assert controller.mouse_move.call_count == 24
+        assert virtual_clock.time() == 23 * HOUR
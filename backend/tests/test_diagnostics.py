@@ -0,0 +1,48 @@
+import io
+import logging
+
+from acine.diagnostics import TICK, RateLimitFilter, configure, quiet, stop
+
+
+def record(msg: str, tick: bool = True) -> logging.LogRecord:
+    r = logging.LogRecord("acine.test", logging.DEBUG, "", 0, msg, None, None)
+    if tick:
+        r.tick = True
+    return r
+
+
+class TestRateLimitFilter:
+    def test_limit(self) -> None:
+        t = [0.0]
+        f = RateLimitFilter(interval=1, burst=2, now=lambda: t[0])
+        assert [f.filter(record("poll %d")) for _ in range(5)] == [1, 1, 0, 0, 0]
+        assert f.filter(record("other"))
+        assert all(f.filter(record("poll %d", tick=False)) for _ in range(5))
+
+        t[0] = 1
+        r = record("poll %d")
+        assert f.filter(r)
+        assert r.msg == "poll %d (+3 suppressed)"
+
+
+def test_configure() -> None:
+    stream = io.StringIO()
+    configure("INFO", stream)
+    try:
+        log = logging.getLogger("acine.test")
+        log.debug("hidden")
+        for i in range(3):
+            log.info("tick %d", i, extra=TICK)
+        log.warning("shown %s", "x")
+        with quiet():
+            log.warning("quiet")
+    finally:
+        stop()
+        logger = logging.getLogger("acine")
+        logger.handlers.clear()
+        logger.propagate = True
+        logger.setLevel(logging.NOTSET)
+    out = stream.getvalue()
+    assert "hidden" not in out and "quiet" not in out
+    assert out.count("tick") == 1, "rate-limited"
+    assert "W acine.test: shown x" in out
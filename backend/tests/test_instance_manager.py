@@ -0,0 +1,83 @@
+import os
+import shutil
+from typing import Generator
+from uuid import uuid4
+
+import pytest
+from acine.instance_manager import (
+    create_routine,
+    get_last_runs,
+    get_routine,
+    get_routines,
+    read_routine_metadata,
+    write_routine,
+    write_runtime_data,
+)
+from acine.logging import mark_last_run
+from acine.persist import fs_read_sync, resolve
+from acine_proto_dist.routine_pb2 import Routine
+from acine_proto_dist.runtime_pb2 import Event, RuntimeData
+
+
+@pytest.fixture
+def routine() -> Generator[Routine, None, None]:
+    id = str(uuid4())
+    r = create_routine(
+        Routine(
+            name="Test Routine (instance_manager)",
+            launch_config=Routine.LaunchConfiguration(window_name="TestEnv"),
+        ),
+        id,
+    )
+    yield r
+    shutil.rmtree(resolve(id), ignore_errors=True)
+
+
+class TestMetadataIndex:
+    def test_create(self, routine: Routine) -> None:
+        assert os.path.exists(resolve(routine.id, "meta.pb"))
+        metadata = read_routine_metadata(routine.id)
+        assert metadata.name == routine.name
+        assert not metadata.nodes, "metadata should not contain the full routine"
+
+    def test_listed(self, routine: Routine) -> None:
+        (metadata,) = [r for r in get_routines() if r.id == routine.id]
+        assert metadata.launch_config == routine.launch_config
+        assert not metadata.nodes
+        (full,) = [r for r in get_routines(full=True) if r.id == routine.id]
+        assert full == get_routine(routine)
+
+    def test_updated_on_save(self, routine: Routine) -> None:
+        routine.name = "Renamed"
+        routine.sgroups["sg"].CopyFrom(Routine.SchedulingGroup(id="sg", period=60))
+        write_routine(routine)
+        metadata = read_routine_metadata(routine.id)
+        assert metadata.name == "Renamed"
+        assert metadata.sgroups["sg"].period == 60
+
+    def test_rebuild_missing(self, routine: Routine) -> None:
+        os.remove(resolve(routine.id, "meta.pb"))
+        assert read_routine_metadata(routine.id).name == routine.name
+        assert os.path.exists(resolve(routine.id, "meta.pb"))
+
+
+class TestLastRuns:
+    def test_schedule_state(self, routine: Routine) -> None:
+        assert get_last_runs(routine) == {}
+        data = RuntimeData(id=routine.id, events=[Event(node_id="n")])
+        mark_last_run(data.sgroups["sg"], 1234.5)
+        data.sgroups["other"].stats.total = 1  # never ran
+        write_runtime_data(routine, data)
+        assert get_last_runs(routine) == {"sg": 1234.5}
+
+        state = RuntimeData.FromString(fs_read_sync([routine.id, "schedule.pb"]))
+        assert not state.events, "only what scheduling needs"
+        assert list(state.sgroups) == ["sg"]
+
+    def test_rebuild_missing(self, routine: Routine) -> None:
+        data = RuntimeData(id=routine.id)
+        mark_last_run(data.sgroups["sg"], 60)
+        write_runtime_data(routine, data)
+        os.remove(resolve(routine.id, "schedule.pb"))
+        assert get_last_runs(routine) == {"sg": 60}
+        assert os.path.exists(resolve(routine.id, "schedule.pb"))
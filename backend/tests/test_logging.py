@@ -0,0 +1,95 @@
+from unittest.mock import Mock
+
+import pytest
+from acine.logging import (
+    NavigationLogger,
+    get_recent_runtime_events,
+    get_runtime_events,
+    load_condition_records,
+    save_condition_records,
+    summarize_runtime_data,
+)
+from acine_proto_dist.packet_pb2 import RuntimeEvents
+from acine_proto_dist.routine_pb2 import Routine
+from acine_proto_dist.runtime_pb2 import Event, RuntimeData, RuntimeState
+
+
+def runtime_data(n: int) -> RuntimeData:
+    """runtime data with n events, each event is labeled with its index"""
+    data = RuntimeData(id="test")
+    data.edges.get_or_create("e0").stats.total = 3
+    for i in range(n):
+        data.events.append(Event(node_id=str(i)))
+    return data
+
+
+def labels(page: RuntimeEvents) -> list[int]:
+    return [int(e.node_id) for e in page.events]
+
+
+class TestRuntimeEvents:
+    def test_summarize(self) -> None:
+        data = runtime_data(10)
+        summary = summarize_runtime_data(data)
+        assert not summary.events
+        assert summary.id == "test"
+        assert summary.edges["e0"].stats.total == 3
+        assert len(data.events) == 10, "original should be unchanged"
+
+    @pytest.mark.parametrize(
+        "offset,count,expect",
+        (
+            (0, 3, [0, 1, 2]),
+            (8, 5, [8, 9]),
+            (-2, 4, [0, 1]),
+            (10, 4, []),
+            (20, 4, []),
+            (3, 0, []),
+        ),
+    )
+    def test_page(self, offset: int, count: int, expect: list[int]) -> None:
+        page = get_runtime_events(runtime_data(10), offset, count)
+        assert labels(page) == expect
+        assert page.total == 10
+        if expect:
+            assert page.offset == expect[0]
+
+    @pytest.mark.parametrize("n,count", ((0, 5), (3, 5), (10, 5), (100, 1)))
+    def test_recent(self, n: int, count: int) -> None:
+        page = get_recent_runtime_events(runtime_data(n), count)
+        assert labels(page) == list(range(max(0, n - count), n))
+        assert page.offset == max(0, n - count)
+
+
+class TestNavigationLogger:
+    def test_on_exit(self) -> None:
+        data = runtime_data(2)
+        on_exit = Mock()
+        with NavigationLogger(data, RuntimeState(), comment="c", on_exit=on_exit):
+            on_exit.assert_not_called()
+        on_exit.assert_called_once_with(data.events[-1])
+        assert data.events[-1].debug.comment == "c"
+
+
+def test_condition_records() -> None:
+    def routine() -> Routine:
+        edge = Routine.Edge(id="e")
+        return Routine(nodes={"n": Routine.Node(id="n", edges=[edge])})
+
+    r = routine()
+    r.nodes["n"].default_condition.records.extend([1, 2])
+    r.nodes["n"].edges[0].postcondition.records.append(3)
+    data = RuntimeData.FromString(
+        save_condition_records(r, RuntimeData()).SerializeToString()
+    )
+
+    restored = routine()  # f.e. saved by the editor, without records
+    restored.nodes["n"].edges[0].precondition.records.append(9)
+    load_condition_records(restored, data)
+    assert list(restored.nodes["n"].default_condition.records) == [1, 2]
+    assert list(restored.nodes["n"].edges[0].postcondition.records) == [3]
+    assert list(restored.nodes["n"].edges[0].precondition.records) == [9], "kept"
+
+    r.nodes["n"].default_condition.records.append(4)
+    save_condition_records(r, data)
+    assert list(data.conditions["node/n"].records) == [1, 2, 4], "replaced"
@@ -0,0 +1,89 @@
+import asyncio
+import json
+import time
+
+import pytest
+from acine.metrics import NOOP_SPAN, Metrics, serve
+
+
+def test_disabled() -> None:
+    m = Metrics()
+    assert m.span("x") is NOOP_SPAN
+    with m.span("x"):
+        m.count("y")
+        m.observe("z", 1)
+    assert not m.counters and not m.histograms
+
+
+def test_counters() -> None:
+    m = Metrics(enabled=True)
+    m.count("runs", edge="a")
+    m.count("runs", 2, edge="a")
+    m.count("runs", edge="b")
+    assert m.counters[("runs_total", (("edge", "a"),))] == 3
+    assert m.counters[("runs_total", (("edge", "b"),))] == 1
+
+
+def test_histogram() -> None:
+    m = Metrics(enabled=True)
+    for v in (0.0005, 0.003, 0.003, 100):
+        m.observe("check_seconds", v, edge="a")
+    (h,) = m.histograms.values()
+    assert (h.count, h.sum) == (4, pytest.approx(100.0065))
+    cumulative = dict(zip(h.buckets, h.cumulative()))
+    assert cumulative[0.001] == 1
+    assert cumulative[0.005] == 3
+    assert cumulative[30] == 3
+    assert h.cumulative()[-1] == 4, "+Inf has everything"
+
+
+def test_span() -> None:
+    m = Metrics(enabled=True)
+    with m.span("edge", edge="a"):
+        time.sleep(0.002)
+    s = m.start("route")
+    s.stop()
+    h = m.histograms[("edge_seconds", (("edge", "a"),))]
+    assert h.count == 1 and h.sum >= 0.002
+    assert ("route_seconds", ()) in m.histograms
+
+
+def test_export() -> None:
+    m = Metrics(enabled=True)
+    m.count("frames")
+    m.observe("check_seconds", 0.002, edge='say "hi"')
+    text = m.to_prometheus()
+    assert "# TYPE acine_frames_total counter\nacine_frames_total 1\n" in text
+    assert 'acine_check_seconds_bucket{edge="say \\"hi\\"",le="0.0025"} 1' in text
+    assert 'acine_check_seconds_bucket{edge="say \\"hi\\"",le="+Inf"} 1' in text
+    assert 'acine_check_seconds_count{edge="say \\"hi\\""} 1' in text
+
+    data = json.loads(json.dumps(m.to_json()))
+    assert data["counters"] == [{"name": "frames_total", "labels": {}, "value": 1}]
+    (h,) = data["histograms"]
+    assert h["count"] == 1 and h["buckets"]["+Inf"] == 1
+
+
+@pytest.mark.asyncio
+async def test_serve() -> None:
+    m = Metrics(enabled=True)
+    m.count("frames")
+    server = await serve("127.0.0.1", 0, m)
+    port = server.sockets[0].getsockname()[1]
+
+    async def get(path: str) -> str:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: x\r\n\r\n".encode())
+        await writer.drain()
+        response = (await reader.read()).decode()
+        writer.close()
+        return response
+
+    try:
+        assert "acine_frames_total 1" in await get("/metrics")
+        response = await get("/metrics.json")
+        assert json.loads(response.split("\r\n\r\n", 1)[1])["counters"]
+        assert (await get("/")).startswith("HTTP/1.1 404")
+    finally:
+        server.close()
+        await server.wait_closed()
@@ -1,10 +1,11 @@
 import os
 import random
 import shutil
+import threading
 from typing import Awaitable, Callable, Generator, List
 
 import pytest
-from acine.persist import PrefixedFilesystem, mkdir, resolve
+from acine.persist import PrefixedFilesystem, mkdir, resolve, run_io
 
 
 @pytest.fixture
@@ -49,6 +50,32 @@ async def test_prefixed_filesystem_archive_rw(pfs: PrefixedFilesystem) -> None:
     assert await pfs.read_archive(["f1"]) == content
 
 
+@pytest.mark.asyncio
+async def test_prefixed_filesystem_archive_read_many(pfs: PrefixedFilesystem) -> None:
+    expect = {f"f{i}": random.randbytes(64) for i in range(5)}
+    for k, content in expect.items():
+        await pfs.write_archive([k], content)
+    assert await pfs.read_archive_many(["f1", "f3"]) == {
+        "f1": expect["f1"],
+        "f3": expect["f3"],
+    }
+
+
+@pytest.mark.asyncio
+async def test_prefixed_filesystem_read_many(pfs: PrefixedFilesystem) -> None:
+    expect = [random.randbytes(64) for _ in range(50)]
+    for i, content in enumerate(expect):
+        await pfs.write([f"f{i}"], content)
+    files = [[f"f{i}"] for i in range(len(expect))]
+    assert await pfs.read_many(files) == expect, "should keep order"
+
+
+@pytest.mark.asyncio
+async def test_run_io_off_loop() -> None:
+    loop_thread = threading.get_ident()
+    assert await run_io(threading.get_ident) != loop_thread
+
+
 class TestBenchmark:
     @staticmethod
     @pytest.mark.asyncio
@@ -0,0 +1,228 @@
+import asyncio
+import shutil
+from typing import AsyncIterator, Generator, List, Tuple
+
+import cv2
+import numpy as np
+import pytest
+import pytest_asyncio
+from acine.persist import mkdir, resolve
+from acine.runtime.check_image import ImageBmpType, SimilarityResult, check_similarity
+from acine.sampling import (
+    SamplingPool,
+    SharedFrameStore,
+    _attach,
+    _attached,
+    _sync,
+    batch_by_time,
+    condition_fingerprint,
+    frame_digest,
+)
+from acine_proto_dist.position_pb2 import Rect
+from acine_proto_dist.routine_pb2 import Routine
+from pytest_mock import MockerFixture
+
+ROUTINE_ID = "test-sampling"
+
+
+def random_frame(seed: int) -> ImageBmpType:
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 255, size=(60, 80, 3), dtype=np.uint8)  # type: ignore
+
+
+@pytest.fixture
+def frames() -> Generator[dict[str, ImageBmpType], None, None]:
+    """frames f0..f19 saved under the test routine, f0 is the reference"""
+    mkdir([ROUTINE_ID, "img"])
+    out = {f"f{i}": random_frame(i) for i in range(20)}
+    for id, img in out.items():
+        cv2.imwrite(resolve(ROUTINE_ID, "img", f"{id}.png"), img)
+    yield out
+    shutil.rmtree(resolve(ROUTINE_ID), ignore_errors=True)
+
+
+@pytest_asyncio.fixture
+async def pool() -> AsyncIterator[SamplingPool]:
+    pool = SamplingPool(workers=2)
+    yield pool
+    pool.close()
+
+
+def condition(threshold: float = 0.0) -> Routine.Condition.Image:
+    return Routine.Condition.Image(
+        frame_id="f0",
+        threshold=threshold,
+        match_limit=1,
+        regions=[Rect(left=10, right=29, top=10, bottom=29)],
+        allow_regions=[Rect(left=0, right=79, top=0, bottom=59)],
+    )
+
+
+async def sample(
+    pool: SamplingPool,
+    frame_ids: List[str],
+    threshold: float = 0.0,
+    **kwargs: int,
+) -> dict[str, List[SimilarityResult]]:
+    results: List[Tuple[str, List[SimilarityResult]]] = []
+    c = condition(threshold)
+    async for result in pool.sample(ROUTINE_ID, c, frame_ids, **kwargs):
+        results.append(result)
+    assert len(results) == len(set(id for id, _ in results)), "no duplicates"
+    return dict(results)
+
+
+class TestSharedFrameStore:
+    def test_roundtrip(self) -> None:
+        store = SharedFrameStore()
+        try:
+            img = random_frame(0)
+            frame = store.put(("r", "f"), img)
+            assert ("r", "f") in store
+            assert np.array_equal(_attach(frame), img)
+            store.discard(("r", "f"))
+            assert ("r", "f") not in store
+        finally:
+            store.close()
+
+    def test_sync(self) -> None:
+        store = SharedFrameStore()
+        try:
+            _sync(store.generation)
+            a = store.put(("r", "a"), random_frame(0))
+            b = store.put(("r", "b"), random_frame(1))
+            _attach(a), _attach(b)
+            _sync(store.generation)
+            assert a.name in _attached, "nothing freed, kept"
+            store.discard(("r", "a"))
+            _sync(store.generation)
+            assert not _attached, "stale mappings dropped"
+            assert np.array_equal(_attach(b), random_frame(1))
+        finally:
+            store.close()
+
+    def test_evicts_least_recently_used(self) -> None:
+        store = SharedFrameStore()
+        try:
+            store.put(("r", "a"), random_frame(0))
+            store.max_bytes = 2 * store.nbytes  # room for two frames
+            store.put(("r", "b"), random_frame(1))
+            store.get(("r", "a"))
+            store.put(("r", "c"), random_frame(2))
+            assert ("r", "b") not in store, "least recently used is freed"
+            assert ("r", "a") in store and ("r", "c") in store
+            assert store.nbytes <= store.max_bytes
+        finally:
+            store.close()
+
+    def test_pinned_not_evicted(self) -> None:
+        store = SharedFrameStore()
+        try:
+            store.put(("r", "a"), random_frame(0))
+            store.max_bytes = store.nbytes  # room for one frame
+            with store.pinned([("r", "a"), ("r", "b")]):
+                store.put(("r", "b"), random_frame(1))
+                assert len(store) == 2, "both in use, over the limit for now"
+            assert len(store) == 1, "back under the limit once released"
+        finally:
+            store.close()
+
+
+@pytest.mark.asyncio
+class TestSamplingPool:
+    @pytest.mark.parametrize("chunksize", (1, 3, 100))
+    async def test_matches_direct(
+        self,
+        frames: dict[str, ImageBmpType],
+        pool: SamplingPool,
+        chunksize: int,
+    ) -> None:
+        results = await sample(pool, list(frames.keys()), chunksize=chunksize)
+        assert set(results.keys()) == set(frames.keys())
+        for id, img in frames.items():
+            expect = check_similarity(condition(), img, frames["f0"], return_one=True)
+            assert results[id] == expect
+        assert results["f0"][0].score == pytest.approx(1.0)
+        assert results["f0"][0].position == (10, 10)
+
+    async def test_reuse(
+        self, frames: dict[str, ImageBmpType], pool: SamplingPool
+    ) -> None:
+        await sample(pool, ["f1", "f2"])
+        assert len(pool.store) == 3, "reference and both frames are loaded"
+        await sample(pool, ["f1", "f2", "f3"])
+        assert len(pool.store) == 4, "only the new frame is loaded"
+
+    async def test_discard(
+        self, frames: dict[str, ImageBmpType], pool: SamplingPool
+    ) -> None:
+        await sample(pool, ["f1"])
+        cv2.imwrite(resolve(ROUTINE_ID, "img", "f1.png"), frames["f0"])
+        pool.discard(ROUTINE_ID, "f1")
+        results = await sample(pool, ["f1"])
+        assert results["f1"][0].score == pytest.approx(1.0), "reloaded from disk"
+
+    async def test_missing_frame(
+        self, frames: dict[str, ImageBmpType], pool: SamplingPool
+    ) -> None:
+        results = await sample(pool, ["f1", "MISSING"])
+        assert set(results.keys()) == {"f1"}
+
+    async def test_cached(
+        self, frames: dict[str, ImageBmpType], pool: SamplingPool, mocker: MockerFixture
+    ) -> None:
+        expect = await sample(pool, list(frames))
+        assert len(pool.cache) == len(frames)
+        mocker.patch.object(pool, "get_executor", side_effect=AssertionError)
+        assert await sample(pool, list(frames)) == expect
+
+        # threshold only filters cached results
+        results = await sample(pool, list(frames), threshold=0.99)
+        assert [id for id, r in results.items() if r] == ["f0"]
+
+    async def test_cache_key(self) -> None:
+        c = condition()
+        assert condition_fingerprint(c, b"a") != condition_fingerprint(c, b"b")
+        d = condition(0.5)
+        assert condition_fingerprint(c, b"a") == condition_fingerprint(d, b"a")
+        d.regions[0].left = 11
+        assert condition_fingerprint(c, b"a") != condition_fingerprint(d, b"a")
+        f1, f2 = random_frame(1), random_frame(2)
+        assert frame_digest(f1) != frame_digest(f2)
+        assert frame_digest(f1) == frame_digest(f1.copy())
+
+    async def test_missing_reference(self, pool: SamplingPool) -> None:
+        with pytest.raises(FileNotFoundError):
+            await sample(pool, ["f1"])
+
+
+async def delayed(items: List[int], delay: float) -> AsyncIterator[int]:
+    for item in items:
+        await asyncio.sleep(delay)
+        yield item
+
+
+@pytest.mark.asyncio
+class TestBatchByTime:
+    async def test_flushes_all(self) -> None:
+        batches = [b async for b in batch_by_time(delayed(list(range(10)), 0), 60)]
+        assert batches == [list(range(10))], "single flush at the end"
+
+    async def test_flushes_periodically(self) -> None:
+        items = list(range(6))
+        batches = [b async for b in batch_by_time(delayed(items, 0.02), 0.03)]
+        assert len(batches) > 1
+        assert sum(batches, []) == items
+
+    async def test_empty(self) -> None:
+        assert [b async for b in batch_by_time(delayed([], 0))] == []
+
+    async def test_stream_cancel(
+        self, frames: dict[str, ImageBmpType], pool: SamplingPool
+    ) -> None:
+        results = pool.sample(ROUTINE_ID, condition(), list(frames), chunksize=1)
+        async for batch in batch_by_time(results, 0):
+            assert batch
+            break
+        await results.aclose()
+        assert len(await sample(pool, list(frames))) == len(frames), "still usable"
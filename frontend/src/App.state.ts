@@ -13,6 +13,7 @@ import {
   $backendConfiguration,
   $loadedRoutine,
   $logs,
+  $logsOffset,
 } from './state';
 
 /** callbacks for specific id's */
@@ -139,6 +140,27 @@ ws.onmessage = async (data: MessageEvent<Blob>) => {
     case 'runtime': {
       console.log('runtime logs', packet.type.runtime);
       $logs.set(packet.type.runtime);
+      $logsOffset.set(0);
+      break;
+    }
+    case 'runtimeEvents': {
+      const { offset, events } = packet.type.runtimeEvents;
+      const logs = $logs.get();
+      const start = $logsOffset.get();
+      if (!logs.events.length) {
+        // initial window (sent right after the summary)
+        $logsOffset.set(offset);
+        $logs.set({ ...logs, events });
+      } else if (offset + events.length === start) {
+        // older page (requested)
+        $logsOffset.set(offset);
+        $logs.set({ ...logs, events: [...events, ...logs.events] });
+      } else if (offset === start + logs.events.length) {
+        // new event
+        $logs.set({ ...logs, events: [...logs.events, ...events] });
+      } else {
+        console.warn('discontinuous runtime events', packet);
+      }
       break;
     }
     default:
@@ -156,6 +178,23 @@ export function getArchiveUrl(imageId: string) {
   return `${httpUrl}/data/${$routine.get().id}/archive/${imageId}`;
 }
 
+/**
+ * Request the page of runtime events right before the ones already loaded.
+ * @param count page size (server caps this)
+ */
+export function loadOlderLogs(count: number = 100) {
+  const offset = $logsOffset.get();
+  if (offset <= 0) return;
+  count = Math.min(count, offset);
+  const packet = pb.Packet.create({
+    type: {
+      $case: 'runtimeEvents',
+      runtimeEvents: { offset: offset - count, count },
+    },
+  });
+  ws.send(pb.Packet.encode(packet).finish());
+}
+
 /**
  * - (if `!id`) request the current frame
  * - (if `id`) request a specific frame
@@ -288,6 +327,67 @@ export async function runtimeConditionQuery(
   });
 }
 
+/**
+ * Streaming variant of runtimeConditionQuery (saved frames only).
+ * Calls `onChunk` with all results so far (best-first) as the backend computes
+ * them. Starting another stream aborts this one on the backend.
+ * @param condition what do u wanna query
+ * @param onChunk called with the merged results after each chunk
+ * @returns `done` resolves with the final results (or partial ones when
+ * cancelled), `cancel` aborts the query
+ */
+export function runtimeConditionStream(
+  condition: pb.Routine_Condition,
+  onChunk: (frames: pb.ConditionProcessing_Frame[]) => void,
+) {
+  const id = Math.floor(Math.random() * -(1 << 31));
+  let frames: pb.ConditionProcessing_Frame[] = [];
+  let finish: (frames: pb.ConditionProcessing_Frame[]) => void = () => {};
+  const done = new Promise<pb.ConditionProcessing_Frame[]>((resolve) => {
+    finish = (frames) => {
+      delete wsListeners[id];
+      resolve(frames);
+    };
+    wsListeners[id] = (packet: pb.Packet) => {
+      if (packet.type?.$case === 'sampleCondition') {
+        const res = packet.type.sampleCondition;
+        if (res.frames.length) {
+          const score = (x: pb.ConditionProcessing_Frame) =>
+            x.matches[0]?.score ?? -1;
+          frames = [...frames, ...res.frames].sort(
+            (a, b) => score(b) - score(a),
+          );
+          onChunk(frames);
+        }
+        if (res.done) finish(frames);
+      } else {
+        console.warn(`unexpected response for id ${id}`, packet);
+      }
+    };
+  });
+  const packet = pb.Packet.create({
+    id,
+    type: {
+      $case: 'sampleCondition',
+      sampleCondition: { condition, stream: true },
+    },
+  });
+  ws.send(pb.Packet.encode(packet).finish());
+
+  const cancel = () => {
+    if (!wsListeners[id]) return; // already done
+    finish(frames);
+    const packet = pb.Packet.create({
+      type: {
+        $case: 'sampleCondition',
+        sampleCondition: { cancel: true },
+      },
+    });
+    ws.send(pb.Packet.encode(packet).finish());
+  };
+  return { done, cancel };
+}
+
 /**
  * Gets a template match offset
  */
@@ -11,6 +11,7 @@ import Button from './ui/Button';
 import { $condition } from './ConditionImageEditor.state';
 import { pluralize } from '../client/util';
 import SelectTab from './ui/SelectTab';
+import Checkbox from './ui/Checkbox';
 
 interface ConditionNumberInputProps<K extends keyof Routine_Condition> {
   /* property */
@@ -111,6 +112,21 @@ export default function Condition({
         <ConditionNumberInput c={condition} cb={forceUpdate} p='timeout' />
         {/* <ConditionNumberInput c={condition} cb={forceUpdate} p='delay' /> */}
         {/* <ConditionNumberInput c={condition} cb={forceUpdate} p='interval' /> */}
+        <Checkbox
+          value={condition.adaptive}
+          onChange={(x) => {
+            condition.adaptive = x;
+            forceUpdate();
+          }}
+          label={
+            <div
+              className='text-sm'
+              title='Poll around when this usually passes (from past runs).'
+            >
+              adaptive ({pluralize(condition.records.length, 'record')})
+            </div>
+          }
+        />
 
         {condition.condition?.$case === 'image' && (
           <div className='flex gap-2 items-center font-sans'>
@@ -1,4 +1,4 @@
-import { useEffect, useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import { useStore } from '@nanostores/react';
 import * as pb from 'acine-proto-dist';
 import { Routine_Condition_Image_Method as Method } from 'acine-proto-dist';
@@ -12,7 +12,11 @@ import Select, { SelectAuto } from './ui/Select';
 
 import { $frames, $routine, $sourceDimensions } from '@/state';
 import { $condition } from './ConditionImageEditor.state';
-import { getImageUrl, runtimeConditionQuery } from '../App.state';
+import {
+  getImageUrl,
+  runtimeConditionQuery,
+  runtimeConditionStream,
+} from '../App.state';
 import useForceUpdate from './useForceUpdate';
 import useShortcut from './useShortcut';
 
@@ -34,7 +38,10 @@ export default function ConditionImageEditor() {
   const forceUpdate = useForceUpdate();
 
   const [open, setOpen] = useState(false);
+  /** aborts the running preview query (if any) */
+  const cancelPreview = useRef<() => void>(() => {});
   const close = () => {
+    cancelPreview.current();
     setOpen(false);
     $condition.set(null);
   };
@@ -105,11 +112,20 @@ export default function ConditionImageEditor() {
       const c = pb.Routine_Condition.create({
         condition: { $case: 'image', image: condition },
       });
+      cancelPreview.current(); // stale once the condition changes
       setBusy(true);
-      runtimeConditionQuery(c)
-        .then((w) => setPreview(w))
+      const { done, cancel } = runtimeConditionStream(c, (w) => {
+        if (cancelPreview.current === cancel) setPreview(w);
+      });
+      cancelPreview.current = cancel;
+      done
+        .then((w) => {
+          if (cancelPreview.current === cancel) setPreview(w);
+        })
         .catch((e) => console.error('Failed condition query.', e))
-        .finally(() => setBusy(false));
+        .finally(() => {
+          if (cancelPreview.current === cancel) setBusy(false);
+        });
     }
   };
 
@@ -1,7 +1,8 @@
 import { useStore } from '@nanostores/react';
-import { $logs } from '@/state';
+import { $logs, $logsOffset } from '@/state';
 import { Event, Action_Phase, Action_Result } from 'acine-proto-dist';
-import { getArchiveUrl } from '../App.state';
+import { getArchiveUrl, loadOlderLogs } from '../App.state';
+import Button from './ui/Button';
 import { getKey } from './util';
 
 function Log({ event }: { event: Event }) {
@@ -53,9 +54,15 @@ function Log({ event }: { event: Event }) {
 
 export default function LogsDisplay() {
   const logs = useStore($logs);
+  const offset = useStore($logsOffset);
 
   return (
     <div className='h-full flex flex-col gap-1 overflow-y-auto grow'>
+      {offset > 0 && (
+        <Button onClick={() => loadOlderLogs()}>
+          Load older ({offset} remaining)
+        </Button>
+      )}
       {logs.events.map((event, index) => (
         <Log event={event} key={index} />
       ))}
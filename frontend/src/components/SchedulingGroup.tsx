@@ -5,7 +5,7 @@ import {
 import EditableRoutineProperty from './ui/EditableRoutineProperty';
 import useForceUpdate from './useForceUpdate';
 import Select from './ui/Select';
-import { PERIOD_DISPLAY } from './display';
+import { CATCH_UP_DISPLAY, PERIOD_DISPLAY } from './display';
 import NumberInput from './ui/NumberInput';
 import ElementList from './ElementList';
 
@@ -56,6 +56,15 @@ export default function SchedulingGroup({
               />
             </div>
           )}
+          <Select
+            label={'Catch up'}
+            value={sgroup.catchUp}
+            values={CATCH_UP_DISPLAY}
+            onChange={(v) => {
+              sgroup.catchUp = v;
+              forceUpdate();
+            }}
+          />
         </div>
         <ElementList
           unit={'dispatch time'}
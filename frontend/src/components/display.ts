@@ -1,5 +1,6 @@
 import {
   Routine_RequirementType,
+  Routine_SchedulingGroup_CatchUp as CatchUp,
   Routine_SchedulingGroup_Period as Period,
 } from 'acine-proto-dist';
 
@@ -18,3 +19,9 @@ export const PERIOD_DISPLAY = [
   ['biweekly', Period.PERIOD_BIWEEKLY],
   ['monthly', Period.PERIOD_MONTHLY],
 ] as [string, Period][];
+
+export const CATCH_UP_DISPLAY = [
+  ['skip missed', CatchUp.CATCH_UP_UNSPECIFIED],
+  ['run once', CatchUp.CATCH_UP_COALESCE],
+  ['run each', CatchUp.CATCH_UP_EACH],
+] as [string, CatchUp][];
@@ -33,6 +33,11 @@ export const $loadedRoutine = atom<Routine | null>(null);
  */
 export const $logs = atom<RuntimeData>(RuntimeData.create());
 
+/**
+ * index of $logs.events[0] within the server's event log (older ones load on request)
+ */
+export const $logsOffset = atom<number>(0);
+
 /**
  * routine being edited (most code references this and assumes it exists)
  * TEMPORARY WORKAROUND: use $loadedRoutine to check if it exists or not instead.